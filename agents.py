@@ -3,37 +3,164 @@
 import llm_clients
 import tools
 import json
+import queue
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pipeline import Node, Pipeline
+from core.config import COMPILER_POLISH
+from core.prompts import registry
+from core.survey_compiler import compile_survey
+from core.tracing import propagate, span
+
+# --- Prompt Builders (shared by the blocking and streaming agents) ---
+# Static instructions come first and the topic/research/history last, so repeated calls
+# share a prefix that providers can serve from their prompt cache.
+
+_RESEARCH_PROMPT = registry.register(
+    "agents.research",
+    prefix="Based on the search results below, create a summary of key points for creating a survey about the given topic.\n\n",
+    suffix="Topic: {topic}\n\nSearch Results:\n{search_results}\n\nSummary:",
+)
+
+_CREATIVE_PROMPT = registry.register(
+    "agents.creative",
+    prefix="""
+    You are a world-class survey designer specializing in qualitative feedback.
+    Based on the topic and the research summary below, generate 5-7 insightful, open-ended questions.
+    These questions should encourage detailed, thoughtful responses. Do not generate multiple-choice questions.
+    Generate the questions as a JSON list of strings. For example: ["Question 1?", "Question 2?"]
+""",
+    suffix="""
+    Topic: {topic}
+
+    Research Summary:
+    {research_summary}
+    """,
+)
+
+_STRUCTURED_PROMPT = registry.register(
+    "agents.structured",
+    prefix="""
+    You are a survey methodologist specializing in quantitative data.
+    Based on the topic and the research summary below, generate 5-7 structured questions.
+    Include a mix of multiple-choice and 5-point Likert scale (Strongly Disagree to Strongly Agree) questions.
+    Format the output as a JSON list of objects. Each object must have a 'type' ('multiple_choice' or 'likert') and a 'question' string. For multiple_choice, also include an 'options' list.
+    Example:
+    [
+        {{"type": "multiple_choice", "question": "What is your primary role?", "options": ["Engineer", "Manager", "Designer"]}},
+        {{"type": "likert", "question": "The new policy is easy to understand."}}
+    ]
+""",
+    suffix="""
+    Topic: {topic}
+
+    Research Summary:
+    {research_summary}
+    """,
+)
+
+_POLISH_PROMPT = registry.register(
+    "agents.polish",
+    prefix="""
+    You are an expert survey editor. Lightly polish the wording of the survey below for clarity and a consistent tone.
+    Keep every question, option, section and the numbering exactly as they are. Do not add or remove questions.
+    Return only the survey in the same Markdown format.
+""",
+    suffix="""
+    Topic: {topic}
+
+    Survey:
+    {survey_markdown}
+    """,
+)
+
+_INSIGHT_PROMPT = registry.register(
+    "agents.insight",
+    prefix="""
+    You are a strategic research consultant. Based on the conversation history below, provide 2-3 follow-up recommendations.
+    These could be suggestions for related survey topics, different audiences to survey, or how to analyze the potential results. Keep it brief and actionable.
+""",
+    suffix="""
+    Conversation History:
+    {history}
+
+    Recommendations:
+    """,
+)
+
+def _research_prompt(topic: str, search_results: str) -> str:
+    return _RESEARCH_PROMPT.render(topic=topic, search_results=search_results)
+
+def _creative_prompt(topic: str, research_summary: str) -> str:
+    return _CREATIVE_PROMPT.render(topic=topic, research_summary=research_summary)
+
+def _structured_prompt(topic: str, research_summary: str) -> str:
+    return _STRUCTURED_PROMPT.render(topic=topic, research_summary=research_summary)
+
+def _polish_prompt(topic: str, survey_markdown: str) -> str:
+    return _POLISH_PROMPT.render(topic=topic, survey_markdown=survey_markdown)
+
+def _insight_prompt(conversation_history: list) -> str:
+    history_str = "\n".join([f"{msg['role']}: {msg['content']}" for msg in conversation_history])
+    return _INSIGHT_PROMPT.render(history=history_str)
+
+def _insight_history(user_prompt: str, history: list, research_summary: str) -> list:
+    # The insight agent only needs the topic and research, not the compiled survey
+    return history + [
+        {"role": "assistant", "content": f"Research summary for a survey about {user_prompt}:\n{research_summary}"}
+    ]
+
+# --- Agents ---
+
+RESEARCH_MODEL = "llama-3.3-70b-versatile"
+
+def _research_query(topic: str) -> str:
+    return f"key aspects and questions for a survey about {topic}"
+
+def _research_key(topic: str) -> str:
+    return tools.research_key("research", topic, model=RESEARCH_MODEL)
 
 def research_agent(topic: str) -> str:
     """
     Takes a topic, searches the web, and returns a summary of the findings.
+    Summaries are kept in the research cache, so a repeated topic skips both the search and the LLM call.
     """
     print("--- RESEARCH AGENT ACTIVATED ---")
-    prompt = f"You are an expert researcher. Your goal is to provide a concise summary of key points, concepts, and common questions related to the topic: '{topic}'. This summary will be used by other AI agents to generate a survey. Focus on actionable insights."
-    
-    search_results = tools.simple_web_search(f"key aspects and questions for a survey about {topic}")
-    
+    key = _research_key(topic)
+    cached = tools.cache_get(key)
+    if cached is not None:
+        return cached
+    search_results = tools.simple_web_search(_research_query(topic))
+
     # Use a fast model to summarize the search results
-    summary_prompt = f"Based on the following search results, create a summary of key points for creating a survey about '{topic}'.\n\nSearch Results:\n{search_results}\n\nSummary:"
-    summary = llm_clients.call_groq(summary_prompt, model="llama-3.3-70b-versatile")
+    summary = llm_clients.call_llm(_research_prompt(topic, search_results), prefer="groq", model=RESEARCH_MODEL)
+    if tools.search_ok(search_results):
+        tools.cache_set(key, summary)
     return summary
 
-def creative_question_agent(topic: str, research_summary: str) -> str:
+def warm_research(topics: list, max_workers: int = 4) -> dict:
     """
-    Uses OpenAI to generate creative, open-ended questions.
+    Prefetches research for a list of topics ahead of time. Returns {topic: ok}.
     """
-    print("--- CREATIVE (OPENAI) AGENT ACTIVATED ---")
-    prompt = f"""
-    You are a world-class survey designer specializing in qualitative feedback. 
-    Based on the topic '{topic}' and the following research summary, generate 5-7 insightful, open-ended questions.
-    These questions should encourage detailed, thoughtful responses. Do not generate multiple-choice questions.
+    def warm(topic):
+        try:
+            research_agent(topic)
+            return True
+        except Exception as e:
+            print(f"Error warming research for '{topic}': {e}")
+            return False
 
-    Research Summary:
-    {research_summary}
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        return dict(zip(topics, pool.map(propagate(warm), topics)))
 
-    Generate the questions as a JSON list of strings. For example: ["Question 1?", "Question 2?"]
+def creative_question_agent(topic: str, research_summary: str) -> str:
     """
-    response = llm_clients.call_openai(prompt)
+    Uses OpenAI to generate creative, open-ended questions.
+    """
+    print("--- CREATIVE (OPENAI) AGENT ACTIVATED ---")
+    response = llm_clients.call_llm(_creative_prompt(topic, research_summary), prefer="openai")
     return response
 
 def structured_question_agent(topic: str, research_summary: str) -> str:
@@ -41,87 +168,164 @@ def structured_question_agent(topic: str, research_summary: str) -> str:
     Uses Gemini to generate structured questions (Multiple Choice, Likert Scale).
     """
     print("--- STRUCTURED (GEMINI) AGENT ACTIVATED ---")
-    prompt = f"""
-    You are a survey methodologist specializing in quantitative data.
-    Based on the topic '{topic}' and the following research summary, generate 5-7 structured questions.
-    Include a mix of multiple-choice and 5-point Likert scale (Strongly Disagree to Strongly Agree) questions.
-
-    Research Summary:
-    {research_summary}
-
-    Format the output as a JSON list of objects. Each object must have a 'type' ('multiple_choice' or 'likert') and a 'question' string. For multiple_choice, also include an 'options' list.
-    Example:
-    [
-        {{"type": "multiple_choice", "question": "What is your primary role?", "options": ["Engineer", "Manager", "Designer"]}},
-        {{"type": "likert", "question": "The new policy is easy to understand."}}
-    ]
-    """
-    response = llm_clients.call_gemini(prompt)
+    response = llm_clients.call_llm(_structured_prompt(topic, research_summary), prefer="gemini")
     return response
 
-def compiler_agent(topic: str, open_ended_qs: str, structured_qs: str) -> str:
-    """
-    Uses Groq to compile, format, and de-duplicate all generated questions.
-    """
-    print("--- COMPILER (GROQ) AGENT ACTIVATED ---")
-    prompt = f"""
-    You are an expert survey editor. Your job is to combine and format the following sets of questions into a single, cohesive survey about '{topic}'.
-    Remove any duplicate or very similar questions. Organize them into logical sections.
-    Present the final survey in a clean, readable Markdown format.
+COMPILER_MODEL = "llama-3.3-70b-versatile"
 
-    Open-Ended Questions (from Creative Agent):
-    {open_ended_qs}
+_NUMBERED_RE = re.compile(r"^\d+\. ", re.M)
 
-    Structured Questions (from Structured Agent):
-    {structured_qs}
+def _polished(text: str, survey_markdown: str) -> bool:
+    # A failed, truncated or restructured polish must not replace the survey
+    return bool(text) and not text.startswith("Error ") and len(_NUMBERED_RE.findall(text)) == len(_NUMBERED_RE.findall(survey_markdown))
 
-    Compile them into a final survey. Use Markdown for formatting (e.g., ## Section Title, 1., a.).
+def compiler_agent(topic: str, open_ended_qs: str, structured_qs: str, polish: bool = COMPILER_POLISH) -> str:
     """
-    response = llm_clients.call_groq(prompt, model="llama-3.3-70b-versatile")
-    return response
+    Compiles, de-duplicates and formats all generated questions locally (no LLM call).
+    With `polish`, Groq rewords the result; the local survey is kept if that fails.
+    """
+    print("--- COMPILER AGENT ACTIVATED ---")
+    with span("compiler.local") as s:
+        compiled = compile_survey(topic, open_ended_qs, structured_qs)
+        s.set(questions=len(compiled["questions"]), duplicates_removed=compiled["duplicates_removed"], method=compiled["method"])
+    if not polish or not compiled["questions"]:
+        return compiled["markdown"]
+    try:
+        response = llm_clients.call_llm(_polish_prompt(topic, compiled["markdown"]), prefer="groq", model=COMPILER_MODEL)
+    except Exception as e:
+        print(f"Survey polish failed, keeping the compiled survey: {e}")
+        return compiled["markdown"]
+    return response if _polished(response, compiled["markdown"]) else compiled["markdown"]
+
+def _compile_stream(topic: str, open_ended_qs: str, structured_qs: str):
+    # A generator so the (optionally polished) compile runs on the streaming worker thread
+    yield compiler_agent(topic, open_ended_qs, structured_qs)
 
 def insight_agent(conversation_history: list) -> str:
     """
     Uses Groq to provide follow-up recommendations.
     """
     print("--- INSIGHT (GROQ) AGENT ACTIVATED ---")
-    history_str = "\n".join([f"{msg['role']}: {msg['content']}" for msg in conversation_history])
-    prompt = f"""
-    You are a strategic research consultant. Based on the conversation history below, provide 2-3 follow-up recommendations.
-    These could be suggestions for related survey topics, different audiences to survey, or how to analyze the potential results. Keep it brief and actionable.
-
-    Conversation History:
-    {history_str}
-
-    Recommendations:
-    """
-    response = llm_clients.call_groq(prompt)
+    response = llm_clients.call_llm(_insight_prompt(conversation_history), prefer="groq")
     return response
 
-def orchestrator_agent(user_prompt: str, history: list) -> dict:
+def orchestrator_agent(user_prompt: str, history: list, research_summary: str = None) -> dict:
     """
     The main orchestrator that manages the entire workflow.
+    Independent agents run concurrently, so latency follows the critical path:
+    research -> (creative | structured) -> compiler, with insight running alongside.
+    Pass `research_summary` to reuse research already done for the topic.
     """
     print("--- ORCHESTRATOR ACTIVATED ---")
-    
-    # 1. Research Agent
-    research_summary = research_agent(user_prompt)
-    
-    # 2. Parallel Generation Agents
-    open_ended_json = creative_question_agent(user_prompt, research_summary)
-    structured_json = structured_question_agent(user_prompt, research_summary)
-
-    # 3. Compiler Agent
-    final_survey = compiler_agent(user_prompt, open_ended_json, structured_json)
-
-    # 4. Insight Agent
-    current_conversation = history + [
-        {"role": "assistant", "content": f"Here is the survey about {user_prompt}:\n{final_survey}"}
-    ]
-    recommendations = insight_agent(current_conversation)
+
+    pipeline = Pipeline([
+        # 1. Research Agent
+        Node("research", lambda: research_summary if research_summary is not None else research_agent(user_prompt)),
+        # 2. Parallel Generation Agents
+        Node("creative", lambda research: creative_question_agent(user_prompt, research), deps=["research"]),
+        Node("structured", lambda research: structured_question_agent(user_prompt, research), deps=["research"]),
+        # 3. Compiler Agent
+        Node("compiler", lambda creative, structured: compiler_agent(user_prompt, creative, structured), deps=["creative", "structured"]),
+        # 4. Insight Agent
+        Node("insight", lambda research: insight_agent(_insight_history(user_prompt, history, research)), deps=["research"]),
+    ])
+    results = pipeline.run()
 
     return {
-        "research_summary": research_summary,
-        "final_survey": final_survey,
-        "recommendations": recommendations
+        "research_summary": results["research"],
+        "final_survey": results["compiler"],
+        "recommendations": results["insight"],
+        "timings": pipeline.timings,
+    }
+
+def orchestrator_agent_stream(user_prompt: str, history: list):
+    """
+    Streaming version of the orchestrator. Yields events as tokens arrive:
+        {"stage": "research" | "creative" | "structured" | "survey" | "recommendations", "delta": str}
+    and finally {"stage": "done", "result": <same dict as orchestrator_agent>}.
+    Generation, insight and compilation stream concurrently where the graph allows.
+    """
+    print("--- STREAMING ORCHESTRATOR ACTIVATED ---")
+    t0 = time.perf_counter()
+    timings = {}
+    texts = {}
+
+    # 1. Research Agent (search, then stream the summary)
+    parts = []
+    with span("stream.research") as s:
+        cached = tools.cache_get(_research_key(user_prompt))
+        s.set(cache_hit=cached is not None)
+        if cached is not None:
+            parts.append(cached)
+            yield {"stage": "research", "delta": cached}
+        else:
+            # Like _pump: a failure becomes text so the later stages still run on what arrived
+            try:
+                search_results = tools.simple_web_search(_research_query(user_prompt))
+                for chunk in llm_clients.stream_llm(_research_prompt(user_prompt, search_results), prefer="groq", model=RESEARCH_MODEL):
+                    parts.append(chunk)
+                    yield {"stage": "research", "delta": chunk}
+            except Exception as e:
+                error = f"Error in research agent: {e}"
+                parts.append(error)
+                yield {"stage": "research", "delta": error}
+            else:
+                if parts and tools.search_ok(search_results):
+                    tools.cache_set(_research_key(user_prompt), "".join(parts))
+    texts["research"] = "".join(parts)
+    timings["research"] = {"start": 0.0, "end": time.perf_counter() - t0}
+
+    events = queue.Queue()
+
+    def _pump(stage, chunks):
+        start = time.perf_counter() - t0
+        collected = []
+        with span(f"stream.{stage}") as s:
+            try:
+                for chunk in chunks:
+                    if not collected:
+                        s.set(time_to_first_token=time.perf_counter() - t0 - start)
+                    collected.append(chunk)
+                    events.put((stage, chunk))
+            except Exception as e:
+                collected.append(f"Error in {stage} agent: {e}")
+        texts[stage] = "".join(collected)
+        timings[stage] = {"start": start, "end": time.perf_counter() - t0}
+        events.put((stage, None))
+
+    def _start(stage, chunks):
+        threading.Thread(target=propagate(_pump), args=(stage, chunks), daemon=True).start()
+
+    # 2. Parallel Generation Agents + 4. Insight Agent
+    research = texts["research"]
+    _start("creative", llm_clients.stream_llm(_creative_prompt(user_prompt, research), prefer="openai"))
+    _start("structured", llm_clients.stream_llm(_structured_prompt(user_prompt, research), prefer="gemini"))
+    _start("recommendations", llm_clients.stream_llm(_insight_prompt(_insight_history(user_prompt, history, research)), prefer="groq"))
+
+    running = {"creative", "structured", "recommendations"}
+    compiler_started = False
+    while running:
+        stage, chunk = events.get()
+        if chunk is not None:
+            yield {"stage": stage, "delta": chunk}
+            continue
+        running.discard(stage)
+        # 3. Compiler Agent starts as soon as both question sets are in
+        if not compiler_started and "creative" in texts and "structured" in texts:
+            compiler_started = True
+            running.add("survey")
+            # Compiled locally in one step, so the survey arrives as a single delta
+            _start("survey", _compile_stream(user_prompt, texts["creative"], texts["structured"]))
+
+    timings["total"] = {"start": 0.0, "end": time.perf_counter() - t0}
+    for t in timings.values():
+        t["duration"] = t["end"] - t["start"]
+    yield {
+        "stage": "done",
+        "result": {
+            "research_summary": texts["research"],
+            "final_survey": texts["survey"],
+            "recommendations": texts["recommendations"],
+            "timings": timings,
+        },
     }
@@ -0,0 +1,349 @@
+# api.py
+"""
+Async HTTP service over core.orchestrator.
+
+    uvicorn api:app --host 0.0.0.0 --port 8000 --workers 1
+
+Blocking orchestrator calls run on a bounded worker pool (API_WORKERS threads plus
+API_MAX_QUEUE queued requests); beyond that the service sheds load with 503 +
+Retry-After so a load balancer can send traffic elsewhere. Identical in-flight
+stateless questions (no session_id/context) share one upstream call, though each
+caller still gets a session of its own. Calls for the
+same session are serialized so history updates don't race.
+
+Endpoints: POST /v1/questions, GET /v1/sessions/{id}/history,
+POST /v1/sessions/{id}/finalize, GET /v1/jobs/{id} (finalize polling), GET /v1/analytics,
+GET /healthz, GET /readyz, GET /metrics (Prometheus text), GET /stats (JSON).
+"""
+
+import asyncio
+import re
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import JSONResponse, PlainTextResponse
+from pydantic import BaseModel
+
+from core import orchestrator
+from core.analytics import analytics
+from core.cache import response_cache
+from core.cascade import cascade
+from core.config import API_WORKERS, API_MAX_QUEUE, API_REQUEST_TIMEOUT, API_COALESCE
+from core.db import db
+from core.local_inference import get_stats as local_model_stats
+from core.prompts import get_cache_stats as prompt_cache_stats
+from core.rate_limit import scheduler
+from core.router import router
+from core.semantic_cache import semantic_cache
+from core.startup import warm_up
+from core.tracing import propagate
+from core.validator import get_stats as validator_stats
+
+
+class QuestionRequest(BaseModel):
+    domain: str
+    question: str
+    region: str
+    session_id: Optional[str] = None
+    context: Optional[Dict[str, Any]] = None
+    all_providers: bool = False
+    use_cache: bool = True
+
+
+class Overloaded(Exception):
+    pass
+
+
+class Metrics:
+    def __init__(self):
+        self.started = time.time()
+        self.requests = defaultdict(int)  # (endpoint, status) -> count
+        self.latency_sum = defaultdict(float)
+        self.latency_count = defaultdict(int)
+        self.coalesced = 0
+        self.shed = 0
+        self.timeouts = 0
+
+    def observe(self, endpoint: str, status: int, seconds: float):
+        self.requests[(endpoint, status)] += 1
+        self.latency_sum[endpoint] += seconds
+        self.latency_count[endpoint] += 1
+
+
+class Service:
+    """Worker pool with admission control, coalescing and per-session ordering.
+    All bookkeeping happens on the event loop thread, so it needs no locks."""
+
+    def __init__(self, workers: int = API_WORKERS, max_queue: int = API_MAX_QUEUE, timeout: float = API_REQUEST_TIMEOUT):
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="api")
+        self.workers = workers
+        self.capacity = workers + max_queue
+        self.timeout = timeout
+        self.admitted = 0
+        self.inflight: Dict[tuple, asyncio.Future] = {}
+        self.session_locks: Dict[str, list] = {}  # id -> [lock, users]
+        self.metrics = Metrics()
+
+    def saturated(self) -> bool:
+        return self.admitted >= self.capacity
+
+    def _release(self, _):
+        self.admitted -= 1
+
+    def submit(self, fn, *args) -> asyncio.Future:
+        if self.saturated():
+            self.metrics.shed += 1
+            raise Overloaded()
+        self.admitted += 1
+        fut = asyncio.get_running_loop().run_in_executor(self.pool, propagate(fn), *args)
+        # The slot is held until the thread finishes, even if the caller timed out
+        fut.add_done_callback(self._release)
+        return fut
+
+    async def wait(self, fut: asyncio.Future):
+        try:
+            return await asyncio.wait_for(asyncio.shield(fut), self.timeout)
+        except asyncio.TimeoutError:
+            self.metrics.timeouts += 1
+            raise
+
+    async def run(self, fn, *args):
+        return await self.wait(self.submit(fn, *args))
+
+    async def coalesced(self, key: tuple, fn, *args, follow=None):
+        """Share one in-flight call among identical requests. Callers that joined an
+        existing call get `follow(result)` instead (e.g. to give them their own session)."""
+        fut = self.inflight.get(key)
+        if fut is None:
+            fut = self.submit(fn, *args)
+            self.inflight[key] = fut
+            fut.add_done_callback(lambda _: self.inflight.pop(key, None))
+            return await self.wait(fut)
+        self.metrics.coalesced += 1
+        result = await self.wait(fut)
+        # Through the pool so joiners' follow-up work is admitted and bounded like any other
+        return await self.run(follow, result) if follow else result
+
+    async def for_session(self, session_id: str, fn, *args):
+        entry = self.session_locks.setdefault(session_id, [asyncio.Lock(), 0])
+        lock = entry[0]
+        entry[1] += 1
+        try:
+            await lock.acquire()
+        except BaseException:
+            # Client went away while queued behind another call for this session
+            entry[1] -= 1
+            if entry[1] == 0:
+                self.session_locks.pop(session_id, None)
+            raise
+        try:
+            fut = self.submit(fn, *args)
+        except Exception:
+            self._unlock(session_id, entry)
+            raise
+        # Hold the session until the work really ends, not just until the caller gives up
+        fut.add_done_callback(lambda _: self._unlock(session_id, entry))
+        return await self.wait(fut)
+
+    def _unlock(self, session_id: str, entry: list):
+        entry[0].release()
+        entry[1] -= 1
+        if entry[1] == 0:
+            self.session_locks.pop(session_id, None)
+
+    def shutdown(self):
+        self.pool.shutdown(wait=True)
+
+
+service = Service()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Connect Mongo, build agents etc. (WARM_UP) without delaying readiness
+    warm_up(background=True)
+    yield
+    service.shutdown()
+    db.close()
+    semantic_cache.save()
+
+
+app = FastAPI(title="Survey Agent API", lifespan=lifespan)
+
+
+def _normalize(text: str) -> str:
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+
+async def _call(endpoint: str, coro):
+    t0 = time.time()
+    status = 200
+    try:
+        return await coro
+    except Overloaded:
+        status = 503
+        return JSONResponse({"detail": "Server busy, retry later"}, status_code=503, headers={"Retry-After": "1"})
+    except asyncio.TimeoutError:
+        status = 504
+        return JSONResponse({"detail": "Timed out waiting for the answer"}, status_code=504)
+    except HTTPException as e:
+        status = e.status_code
+        raise
+    except Exception:
+        status = 500
+        raise
+    finally:
+        service.metrics.observe(endpoint, status, time.time() - t0)
+
+
+async def _question(req: QuestionRequest):
+    args = (req.domain, req.question, req.region, req.session_id, req.context, req.all_providers, req.use_cache)
+    if req.session_id:
+        result = await service.for_session(req.session_id, orchestrator.process_question, *args)
+    elif API_COALESCE and not req.context:
+        key = (req.domain, req.region, _normalize(req.question), req.all_providers, req.use_cache)
+        # New sessions can't be shared: joiners get the answer in a session of their own
+        result = await service.coalesced(key, orchestrator.process_question, *args, follow=orchestrator.adopt_answer)
+    else:
+        result = await service.run(orchestrator.process_question, *args)
+    if result.get("status") != "success":
+        raise HTTPException(status_code=400, detail=result.get("error"))
+    return result
+
+
+@app.post("/v1/questions")
+async def ask(req: QuestionRequest):
+    return await _call("questions", _question(req))
+
+
+@app.get("/v1/sessions/{session_id}/history")
+async def history(session_id: str):
+    # Session reads are in-memory or a single indexed lookup; no need for the pool
+    return await _call("history", asyncio.to_thread(orchestrator.get_history, session_id))
+
+
+async def _finalize(session_id: str, wait: float):
+    # Answers from the precomputed summary; `wait` only blocks a worker when asked to
+    if wait:
+        result = await service.run(orchestrator.finalize_session, session_id, wait)
+    else:
+        result = await asyncio.to_thread(orchestrator.finalize_session, session_id)
+    if result.get("status") == "error":
+        raise HTTPException(status_code=404, detail=result.get("error"))
+    return result
+
+
+@app.post("/v1/sessions/{session_id}/finalize")
+async def finalize(session_id: str, wait: float = 0.0):
+    return await _call("finalize", _finalize(session_id, min(wait, service.timeout)))
+
+
+async def _job(job_id: str):
+    result = await asyncio.to_thread(orchestrator.get_finalize_job, job_id)
+    if result.get("status") == "error" and "job_id" not in result:
+        raise HTTPException(status_code=404, detail=result.get("error"))
+    return result
+
+
+@app.get("/v1/jobs/{job_id}")
+async def job(job_id: str):
+    return await _call("jobs", _job(job_id))
+
+
+def _analytics(by: str, domain: Optional[str], zone: Optional[str], region: Optional[str], since: Optional[datetime], fresh: bool, n: int):
+    if since is not None and since.tzinfo is not None:
+        # Stored timestamps are naive UTC
+        since = since.astimezone(timezone.utc).replace(tzinfo=None)
+    filters = {"domain": domain, "zone": zone, "region": region, "since": since, "fresh": fresh}
+    return {
+        "summary": analytics.summary(tuple(k.strip() for k in by.split(",") if k.strip()), **filters),
+        "confidence": analytics.confidence_distribution(**filters),
+        "top_insights": analytics.top_insights(n, **filters),
+    }
+
+
+async def _analytics_call(*args):
+    try:
+        return await asyncio.to_thread(_analytics, *args)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.get("/v1/analytics")
+async def analytics_view(by: str = "domain,region", domain: Optional[str] = None, zone: Optional[str] = None, region: Optional[str] = None, since: Optional[datetime] = None, fresh: bool = False, n: int = 20):
+    # Rollups answer in memory; `since`/`fresh` aggregate in Mongo (or pandas) off the loop
+    return await _call("analytics", _analytics_call(by, domain, zone, region, since, fresh, n))
+
+
+@app.get("/healthz")
+async def healthz():
+    return {"status": "ok", "uptime": time.time() - service.metrics.started}
+
+
+@app.get("/readyz")
+async def readyz():
+    # Not ready while saturated, so the load balancer stops routing here first
+    if service.saturated():
+        return JSONResponse({"status": "saturated", "admitted": service.admitted}, status_code=503)
+    return {"status": "ready", "admitted": service.admitted, "capacity": service.capacity}
+
+
+@app.get("/stats")
+async def stats():
+    m = service.metrics
+    return {
+        "admitted": service.admitted,
+        "capacity": service.capacity,
+        "coalesced": m.coalesced,
+        "shed": m.shed,
+        "timeouts": m.timeouts,
+        "requests": {f"{e}:{s}": n for (e, s), n in m.requests.items()},
+        "router": router.snapshot(),
+        "rate_limits": scheduler.snapshot(),
+        "response_cache": response_cache.get_stats(),
+        "validator": validator_stats(),
+        "local_models": local_model_stats(),
+        "cascade": cascade.get_stats(),
+        "prompt_cache": prompt_cache_stats(),
+        "db_pending": db.writer.pending() if db.writer is not None else 0,
+    }
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    m = service.metrics
+    lines = [
+        "# TYPE survey_api_requests_total counter",
+        *[f'survey_api_requests_total{{endpoint="{e}",status="{s}"}} {n}' for (e, s), n in sorted(m.requests.items())],
+        "# TYPE survey_api_request_seconds summary",
+        *[f'survey_api_request_seconds_sum{{endpoint="{e}"}} {v:.6f}' for e, v in sorted(m.latency_sum.items())],
+        *[f'survey_api_request_seconds_count{{endpoint="{e}"}} {v}' for e, v in sorted(m.latency_count.items())],
+        "# TYPE survey_api_coalesced_total counter",
+        f"survey_api_coalesced_total {m.coalesced}",
+        "# TYPE survey_api_shed_total counter",
+        f"survey_api_shed_total {m.shed}",
+        "# TYPE survey_api_timeouts_total counter",
+        f"survey_api_timeouts_total {m.timeouts}",
+        "# TYPE survey_api_admitted gauge",
+        f"survey_api_admitted {service.admitted}",
+        "# TYPE survey_api_capacity gauge",
+        f"survey_api_capacity {service.capacity}",
+        "# TYPE survey_provider_circuit_open gauge",
+        *[f'survey_provider_circuit_open{{provider="{k}"}} {int(h["state"] == "open")}' for k, h in sorted(router.snapshot().items())],
+        "# TYPE survey_rate_limit_waiting gauge",
+        *[f'survey_rate_limit_waiting{{limiter="{k}"}} {s["waiting"]}' for k, s in sorted(scheduler.snapshot().items())],
+        "# TYPE survey_cascade_escalation_rate gauge",
+        *[f'survey_cascade_escalation_rate{{agent="{k}"}} {c["escalation_rate"]:.6f}' for k, c in sorted(cascade.get_stats().items())],
+        "# TYPE survey_prompt_cached_tokens_total counter",
+        *[f'survey_prompt_cached_tokens_total{{provider="{k}"}} {c["cached_tokens"]}' for k, c in sorted(prompt_cache_stats().items())],
+        "# TYPE survey_prompt_tokens_total counter",
+        *[f'survey_prompt_tokens_total{{provider="{k}"}} {c["prompt_tokens"]}' for k, c in sorted(prompt_cache_stats().items())],
+        "# TYPE survey_llm_cache_hit_rate gauge",
+        f"survey_llm_cache_hit_rate {response_cache.get_stats()['hit_rate']:.6f}",
+    ]
+    return "\n".join(lines) + "\n"
@@ -1,7 +1,8 @@
 # app.py
 
 import streamlit as st
-from agents import orchestrator_agent
+from agents import orchestrator_agent_stream
+from core.tracing import breakdown, collect
 
 # --- Page Configuration ---
 st.set_page_config(
@@ -14,6 +15,9 @@ st.set_page_config(
 st.title("🤖 Multi-Agent Survey Generator")
 st.markdown("Describe the topic for your survey, and our team of AI agents will research, design, and compile a comprehensive survey for you.")
 
+# --- Sidebar ---
+show_latency = st.sidebar.checkbox("⏱️ Show latency breakdown", value=False)
+
 # --- Session State for History ---
 if "messages" not in st.session_state:
     st.session_state.messages = []
@@ -32,40 +36,70 @@ if prompt := st.chat_input("e.g., A survey about employee satisfaction with a ne
 
     # --- Agent Processing ---
     with st.chat_message("assistant"):
-        with st.spinner("🤖 The AI agents are collaborating... Please wait."):
-            try:
-                # Call the orchestrator
-                response_data = orchestrator_agent(prompt, st.session_state.messages)
-                
-                # --- Display Results ---
-                st.subheader("📝 Here is your generated survey:")
-                st.markdown(response_data["final_survey"])
+        try:
+            # --- Stream Results as they arrive ---
+            status = st.empty()
+            status.info("🤖 The AI agents are collaborating... Researching your topic.")
+            with st.expander("🔍 View Research Summary", expanded=False):
+                research_box = st.empty()
+            with st.expander("🧩 Draft Questions", expanded=False):
+                creative_col, structured_col = st.columns(2)
+                creative_box = creative_col.empty()
+                structured_box = structured_col.empty()
+            st.subheader("📝 Here is your generated survey:")
+            survey_box = st.empty()
+            st.subheader("💡 Follow-up Recommendations")
+            recommendations_box = st.empty()
+
+            boxes = {
+                "research": research_box,
+                "creative": creative_box,
+                "structured": structured_box,
+                "survey": survey_box,
+                "recommendations": recommendations_box,
+            }
+            texts = {stage: "" for stage in boxes}
+            response_data = None
+            with collect() as spans:
+                for event in orchestrator_agent_stream(prompt, st.session_state.messages):
+                    if event["stage"] == "done":
+                        response_data = event["result"]
+                        break
+                    stage = event["stage"]
+                    if stage != "research" and not any(texts[s] for s in ("creative", "structured", "survey", "recommendations")):
+                        status.info("🤖 Drafting questions...")
+                    if stage == "survey" and not texts["survey"]:
+                        status.info("🤖 Compiling the final survey...")
+                    texts[stage] += event["delta"]
+                    if stage in ("creative", "structured"):
+                        boxes[stage].code(texts[stage], language="json")
+                    else:
+                        boxes[stage].markdown(texts[stage])
+            status.empty()
 
-                with st.expander("🔍 View Research Summary"):
-                    st.markdown(response_data["research_summary"])
-                
-                st.subheader("💡 Follow-up Recommendations")
-                st.markdown(response_data["recommendations"])
+            if show_latency:
+                with st.expander("⏱️ Latency Breakdown", expanded=True):
+                    st.dataframe(breakdown(spans), use_container_width=True)
 
-                # Add the full response to session state for context
-                full_response_md = f"""
-                ### Survey on '{prompt}'
-                {response_data['final_survey']}
-                ---
-                ### Follow-up Recommendations
-                {response_data['recommendations']}
-                """
-                st.session_state.messages.append({"role": "assistant", "content": full_response_md})
+            # Add the full response to session state for context
+            full_response_md = f"""
+            ### Survey on '{prompt}'
+            {response_data['final_survey']}
+            ---
+            ### Follow-up Recommendations
+            {response_data['recommendations']}
+            """
+            st.session_state.messages.append({"role": "assistant", "content": full_response_md})
 
-                # --- Download Button ---
-                st.download_button(
-                    label="⬇️ Download Survey as Markdown",
-                    data=response_data["final_survey"],
-                    file_name=f"survey_{prompt.replace(' ', '_')[:20]}.md",
-                    mime="text/markdown",
-                )
+            # --- Download Button ---
+            st.download_button(
+                label="⬇️ Download Survey as Markdown",
+                data=response_data["final_survey"],
+                file_name=f"survey_{prompt.replace(' ', '_')[:20]}.md",
+                mime="text/markdown",
+            )
 
-            except Exception as e:
-                error_message = f"An error occurred: {e}"
-                st.error(error_message)
-                st.session_state.messages.append({"role": "assistant", "content": error_message})
+        except Exception as e:
+            error_message = f"An error occurred: {e}"
+            st.error(error_message)
+            st.session_state.messages.append({"role": "assistant", "content": error_message})
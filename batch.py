@@ -0,0 +1,216 @@
+# batch.py
+"""
+Headless batch survey generation.
+
+    python batch.py jobs.csv --out results.jsonl --concurrency 4
+    python batch.py topics.jsonl --out results.jsonl --regions all --parquet results.parquet
+
+Each job row has a `topic` and optionally `region`, `domain` and `id`. With --regions,
+rows without a region are expanded across `INDIAN_REGIONS` (every state for "all", one
+job per zone for "zones"). Results stream to the JSONL file as jobs finish; that file is
+also the checkpoint, so re-running the same command skips jobs already completed.
+Research runs once per topic and is shared by all of its regions.
+"""
+
+import argparse
+import csv
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from datetime import datetime
+
+from agents import orchestrator_agent, research_agent
+from core.config import INDIAN_REGIONS
+from core.rate_limit import BACKGROUND, priority
+from core.tracing import propagate
+
+
+def read_jobs(path):
+    """Job dicts from a CSV (header row) or JSONL file."""
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.endswith((".jsonl", ".ndjson")):
+            rows = [json.loads(line) for line in f if line.strip()]
+        else:
+            rows = list(csv.DictReader(f))
+    jobs = []
+    for row in rows:
+        row = {k: (v.strip() if isinstance(v, str) else v) for k, v in row.items() if v not in (None, "")}
+        if row.get("topic"):
+            jobs.append(row)
+    return jobs
+
+
+def expand_regions(jobs, mode):
+    if not mode:
+        return jobs
+    if mode == "zones":
+        regions = list(INDIAN_REGIONS)
+    else:
+        # Madhya Pradesh sits in two zones
+        regions = list(dict.fromkeys(state for states in INDIAN_REGIONS.values() for state in states))
+    expanded = []
+    for job in jobs:
+        if job.get("region"):
+            expanded.append(job)
+        else:
+            expanded.extend({**job, "region": region} for region in regions)
+    return expanded
+
+
+def job_id(job):
+    if job.get("id"):
+        return str(job["id"])
+    key = json.dumps([job["topic"], job.get("region"), job.get("domain")], ensure_ascii=False)
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+
+
+def completed_ids(path):
+    """Ids already written with status ok. A torn last line from a crash is ignored."""
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                continue
+            if rec.get("status") == "ok":
+                done.add(rec["id"])
+    return done
+
+
+def survey_prompt(job):
+    prompt = job["topic"]
+    if job.get("domain"):
+        prompt += f" ({job['domain']})"
+    if job.get("region"):
+        prompt += f", for respondents in {job['region']}, India"
+    return prompt
+
+
+class SharedResearch:
+    """One research_agent call per topic; concurrent jobs for the same topic wait on it."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._futures = {}
+
+    def get(self, topic):
+        with self._lock:
+            fut = self._futures.get(topic)
+            owner = fut is None
+            if owner:
+                fut = self._futures[topic] = Future()
+        if owner:
+            try:
+                fut.set_result(research_agent(topic))
+            except Exception as e:
+                fut.set_exception(e)
+                # Let a later job for this topic try again
+                with self._lock:
+                    self._futures.pop(topic, None)
+        return fut.result()
+
+
+class ResultWriter:
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._f = open(path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def write(self, record):
+        line = json.dumps(record, ensure_ascii=False, default=str)
+        with self._lock:
+            self._f.write(line + "\n")
+            self._f.flush()
+            os.fsync(self._f.fileno())
+
+    def close(self):
+        self._f.close()
+
+
+def run_job(job, research):
+    t0 = time.perf_counter()
+    record = {"id": job_id(job), "topic": job["topic"], "region": job.get("region"), "domain": job.get("domain")}
+    try:
+        summary = research.get(job["topic"])
+        result = orchestrator_agent(survey_prompt(job), [], research_summary=summary)
+        record.update(status="ok", **result)
+    except Exception as e:
+        record.update(status="error", error=f"{type(e).__name__}: {e}")
+    record["duration"] = time.perf_counter() - t0
+    record["finished_at"] = datetime.utcnow().isoformat()
+    return record
+
+
+def write_parquet(jsonl_path, parquet_path):
+    """Rewrite the latest record per job as Parquet (needs pandas + pyarrow)."""
+    try:
+        import pandas as pd  # type: ignore
+    except Exception:
+        print("⚠️ pandas not installed; skipping Parquet export", file=sys.stderr)
+        return
+    latest = {}
+    with open(jsonl_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                rec = json.loads(line)
+            except ValueError:
+                continue
+            latest[rec["id"]] = rec
+    df = pd.DataFrame(list(latest.values()))
+    if "timings" in df:
+        df["timings"] = df["timings"].map(lambda t: json.dumps(t) if t is not None else None)
+    df.to_parquet(parquet_path, index=False)
+
+
+def run(jobs, out, concurrency=4, progress=True):
+    done = completed_ids(out)
+    pending = [j for j in jobs if job_id(j) not in done]
+    if progress:
+        print(f"{len(jobs)} jobs, {len(jobs) - len(pending)} already done, {len(pending)} to run", file=sys.stderr)
+    research = SharedResearch()
+    writer = ResultWriter(out)
+    counts = {"ok": 0, "error": 0}
+    # Batch work yields to interactive traffic in the provider rate limiter
+    with priority(BACKGROUND), ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = [pool.submit(propagate(run_job), job, research) for job in pending]
+        try:
+            for fut in as_completed(futures):
+                record = fut.result()
+                writer.write(record)
+                counts[record["status"]] += 1
+                if progress:
+                    print(f"[{counts['ok'] + counts['error']}/{len(pending)}] {record['status']}: {record['topic']} / {record.get('region') or '-'}", file=sys.stderr)
+        finally:
+            for fut in futures:
+                fut.cancel()
+            writer.close()
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate surveys for many topics without the UI.")
+    parser.add_argument("jobs", help="CSV or JSONL with a `topic` column (optional: region, domain, id)")
+    parser.add_argument("--out", default="results.jsonl", help="JSONL results file, also used to resume")
+    parser.add_argument("--parquet", help="also write the final results as Parquet")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--regions", choices=["all", "zones"], help="expand rows without a region")
+    parser.add_argument("--quiet", action="store_true")
+    args = parser.parse_args(argv)
+
+    jobs = expand_regions(read_jobs(args.jobs), args.regions)
+    counts = run(jobs, args.out, concurrency=args.concurrency, progress=not args.quiet)
+    if args.parquet:
+        write_parquet(args.out, args.parquet)
+    print(json.dumps(counts), file=sys.stderr)
+    return 1 if counts["error"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,193 @@
+# benchmarks/mock_providers.py
+
+import json
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+
+class LatencyModel:
+    """
+    Log-normal latency with a configurable median and tail, plus an optional
+    failure rate. Log-normal gives the long right tail real provider latencies show.
+    """
+    def __init__(self, median: float = 0.5, sigma: float = 0.4, failure_rate: float = 0.0):
+        self.median = median
+        self.sigma = sigma
+        self.failure_rate = failure_rate
+
+    def sample(self, rng: random.Random) -> float:
+        return self.median * rng.lognormvariate(0.0, self.sigma)
+
+
+class MockProvider:
+    """
+    Stand-in for one provider. Sleeps for a sampled latency, raises (or returns an
+    error string, like llm_clients does) at `failure_rate`, and corrupts JSON replies at
+    `malformed_rate` so the validator's repair and escalation paths get exercised.
+    """
+    MALFORMATIONS = ["fenced", "prose", "trailing_comma", "single_quotes", "truncated", "garbage"]
+
+    def __init__(self, name: str, latency: LatencyModel, malformed_rate: float = 0.0, seed: int = 0):
+        self.name = name
+        self.latency = latency
+        self.malformed_rate = malformed_rate
+        self.rng = random.Random(seed)
+        self.calls = 0
+        self.failures = 0
+        self._lock = threading.Lock()
+
+    def _roll(self):
+        with self._lock:
+            self.calls += 1
+            delay = self.latency.sample(self.rng)
+            fail = self.rng.random() < self.latency.failure_rate
+            malformed = self.rng.random() < self.malformed_rate
+            kind = self.rng.choice(self.MALFORMATIONS)
+            if fail:
+                self.failures += 1
+        return delay, fail, malformed, kind
+
+    def _malform(self, payload: dict, kind: str) -> str:
+        text = json.dumps(payload, ensure_ascii=False)
+        if kind == "fenced":
+            return f"```json\n{text}\n```"
+        if kind == "prose":
+            return f"Sure! Here is the JSON you asked for:\n{text}\nLet me know if you need more."
+        if kind == "trailing_comma":
+            return text[:-1] + ",}"
+        if kind == "single_quotes":
+            return text.replace('"', "'")
+        if kind == "truncated":
+            return text[: max(10, int(len(text) * 0.7))]
+        return "I'm sorry, I can't help with that."
+
+    def respond(self, payload, raise_on_error: bool = True) -> str:
+        delay, fail, malformed, kind = self._roll()
+        time.sleep(delay)
+        if fail:
+            if raise_on_error:
+                raise RuntimeError(f"{self.name} mock failure")
+            return f"Error calling {self.name}: mock failure"
+        if isinstance(payload, str):
+            return payload
+        if malformed:
+            return self._malform(payload, kind)
+        return json.dumps(payload, ensure_ascii=False)
+
+
+def _domain_answer(prompt: str) -> dict:
+    from core.orchestrator import AGENTS
+    # Agent prompts and validator prompts both mention the domain's response key
+    agent = next((a for a in AGENTS.values() if next(iter(a.schema)) in prompt), AGENTS["agriculture"])
+    out = {}
+    for key, typ in agent.schema.items():
+        if typ == "number":
+            out[key] = 0.8
+        elif typ == "array":
+            out[key] = ["mock item one", "mock item two"]
+        else:
+            out[key] = "mock answer"
+    return out
+
+
+def _pipeline_reply(prompt: str):
+    if "open-ended questions" in prompt:
+        return [f"Open question {i}?" for i in range(6)]
+    if "structured questions" in prompt:
+        return [{"type": "likert", "question": f"Statement {i}."} for i in range(6)]
+    if "survey editor" in prompt:
+        return "## Section 1\n1. Question one?\n2. Question two?\n"
+    if "follow-up recommendations" in prompt:
+        return "- Survey a second audience.\n- Segment results by region."
+    return "Key points: mock research summary."
+
+
+class MockSuite:
+    """
+    A set of mock providers plus a context manager that swaps them in for the real
+    call functions used by agents.orchestrator_agent and core.orchestrator.process_question.
+    """
+    def __init__(self, latency: LatencyModel, malformed_rate: float = 0.0, seed: int = 0):
+        self.providers = {
+            name: MockProvider(name, latency, malformed_rate, seed + i)
+            for i, name in enumerate(["openai", "groq", "gemini", "huggingface", "search"])
+        }
+
+    @property
+    def calls(self) -> int:
+        return sum(p.calls for name, p in self.providers.items() if name != "search")
+
+    # core.llm_providers-style callables: raise on failure
+    def _core(self, name):
+        provider = self.providers[name]
+
+        def call(prompt, *args, **kwargs):
+            if "survey agent for India" in prompt or "Extract valid JSON" in prompt:
+                return provider.respond(_domain_answer(prompt))
+            return provider.respond({"final_summary": "mock", "key_insights": [], "recommendations": [], "follow_up_questions": []})
+        return call
+
+    # llm_clients-style callables: errors come back as text
+    def _client(self, name):
+        provider = self.providers[name]
+
+        def call(prompt, *args, **kwargs):
+            return provider.respond(_pipeline_reply(prompt), raise_on_error=False)
+
+        def stream(prompt, *args, **kwargs):
+            text = call(prompt)
+            for i in range(0, len(text), 16):
+                yield text[i:i + 16]
+
+        # Raising variants behind the routed call_llm/stream_llm
+        def raw(prompt, *args, **kwargs):
+            return provider.respond(_pipeline_reply(prompt))
+
+        def raw_stream(prompt, *args, **kwargs):
+            text = raw(prompt)
+            for i in range(0, len(text), 16):
+                yield text[i:i + 16]
+        return call, stream, raw, raw_stream
+
+    @contextmanager
+    def installed(self):
+        import llm_clients
+        import tools
+        import core.llm_providers as providers
+        import core.validator as validator
+        import core.agents.base as base
+        import core.summarizer as summarizer
+
+        patches = []
+
+        def patch(module, attr, value):
+            patches.append((module, attr, getattr(module, attr)))
+            setattr(module, attr, value)
+
+        for name in ("openai", "groq", "gemini"):
+            core_call = self._core(name)
+            patch(providers, f"call_{name}", core_call)
+            if hasattr(validator, f"call_{name}"):
+                patch(validator, f"call_{name}", core_call)
+            call, stream, raw, raw_stream = self._client(name)
+            patch(llm_clients, f"call_{name}", call)
+            patch(llm_clients, f"stream_{name}", stream)
+            patch(llm_clients, f"_{name}", raw)
+            patch(llm_clients, f"_{name}_chunks", raw_stream)
+        hf = self._core("huggingface")
+        patch(providers, "call_huggingface_inference", hf)
+        patch(base, "call_huggingface_inference", hf)
+        patch(summarizer, "call_openai", self._core("openai"))
+        patch(tools, "simple_web_search", lambda query, num_results=5: self.providers["search"].respond("Title: mock\nLink: http://example.com\nSnippet: mock\n\n"))
+        try:
+            yield self
+        finally:
+            # Background summary folds still queued would reach the real providers once
+            # unpatched; let them finish on the mocks (and count) first
+            from core.orchestrator import _summarizer
+            if not _summarizer.drain(60.0):
+                raise RuntimeError("Background summary folds did not finish; not restoring real providers")
+            for module, attr, original in reversed(patches):
+                setattr(module, attr, original)
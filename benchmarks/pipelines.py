@@ -0,0 +1,190 @@
+# benchmarks/pipelines.py
+"""
+Offline benchmark for the two orchestration pipelines, using mock providers.
+
+    python -m benchmarks.pipelines --pipeline both --requests 100 --concurrency 8 \
+        --median-latency 0.3 --failure-rate 0.02 --malformed-rate 0.2 --out bench.json
+
+Results are emitted as JSON so runs can be diffed between commits.
+"""
+
+import argparse
+import json
+import math
+import os
+import subprocess
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+# Keep benchmarks off real infrastructure; must happen before core.config is imported
+os.environ["MONGO_URI"] = ""
+os.environ.setdefault("SEMANTIC_CACHE_ENABLED", "0")
+os.environ.setdefault("LLM_CACHE_ENABLED", "0")
+os.environ.setdefault("RESEARCH_CACHE_ENABLED", "0")
+
+from benchmarks.mock_providers import LatencyModel, MockSuite  # noqa: E402
+
+DOMAINS = ["agriculture", "education", "healthcare"]
+REGIONS = ["Punjab", "Kerala", "Bihar", "Gujarat", "Assam"]
+QUESTIONS = [
+    "What are the main challenges you face this season?",
+    "How has access to services changed in the last year?",
+    "What support would help you most?",
+]
+TOPICS = [
+    "employee satisfaction with remote work",
+    "crop insurance awareness among farmers",
+    "student access to digital learning",
+]
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    # Nearest-rank percentile
+    k = max(0, min(len(ordered) - 1, math.ceil(pct / 100.0 * len(ordered)) - 1))
+    return ordered[k]
+
+
+def summarize(latencies, errors, calls, requests, wall, mem_before, mem_after, mem_peak):
+    return {
+        "requests": requests,
+        "errors": errors,
+        "wall_time_s": wall,
+        "throughput_rps": requests / wall if wall else None,
+        "latency_s": {
+            "p50": percentile(latencies, 50),
+            "p95": percentile(latencies, 95),
+            "p99": percentile(latencies, 99),
+            "mean": sum(latencies) / len(latencies) if latencies else None,
+            "max": max(latencies) if latencies else None,
+        },
+        "calls_per_request": calls / requests if requests else None,
+        "memory": {
+            "growth_bytes": mem_after - mem_before,
+            "peak_bytes": mem_peak,
+        },
+    }
+
+
+def _drive(jobs, concurrency):
+    latencies, errors = [], 0
+
+    def timed(job):
+        t0 = time.perf_counter()
+        job()
+        return time.perf_counter() - t0
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for fut in [pool.submit(timed, job) for job in jobs]:
+            try:
+                latencies.append(fut.result())
+            except Exception:
+                errors += 1
+    return latencies, errors
+
+
+def bench_agents(n_requests, streaming=False):
+    import agents
+
+    def job_for(i):
+        topic = TOPICS[i % len(TOPICS)]
+        if streaming:
+            return lambda: [e for e in agents.orchestrator_agent_stream(topic, [])]
+        return lambda: agents.orchestrator_agent(topic, [])
+
+    return [job_for(i) for i in range(n_requests)]
+
+
+def bench_core(n_requests, turns=1):
+    from core import orchestrator
+
+    def session_job(i):
+        sid = f"bench-{i}"
+        domain = DOMAINS[i % len(DOMAINS)]
+        region = REGIONS[i % len(REGIONS)]
+
+        def run():
+            for t in range(turns):
+                res = orchestrator.process_question(domain, QUESTIONS[t % len(QUESTIONS)], region, session_id=sid, use_cache=False)
+                if res.get("status") != "success":
+                    raise RuntimeError(res.get("error"))
+        return run
+
+    # One job per session; each session runs `turns` sequential questions
+    return [session_job(i) for i in range(max(1, n_requests // turns))]
+
+
+def run(args) -> dict:
+    latency = LatencyModel(median=args.median_latency, sigma=args.sigma, failure_rate=args.failure_rate)
+    report = {
+        "commit": _git_rev(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": vars(args),
+        "results": {},
+    }
+    pipelines = ["agents", "agents_stream", "core"] if args.pipeline == "both" else [args.pipeline]
+    for name in pipelines:
+        suite = MockSuite(latency, malformed_rate=args.malformed_rate, seed=args.seed)
+        with suite.installed():
+            if name == "core":
+                from core.validator import reset_stats
+                reset_stats()
+                jobs = bench_core(args.requests, turns=args.turns)
+                n = len(jobs) * args.turns
+            else:
+                jobs = bench_agents(args.requests, streaming=(name == "agents_stream"))
+                n = len(jobs)
+            tracemalloc.start()
+            mem_before = tracemalloc.get_traced_memory()[0]
+            t0 = time.perf_counter()
+            latencies, errors = _drive(jobs, args.concurrency)
+            wall = time.perf_counter() - t0
+            mem_after, mem_peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+        # Calls include background summary folds, drained on the mocks when the suite is removed
+        result = summarize(latencies, errors, suite.calls, n, wall, mem_before, mem_after, mem_peak)
+        if name == "core":
+            # Latency here is per session of `turns` questions
+            result["turns_per_session"] = args.turns
+            from core.validator import get_stats
+            result["validator"] = get_stats()
+        report["results"][name] = result
+    return report
+
+
+def _git_rev():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline benchmark for the survey pipelines with mock providers.")
+    parser.add_argument("--pipeline", choices=["agents", "agents_stream", "core", "both"], default="both")
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--turns", type=int, default=1, help="questions per session for the core pipeline")
+    parser.add_argument("--median-latency", type=float, default=0.3, help="median mock provider latency (s)")
+    parser.add_argument("--sigma", type=float, default=0.4, help="log-normal spread of provider latency")
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--malformed-rate", type=float, default=0.2, help="share of agent JSON replies that are corrupted")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+
+    report = run(args)
+    text = json.dumps(report, indent=2, default=str)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text)
+    else:
+        sys.stdout.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,9 @@
-import json
-from typing import Dict, Any, Optional
 from .base import BaseAgent
+from ..prompts import registry
 
-class AgricultureAgent(BaseAgent):
-    name = "AgricultureAgent"
-    domain = "agriculture"
-
-    def build_prompt(self, question: str, region: str, context: Optional[Dict[str, Any]]) -> str:
-        ctx = f"\nContext: {json.dumps(context, ensure_ascii=False)}" if context else ""
-        return f"""You are an agriculture survey agent for India, region {region}.
-Question: {question}{ctx}
-
+AGRICULTURE_PROMPT = registry.register(
+    "agent.agriculture",
+    prefix="""You are an agriculture survey agent for India.
 Respond with JSON:
 {{
  "farmer_response": "...",
@@ -20,4 +13,24 @@ Respond with JSON:
  "region_specific_factors": ["..."],
  "follow_up_questions": ["..."]
 }}
-Only output JSON:"""
\ No newline at end of file
+Only output JSON.
+
+Region: {region}
+""",
+    suffix="""Question: {question}{context}
+JSON:""",
+)
+
+
+class AgricultureAgent(BaseAgent):
+    name = "AgricultureAgent"
+    domain = "agriculture"
+    schema = {
+        "farmer_response": "string",
+        "confidence": "number",
+        "key_insights": "array",
+        "recommendations": "array",
+        "region_specific_factors": "array",
+        "follow_up_questions": "array",
+    }
+    prompt_template = AGRICULTURE_PROMPT
@@ -1,31 +1,171 @@
-from abc import ABC, abstractmethod
-from typing import Dict, Any, Optional
+from abc import ABC
+from typing import Dict, Any, Optional, List
+import json
+import logging
 import os
-from ..config import MODEL_CONFIG, HF_MODEL
+from ..config import MODEL_CONFIG, HF_MODEL, MODEL_CONTEXT_TOKENS, CONTEXT_RECENT_TURNS, CONTEXT_SUMMARY_SHARE, INFERENCE_BACKEND, LOCAL_MODEL_PATH, LOCAL_N_CTX
 from ..llm_providers import call_huggingface_inference
+from ..prompts import PromptTemplate
+from ..tracing import span, current_span
+
+logger = logging.getLogger(__name__)
+
+_encoder = None
+
+
+def estimate_tokens(text: str) -> int:
+    """Token count via tiktoken when installed, else the ~4 chars/token heuristic."""
+    global _encoder
+    if _encoder is None:
+        try:
+            import tiktoken  # type: ignore
+            _encoder = tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            _encoder = False
+    if _encoder:
+        return len(_encoder.encode(text))
+    return (len(text) + 3) // 4
+
+
+def context_window(model: str) -> int:
+    return MODEL_CONTEXT_TOKENS.get(model, MODEL_CONTEXT_TOKENS["default"])
+
+
+def _turn_line(turn: Dict[str, Any]) -> str:
+    a = turn.get("a")
+    if isinstance(a, dict):
+        answer = next((str(v) for k, v in a.items() if k.endswith("_response") or k == "response"), "")[:160]
+        insights = a.get("key_insights") or []
+        if insights:
+            answer += f" (insights: {'; '.join(str(i)[:60] for i in insights[:3])})"
+    else:
+        answer = str(a or "")[:160]
+    return f"Q: {turn.get('q', '')} -> {answer}"
+
+
+def _dumps(obj: Any) -> str:
+    return json.dumps(obj, ensure_ascii=False, default=str)
+
 
 class BaseAgent(ABC):
     name: str = "BaseAgent"
     domain: str = "generic"
+    # Flat {key: "string"|"number"|"array"} response shape; lets the validator accept
+    # locally repaired JSON without an LLM round-trip
+    schema: Dict[str, str] = {}
+    # Static instructions/schema (parameterised by region) first, question and context last
+    prompt_template: Optional[PromptTemplate] = None
 
-    @abstractmethod
     def build_prompt(self, question: str, region: str, context: Optional[Dict[str, Any]]) -> str:
-        ...
+        return self.prompt_template.render(region=region, question=question, context=self.render_context(context))
 
-    def run(self, prompt: str) -> str:
+    def precompile_prompts(self, regions: List[str]) -> int:
+        return self.prompt_template.precompile({"region": r} for r in regions)
+
+    def model_name(self) -> str:
         # Per-domain override via AGRICULTURE_HF_MODEL / EDUCATION_HF_MODEL / HEALTHCARE_HF_MODEL
         dom_key = f"{self.domain.upper()}_HF_MODEL"
-        model = os.getenv(dom_key) or HF_MODEL
-        return call_huggingface_inference(prompt, model=model)
+        return os.getenv(dom_key) or HF_MODEL
+
+    def local_model_path(self) -> str:
+        # Per-domain GGUF via AGRICULTURE_LOCAL_MODEL_PATH etc., like the HF overrides
+        return os.getenv(f"{self.domain.upper()}_LOCAL_MODEL_PATH") or LOCAL_MODEL_PATH
+
+    def window(self) -> int:
+        if INFERENCE_BACKEND == "local":
+            return LOCAL_N_CTX
+        return context_window(self.model_name())
+
+    def context_budget(self) -> int:
+        # Leave room for the static instructions and the completion
+        return max(256, self.window() - MODEL_CONFIG["max_new_tokens"] - 512)
+
+    def _rolling_summary(self, context: Dict[str, Any], older: List[Dict[str, Any]]) -> str:
+        # Summary of turns that fell out of the recent window, folded in incrementally and
+        # cached on the session context; indexes are absolute so history truncation is safe
+        base = context.get("turns_dropped", 0)
+        upto = base + len(older)
+        cached = context.get("_rolling_summary") or {"upto": 0, "lines": []}
+        lines = list(cached["lines"])
+        start = max(cached["upto"], base)
+        for turn in older[start - base:]:
+            lines.append(_turn_line(turn))
+        if start < upto:
+            # The view trims further to its token share; this just bounds session size
+            lines = lines[-200:]
+            context["_rolling_summary"] = {"upto": upto, "lines": lines}
+        return "\n".join(lines)
+
+    def compact_context(self, context: Optional[Dict[str, Any]], budget: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """Render-ready view of the session context that fits the model's token budget:
+        all-provider payloads are dropped, only the last CONTEXT_RECENT_TURNS turns are
+        kept verbatim, and older turns are represented by the rolling summary."""
+        if not context:
+            return None
+        budget = budget or self.context_budget()
+        history = context.get("history") or []
+        # Underscore keys are bookkeeping (rolling/final summaries), not prompt material
+        view = {k: v for k, v in context.items() if k not in ("history", "turns_dropped") and not k.startswith("_")}
+        recent_n = min(CONTEXT_RECENT_TURNS, len(history))
+        summary = self._rolling_summary(context, history[:len(history) - recent_n])
+        recent = [{"q": t.get("q"), "a": t.get("a")} for t in history[len(history) - recent_n:]]
+
+        def _build(summary_text: str, turns: list) -> Dict[str, Any]:
+            out = dict(view)
+            if summary_text:
+                out["earlier_turns_summary"] = summary_text
+            if turns:
+                out["recent_turns"] = turns
+            return out
+
+        # Bound the summary to its share of the budget, keeping the newest lines
+        summary_budget = int(budget * CONTEXT_SUMMARY_SHARE)
+        while summary and estimate_tokens(summary) > summary_budget:
+            summary = summary.split("\n", 1)[1] if "\n" in summary else summary[-summary_budget * 4:]
+        compact = _build(summary, recent)
+        while recent and estimate_tokens(_dumps(compact)) > budget:
+            # Demote the oldest verbatim turn into the summary view
+            summary = "\n".join(filter(None, [summary, _turn_line(recent[0])]))
+            recent = recent[1:]
+            compact = _build(summary, recent)
+        if estimate_tokens(_dumps(compact)) > budget:
+            compact.pop("earlier_turns_summary", None)
+        return compact or None
+
+    def render_context(self, context: Optional[Dict[str, Any]]) -> str:
+        compact = self.compact_context(context)
+        return f"\nContext: {_dumps(compact)}" if compact else ""
+
+    def run(self, prompt: str) -> str:
+        if INFERENCE_BACKEND == "cascade":
+            from ..cascade import cascade
+            result = cascade.run(prompt, schema=self.schema or None, agent=self.name, domain=self.domain)
+            current_span().set(cascade_tier=result["tier"], cascade_attempts=len(result["attempts"]))
+            return result["text"]
+        if INFERENCE_BACKEND == "local":
+            from ..local_inference import call_local, LocalInferenceError
+            try:
+                return call_local(prompt, model=self.local_model_path())
+            except LocalInferenceError as e:
+                logger.warning(f"⚠️ {self.name}: local inference unavailable ({e}); using the HF Inference API")
+        return call_huggingface_inference(prompt, model=self.model_name())
 
     def process(self, question: str, region: str, context: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
-        prompt = self.build_prompt(question, region, context)
-        raw = self.run(prompt)
+        model = {"local": self.local_model_path(), "cascade": "cascade"}.get(INFERENCE_BACKEND) or self.model_name()
+        with span(f"agent.{self.domain}", agent=self.name, model=model, backend=INFERENCE_BACKEND) as s:
+            prompt = self.build_prompt(question, region, context)
+            prompt_tokens = estimate_tokens(prompt)
+            s.set(prompt_tokens=prompt_tokens)
+            window = self.window()
+            if prompt_tokens + MODEL_CONFIG["max_new_tokens"] > window:
+                logger.warning(f"{self.name}: prompt of {prompt_tokens} tokens exceeds the {window}-token window")
+            raw = self.run(prompt)
         return {
             "agent": self.name,
             "domain": self.domain,
             "region": region,
             "question": question,
             "raw_response": raw,
+            "prompt_tokens": prompt_tokens,
             "status": "success",
-        }
\ No newline at end of file
+        }
@@ -1,16 +1,9 @@
-import json
-from typing import Dict, Any, Optional
 from .base import BaseAgent
+from ..prompts import registry
 
-class EducationAgent(BaseAgent):
-    name = "EducationAgent"
-    domain = "education"
-
-    def build_prompt(self, question: str, region: str, context: Optional[Dict[str, Any]]) -> str:
-        ctx = f"\nContext: {json.dumps(context, ensure_ascii=False)}" if context else ""
-        return f"""You are an education survey agent for India, region {region}.
-Question: {question}{ctx}
-
+EDUCATION_PROMPT = registry.register(
+    "agent.education",
+    prefix="""You are an education survey agent for India.
 Respond with JSON:
 {{
  "student_response": "...",
@@ -22,4 +15,26 @@ Respond with JSON:
  "education_level": "primary/secondary/higher",
  "infrastructure_needs": ["..."]
 }}
-Only output JSON:"""
\ No newline at end of file
+Only output JSON.
+
+Region: {region}
+""",
+    suffix="""Question: {question}{context}
+JSON:""",
+)
+
+
+class EducationAgent(BaseAgent):
+    name = "EducationAgent"
+    domain = "education"
+    schema = {
+        "student_response": "string",
+        "confidence": "number",
+        "key_insights": "array",
+        "recommendations": "array",
+        "region_specific_factors": "array",
+        "follow_up_questions": "array",
+        "education_level": "string",
+        "infrastructure_needs": "array",
+    }
+    prompt_template = EDUCATION_PROMPT
@@ -1,16 +1,9 @@
-import json
-from typing import Dict, Any, Optional
 from .base import BaseAgent
+from ..prompts import registry
 
-class HealthAgent(BaseAgent):
-    name = "HealthAgent"
-    domain = "healthcare"
-
-    def build_prompt(self, question: str, region: str, context: Optional[Dict[str, Any]]) -> str:
-        ctx = f"\nContext: {json.dumps(context, ensure_ascii=False)}" if context else ""
-        return f"""You are a healthcare survey agent for India, region {region}.
-Question: {question}{ctx}
-
+HEALTHCARE_PROMPT = registry.register(
+    "agent.healthcare",
+    prefix="""You are a healthcare survey agent for India.
 Respond with JSON:
 {{
  "patient_response": "...",
@@ -22,4 +15,26 @@ Respond with JSON:
  "healthcare_facility_type": "primary/secondary/tertiary",
  "urgent_needs": ["..."]
 }}
-Only output JSON:"""
\ No newline at end of file
+Only output JSON.
+
+Region: {region}
+""",
+    suffix="""Question: {question}{context}
+JSON:""",
+)
+
+
+class HealthAgent(BaseAgent):
+    name = "HealthAgent"
+    domain = "healthcare"
+    schema = {
+        "patient_response": "string",
+        "confidence": "number",
+        "key_insights": "array",
+        "recommendations": "array",
+        "region_specific_factors": "array",
+        "follow_up_questions": "array",
+        "healthcare_facility_type": "string",
+        "urgent_needs": "array",
+    }
+    prompt_template = HEALTHCARE_PROMPT
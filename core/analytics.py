@@ -0,0 +1,403 @@
+"""Aggregations over stored survey responses.
+
+Per-(domain, region) rollups are kept up to date from `db.save_response` and answer
+unfiltered dashboard queries without touching the store. Time-filtered or `fresh`
+queries run as Mongo aggregation pipelines when Mongo is connected, and otherwise as
+vectorised pandas operations over the in-memory store. Zones come from INDIAN_REGIONS.
+
+    python -m core.analytics --by zone
+"""
+from collections import Counter
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+import argparse
+import json
+import logging
+import threading
+
+from .config import INDIAN_REGIONS, SURVEY_DOMAINS, ANALYTICS_CONFIDENCE_BINS, ANALYTICS_MAX_INSIGHTS
+from .db import db
+
+logger = logging.getLogger(__name__)
+
+# Madhya Pradesh is listed under both west and central; the first zone wins
+ZONE_OF_REGION: Dict[str, str] = {}
+for _zone, _states in INDIAN_REGIONS.items():
+    ZONE_OF_REGION.setdefault(_zone, _zone)
+    for _state in _states:
+        ZONE_OF_REGION.setdefault(_state, _zone)
+
+_PROJECTION = {"_id": 0, "domain": 1, "region": 1, "timestamp": 1, "cache_hit": 1, "processing_time": 1, "agent_response.confidence": 1, "agent_response.key_insights": 1}
+_CELL_FIELDS = ("responses", "confidence_n", "confidence_sum", "cache_hits", "time_n", "time_sum")
+
+
+def zone_of(region: Optional[str]) -> str:
+    return ZONE_OF_REGION.get(region or "", "other")
+
+
+def regions_in(zone: str) -> List[str]:
+    return [zone, *INDIAN_REGIONS.get(zone, [])]
+
+
+def normalize_insight(text: str) -> str:
+    return " ".join(text.split()).strip(" .").lower()
+
+
+def _number(value: Any) -> Optional[float]:
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    return None
+
+
+def _fields(doc: Dict[str, Any]) -> Dict[str, Any]:
+    answer = doc.get("agent_response") if isinstance(doc.get("agent_response"), dict) else {}
+    insights = answer.get("key_insights") if isinstance(answer.get("key_insights"), list) else []
+    return {
+        "domain": doc.get("domain") or "unknown",
+        "region": doc.get("region") or "unknown",
+        "timestamp": doc.get("timestamp"),
+        "confidence": _number(answer.get("confidence")),
+        "cache_hit": bool(doc.get("cache_hit")),
+        "processing_time": _number(doc.get("processing_time")),
+        "key_insights": [normalize_insight(i) for i in insights if isinstance(i, str) and i.strip()],
+    }
+
+
+def _bin(confidence: float, bins: int) -> Optional[int]:
+    if not 0.0 <= confidence <= 1.0:
+        return None
+    return min(int(confidence * bins), bins - 1)
+
+
+def _keep(domain: str, region: str, filters: Dict[str, Any]) -> bool:
+    if filters.get("domain") and domain != filters["domain"]:
+        return False
+    if filters.get("region") and region != filters["region"]:
+        return False
+    if filters.get("zone") and zone_of(region) != filters["zone"]:
+        return False
+    return True
+
+
+def summarize_cells(cells: Iterable[Tuple[str, str, Dict[str, float]]], by: Sequence[str]) -> List[Dict[str, Any]]:
+    """Combine per-(domain, region) sums into rows grouped by any of domain/zone/region."""
+    unknown = set(by) - {"domain", "zone", "region"}
+    if unknown:
+        raise ValueError(f"Cannot group by {', '.join(sorted(unknown))}")
+    groups: Dict[tuple, Dict[str, float]] = {}
+    for domain, region, cell in cells:
+        labels = {"domain": domain, "region": region, "zone": zone_of(region)}
+        key = tuple(labels[k] for k in by)
+        acc = groups.setdefault(key, dict.fromkeys(_CELL_FIELDS, 0.0))
+        for field in _CELL_FIELDS:
+            acc[field] += cell.get(field) or 0.0
+    rows = []
+    for key, acc in groups.items():
+        rows.append({
+            **dict(zip(by, key)),
+            "responses": int(acc["responses"]),
+            "avg_confidence": acc["confidence_sum"] / acc["confidence_n"] if acc["confidence_n"] else None,
+            "cache_hit_rate": acc["cache_hits"] / acc["responses"] if acc["responses"] else 0.0,
+            "avg_processing_time": acc["time_sum"] / acc["time_n"] if acc["time_n"] else None,
+        })
+    rows.sort(key=lambda r: r["responses"], reverse=True)
+    return rows
+
+
+class Rollups:
+    """Running per-(domain, region) counts, sums, confidence histogram and insight counts.
+
+    Insight counters are pruned to the ANALYTICS_MAX_INSIGHTS most common once they
+    grow past twice that, so counts for rare insights are approximate.
+    """
+
+    def __init__(self, bins: int = ANALYTICS_CONFIDENCE_BINS, max_insights: int = ANALYTICS_MAX_INSIGHTS, cutoff: Optional[datetime] = None):
+        self.bins = bins
+        self.max_insights = max_insights
+        # Writes stamped before this were loaded from the store when the rollups were built
+        self.cutoff = cutoff
+        self._lock = threading.Lock()
+        self._cells: Dict[Tuple[str, str], Dict[str, Any]] = {}
+
+    def add(self, doc: Dict[str, Any]):
+        f = _fields(doc)
+        with self._lock:
+            cell = self._cells.get((f["domain"], f["region"]))
+            if cell is None:
+                cell = self._cells[(f["domain"], f["region"])] = {**dict.fromkeys(_CELL_FIELDS, 0.0), "histogram": [0] * self.bins, "out_of_range": 0, "insights": Counter()}
+            cell["responses"] += 1
+            cell["cache_hits"] += f["cache_hit"]
+            if f["confidence"] is not None:
+                cell["confidence_n"] += 1
+                cell["confidence_sum"] += f["confidence"]
+                i = _bin(f["confidence"], self.bins)
+                if i is None:
+                    cell["out_of_range"] += 1
+                else:
+                    cell["histogram"][i] += 1
+            if f["processing_time"] is not None:
+                cell["time_n"] += 1
+                cell["time_sum"] += f["processing_time"]
+            insights = cell["insights"]
+            insights.update(f["key_insights"])
+            if len(insights) > 2 * self.max_insights:
+                cell["insights"] = Counter(dict(insights.most_common(self.max_insights)))
+
+    def observe(self, doc: Dict[str, Any]):
+        ts = doc.get("timestamp")
+        if self.cutoff is not None and isinstance(ts, datetime) and ts < self.cutoff:
+            return
+        self.add(doc)
+
+    def _select(self, filters: Dict[str, Any]) -> List[Tuple[str, str, Dict[str, Any]]]:
+        with self._lock:
+            return [(d, r, {**c, "histogram": list(c["histogram"]), "insights": Counter(c["insights"])}) for (d, r), c in self._cells.items() if _keep(d, r, filters)]
+
+    def summary(self, by: Sequence[str], **filters) -> List[Dict[str, Any]]:
+        return summarize_cells(self._select(filters), by)
+
+    def confidence_distribution(self, **filters) -> Dict[str, Any]:
+        counts = [0] * self.bins
+        out_of_range = 0
+        for _, _, cell in self._select(filters):
+            counts = [a + b for a, b in zip(counts, cell["histogram"])]
+            out_of_range += cell["out_of_range"]
+        return {"edges": [i / self.bins for i in range(self.bins + 1)], "counts": counts, "out_of_range": out_of_range}
+
+    def top_insights(self, n: int, **filters) -> List[Dict[str, Any]]:
+        total: Counter = Counter()
+        for _, _, cell in self._select(filters):
+            total.update(cell["insights"])
+        return [{"insight": k, "count": v} for k, v in total.most_common(n)]
+
+
+def _mongo_match(domain=None, zone=None, region=None, since=None) -> Dict[str, Any]:
+    match: Dict[str, Any] = {}
+    if domain:
+        match["domain"] = domain
+    if region:
+        match["region"] = region
+    elif zone:
+        match["region"] = {"$in": regions_in(zone)}
+    if since is not None:
+        match["timestamp"] = {"$gte": since}
+    return match
+
+
+def _pandas():
+    try:
+        import pandas as pd  # type: ignore
+        import numpy as np  # type: ignore
+        return pd, np
+    except Exception:
+        return None
+
+
+class Analytics:
+    """Dashboard queries. Unfiltered-by-time queries read the rollups unless `fresh`."""
+
+    def __init__(self, bins: int = ANALYTICS_CONFIDENCE_BINS):
+        self.bins = bins
+        self._rollups: Optional[Rollups] = None
+        # Rollups being loaded; they observe writes past their cutoff while the load runs
+        self._building: Optional[Rollups] = None
+        self._seed_lock = threading.Lock()
+        db.subscribe(self._observe)
+
+    def _observe(self, doc: Dict[str, Any]):
+        # Until the first query builds the rollups, the store itself is the source of truth
+        for rollups in (self._rollups, self._building):
+            if rollups is not None:
+                rollups.observe(doc)
+
+    @property
+    def rollups(self) -> Rollups:
+        with self._seed_lock:
+            if self._rollups is None:
+                self._build()
+            return self._rollups
+
+    def rebuild(self) -> Rollups:
+        with self._seed_lock:
+            return self._build()
+
+    def _build(self) -> Rollups:
+        cutoff = datetime.utcnow()
+        rollups = self._building = Rollups(self.bins, cutoff=cutoff)
+        try:
+            for doc in self._docs(until=cutoff):
+                rollups.add(doc)
+            # Published before `_building` is cleared so no write falls between the two
+            self._rollups = rollups
+        finally:
+            self._building = None
+        return rollups
+
+    def _docs(self, until: Optional[datetime] = None, **filters) -> Iterable[Dict[str, Any]]:
+        if db.db is not None:
+            db.flush()
+            match = _mongo_match(**filters)
+            if until is not None:
+                match.setdefault("timestamp", {})["$lt"] = until
+            return db.db["responses"].find(match, _PROJECTION).batch_size(1000)
+        since = filters.get("since")
+        return [
+            doc for doc in list(db.mem["responses"])
+            if _keep(doc.get("domain") or "unknown", doc.get("region") or "unknown", filters)
+            and (since is None or doc["timestamp"] >= since)
+            and (until is None or doc["timestamp"] < until)
+        ]
+
+    def frame(self, **filters):
+        """Stored responses as a pandas DataFrame, one row per response (needs pandas)."""
+        mods = _pandas()
+        if mods is None:
+            raise RuntimeError("pandas is required for Analytics.frame")
+        pd, _ = mods
+        columns: Dict[str, List[Any]] = {k: [] for k in ("domain", "region", "timestamp", "confidence", "cache_hit", "processing_time", "key_insights")}
+        for doc in self._docs(**filters):
+            for k, v in _fields(doc).items():
+                columns[k].append(v)
+        df = pd.DataFrame(columns)
+        df["zone"] = df["region"].map(ZONE_OF_REGION).fillna("other")
+        df["confidence"] = pd.to_numeric(df["confidence"], errors="coerce")
+        df["processing_time"] = pd.to_numeric(df["processing_time"], errors="coerce")
+        return df
+
+    def _local(self, filters: Dict[str, Any]):
+        """A DataFrame for the in-memory store, or rollups over it when pandas is missing."""
+        if _pandas() is not None:
+            return self.frame(**filters)
+        rollups = Rollups(self.bins)
+        for doc in self._docs(**filters):
+            rollups.add(doc)
+        return rollups
+
+    def summary(self, by: Sequence[str] = ("domain", "region"), domain: Optional[str] = None, zone: Optional[str] = None, region: Optional[str] = None, since: Optional[datetime] = None, fresh: bool = False) -> List[Dict[str, Any]]:
+        """Responses, mean confidence, cache-hit rate and mean latency grouped by `by`
+        (any of domain, zone, region)."""
+        filters = {"domain": domain, "zone": zone, "region": region}
+        if since is None and not fresh:
+            return self.rollups.summary(by, **filters)
+        filters["since"] = since
+        if db.db is not None:
+            pipeline = [
+                {"$match": _mongo_match(**filters)},
+                {"$group": {
+                    "_id": {"domain": "$domain", "region": "$region"},
+                    "responses": {"$sum": 1},
+                    "confidence_n": {"$sum": {"$cond": [{"$isNumber": "$agent_response.confidence"}, 1, 0]}},
+                    "confidence_sum": {"$sum": "$agent_response.confidence"},
+                    "cache_hits": {"$sum": {"$cond": [{"$ifNull": ["$cache_hit", False]}, 1, 0]}},
+                    "time_n": {"$sum": {"$cond": [{"$isNumber": "$processing_time"}, 1, 0]}},
+                    "time_sum": {"$sum": "$processing_time"},
+                }},
+            ]
+            cells = [(g["_id"].get("domain") or "unknown", g["_id"].get("region") or "unknown", g) for g in db.db["responses"].aggregate(pipeline)]
+            return summarize_cells(cells, by)
+        local = self._local(filters)
+        if isinstance(local, Rollups):
+            return local.summary(by)
+        if local.empty:
+            return []
+        local["confidence_present"] = local["confidence"].notna()
+        local["time_present"] = local["processing_time"].notna()
+        grouped = local.groupby(["domain", "region"]).agg(
+            responses=("domain", "size"),
+            confidence_n=("confidence_present", "sum"),
+            confidence_sum=("confidence", "sum"),
+            cache_hits=("cache_hit", "sum"),
+            time_n=("time_present", "sum"),
+            time_sum=("processing_time", "sum"),
+        )
+        return summarize_cells(((d, r, row) for (d, r), row in grouped.to_dict("index").items()), by)
+
+    def confidence_distribution(self, domain: Optional[str] = None, zone: Optional[str] = None, region: Optional[str] = None, since: Optional[datetime] = None, fresh: bool = False) -> Dict[str, Any]:
+        """Histogram of agent confidence over [0, 1] in ANALYTICS_CONFIDENCE_BINS bins."""
+        filters = {"domain": domain, "zone": zone, "region": region}
+        if since is None and not fresh:
+            return self.rollups.confidence_distribution(**filters)
+        filters["since"] = since
+        edges = [i / self.bins for i in range(self.bins + 1)]
+        if db.db is not None:
+            pipeline = [
+                {"$match": {**_mongo_match(**filters), "agent_response.confidence": {"$type": "number"}}},
+                # The upper edge is nudged so a confidence of exactly 1.0 lands in the last bin
+                {"$bucket": {"groupBy": "$agent_response.confidence", "boundaries": edges[:-1] + [1.0 + 1e-9], "default": "out_of_range", "output": {"count": {"$sum": 1}}}},
+            ]
+            counts = [0] * self.bins
+            out_of_range = 0
+            for b in db.db["responses"].aggregate(pipeline):
+                if b["_id"] == "out_of_range":
+                    out_of_range = b["count"]
+                else:
+                    counts[min(round(b["_id"] * self.bins), self.bins - 1)] = b["count"]
+            return {"edges": edges, "counts": counts, "out_of_range": out_of_range}
+        local = self._local(filters)
+        if isinstance(local, Rollups):
+            return local.confidence_distribution()
+        _, np = _pandas()
+        values = local["confidence"].dropna().to_numpy(dtype=float)
+        in_range = (values >= 0.0) & (values <= 1.0)
+        counts, _ = np.histogram(values[in_range], bins=self.bins, range=(0.0, 1.0))
+        return {"edges": edges, "counts": counts.tolist(), "out_of_range": int((~in_range).sum())}
+
+    def top_insights(self, n: int = 20, domain: Optional[str] = None, zone: Optional[str] = None, region: Optional[str] = None, since: Optional[datetime] = None, fresh: bool = False) -> List[Dict[str, Any]]:
+        """Most frequent key insights (case- and whitespace-normalised)."""
+        filters = {"domain": domain, "zone": zone, "region": region}
+        if since is None and not fresh:
+            return self.rollups.top_insights(n, **filters)
+        filters["since"] = since
+        if db.db is not None:
+            pipeline = [
+                {"$match": _mongo_match(**filters)},
+                {"$unwind": "$agent_response.key_insights"},
+                {"$match": {"agent_response.key_insights": {"$type": "string"}}},
+                {"$group": {"_id": {"$toLower": {"$trim": {"input": "$agent_response.key_insights", "chars": " ."}}}, "count": {"$sum": 1}}},
+                {"$match": {"_id": {"$ne": ""}}},
+                {"$sort": {"count": -1}},
+                {"$limit": n},
+            ]
+            return [{"insight": g["_id"], "count": g["count"]} for g in db.db["responses"].aggregate(pipeline)]
+        local = self._local(filters)
+        if isinstance(local, Rollups):
+            return local.top_insights(n)
+        counts = local["key_insights"].explode().dropna().value_counts().head(n)
+        return [{"insight": k, "count": int(v)} for k, v in counts.items()]
+
+    def dashboard(self, **filters) -> Dict[str, Any]:
+        """Everything a dashboard page needs in one call."""
+        n = filters.pop("n", 20)
+        return {
+            "by_domain": self.summary(("domain",), **filters),
+            "by_zone": self.summary(("zone",), **filters),
+            "by_domain_region": self.summary(("domain", "region"), **filters),
+            "confidence": self.confidence_distribution(**filters),
+            "top_insights": self.top_insights(n, **filters),
+            "domains": SURVEY_DOMAINS,
+            "zones": list(INDIAN_REGIONS),
+        }
+
+
+analytics = Analytics()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Aggregate stored survey responses.")
+    parser.add_argument("--by", default="domain,region", help="comma-separated: domain, zone, region")
+    parser.add_argument("--domain", choices=SURVEY_DOMAINS)
+    parser.add_argument("--zone", choices=list(INDIAN_REGIONS))
+    parser.add_argument("--region")
+    parser.add_argument("--insights", type=int, default=10)
+    args = parser.parse_args(argv)
+
+    filters = {"domain": args.domain, "zone": args.zone, "region": args.region, "fresh": True}
+    print(json.dumps({
+        "summary": analytics.summary(tuple(k.strip() for k in args.by.split(",") if k.strip()), **filters),
+        "confidence": analytics.confidence_distribution(**filters),
+        "top_insights": analytics.top_insights(args.insights, **filters),
+    }, indent=2, default=str))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+import asyncio
+import functools
+import hashlib
+import inspect
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from .config import (
+    LLM_CACHE_ENABLED, LLM_CACHE_MAX_ENTRIES, LLM_CACHE_TTL, LLM_CACHE_DISK, LLM_CACHE_PATH,
+    LLM_CACHE_BYPASS_SAMPLED, MODEL_CONFIG,
+)
+from .tracing import current_span
+
+logger = logging.getLogger(__name__)
+
+# Arguments that never change the response and must not split the cache
+_IGNORED_ARGS = {"timeout"}
+
+
+def make_key(provider: str, params: Dict[str, Any]) -> str:
+    blob = json.dumps({"provider": provider, **params}, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+class MemoryTier:
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires = item
+            if expires < time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        with self._lock:
+            self._data[key] = (value, time.time() + (ttl or self.ttl))
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SQLiteTier:
+    def __init__(self, path: str, ttl: float):
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL NOT NULL)")
+        return self._conn
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            row = self._connect().execute("SELECT value, expires FROM cache WHERE key = ?", (key,)).fetchone()
+        if row is None or row[1] < time.time():
+            return None
+        return json.loads(row[0])
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires) VALUES (?, ?, ?)",
+                (key, json.dumps(value, ensure_ascii=False), time.time() + (ttl or self.ttl)),
+            )
+            conn.commit()
+
+    def prune(self):
+        with self._lock:
+            conn = self._connect()
+            conn.execute("DELETE FROM cache WHERE expires < ?", (time.time(),))
+            conn.commit()
+
+    def clear(self):
+        with self._lock:
+            conn = self._connect()
+            conn.execute("DELETE FROM cache")
+            conn.commit()
+
+
+class ResponseCache:
+    """Two-tier (in-memory LRU + SQLite) content-addressed cache for provider responses."""
+
+    def __init__(self, max_entries: int = LLM_CACHE_MAX_ENTRIES, ttl: float = LLM_CACHE_TTL, path: Optional[str] = LLM_CACHE_PATH if LLM_CACHE_DISK else None):
+        self.memory = MemoryTier(max_entries, ttl)
+        self.disk = SQLiteTier(path, ttl) if path else None
+        self._stats_lock = threading.Lock()
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "bypassed": 0, "stores": 0}
+
+    def _count(self, key: str):
+        with self._stats_lock:
+            self.stats[key] += 1
+
+    def get(self, key: str) -> Optional[Any]:
+        value = self.memory.get(key)
+        if value is not None:
+            self._count("memory_hits")
+            return value
+        if self.disk is not None:
+            try:
+                value = self.disk.get(key)
+            except Exception as e:
+                logger.warning(f"LLM cache disk read failed: {e}")
+                value = None
+            if value is not None:
+                self._count("disk_hits")
+                self.memory.set(key, value)
+                return value
+        self._count("misses")
+        return None
+
+    def set(self, key: str, value: Any):
+        self.memory.set(key, value)
+        if self.disk is not None:
+            try:
+                self.disk.set(key, value)
+            except Exception as e:
+                logger.warning(f"LLM cache disk write failed: {e}")
+        self._count("stores")
+
+    def clear(self):
+        self.memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            stats = dict(self.stats)
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["memory_hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+        stats["memory_entries"] = len(self.memory)
+        return stats
+
+
+response_cache = ResponseCache()
+
+
+def _default_sampling() -> Dict[str, Any]:
+    return {k: MODEL_CONFIG.get(k) for k in ("temperature", "max_new_tokens", "top_p")}
+
+
+def bypass_sampled(params: Optional[Dict[str, Any]]) -> bool:
+    """True when LLM_CACHE_BYPASS_SAMPLED is set and these sampling params sample."""
+    return LLM_CACHE_BYPASS_SAMPLED and bool(params) and (params.get("temperature") or 0) > 0
+
+
+def cached(provider: str, sampling: Optional[Callable[[], Dict[str, Any]]] = _default_sampling, cacheable: Optional[Callable[[Any], bool]] = None):
+    """Cache a provider call function on (provider, model, prompt, sampling params).
+
+    The wrapped function accepts an extra `no_cache=True` keyword to force a fresh call.
+    With LLM_CACHE_BYPASS_SAMPLED set, sampled calls (temperature > 0) always bypass.
+    Works for both plain and async functions.
+    """
+    def decorator(fn):
+        sig = inspect.signature(fn)
+
+        def _key(args, kwargs) -> Optional[str]:
+            bound = sig.bind(*args, **kwargs)
+            bound.apply_defaults()
+            params = {k: v for k, v in bound.arguments.items() if k not in _IGNORED_ARGS}
+            params["sampling"] = sampling() if sampling else None
+            return make_key(provider, params)
+
+        def _bypass(no_cache: bool) -> bool:
+            if not LLM_CACHE_ENABLED or no_cache:
+                return True
+            return bool(sampling) and bypass_sampled(sampling())
+
+        def _store(key: str, result: Any):
+            if result is not None and (cacheable is None or cacheable(result)):
+                response_cache.set(key, result)
+
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, no_cache: bool = False, **kwargs):
+                if _bypass(no_cache):
+                    response_cache._count("bypassed")
+                    return await fn(*args, **kwargs)
+                key = _key(args, kwargs)
+                hit = response_cache.get(key)
+                current_span().set(cache_hit=hit is not None)
+                if hit is not None:
+                    return hit
+                result = await fn(*args, **kwargs)
+                _store(key, result)
+                return result
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, no_cache: bool = False, **kwargs):
+            if _bypass(no_cache):
+                response_cache._count("bypassed")
+                return fn(*args, **kwargs)
+            key = _key(args, kwargs)
+            hit = response_cache.get(key)
+            current_span().set(cache_hit=hit is not None)
+            if hit is not None:
+                return hit
+            result = fn(*args, **kwargs)
+            _store(key, result)
+            return result
+        return wrapper
+    return decorator
@@ -0,0 +1,130 @@
+"""Cheap-model-first cascade for schema'd agent calls.
+
+Each tier ("provider:model", CASCADE_TIERS) is tried in order. An answer that parses and
+conforms to the agent schema with `confidence` at or above the threshold is served;
+otherwise the call escalates to the next tier. Tiers whose circuit is open are skipped.
+If no tier passes, the best answer seen (valid, then most confident) is returned.
+"""
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional
+import json
+import threading
+import time
+
+from .config import CASCADE_TIERS, CASCADE_MIN_CONFIDENCE, CASCADE_THRESHOLDS, ROUTER_CALL_TIMEOUT
+from .json_repair import repair_json, conform, is_placeholder
+from .llm_providers import call_openai, call_groq, call_gemini, call_huggingface_inference, _not_stub
+from .prompts import registry
+from .router import router
+from .tracing import span
+
+
+def min_confidence(agent: Optional[str] = None, domain: Optional[str] = None) -> float:
+    for key in (agent, domain):
+        if key and key in CASCADE_THRESHOLDS:
+            return CASCADE_THRESHOLDS[key]
+    return CASCADE_MIN_CONFIDENCE
+
+
+def _tier_call(tier: str, prompt: str, json_object: bool) -> Callable[[], str]:
+    provider, _, model = tier.partition(":")
+    if provider == "openai":
+        return lambda: call_openai(prompt, model=model or "gpt-4o-mini", json_object=json_object, timeout=ROUTER_CALL_TIMEOUT)
+    if provider == "groq":
+        return lambda: call_groq(prompt, model=model or "llama3-8b-8192", json_object=json_object, timeout=ROUTER_CALL_TIMEOUT)
+    if provider == "gemini":
+        return lambda: call_gemini(prompt, model=model or "gemini-1.5-pro", timeout=ROUTER_CALL_TIMEOUT)
+    if provider == "huggingface":
+        return lambda: call_huggingface_inference(prompt, model=model or None, timeout=ROUTER_CALL_TIMEOUT)
+    if provider == "local":
+        from .local_inference import call_local
+        return lambda: call_local(prompt, model=model or None)
+    raise ValueError(f"Unknown cascade tier {tier}")
+
+
+def assess(text: str, schema: Optional[Dict[str, str]], threshold: float):
+    """(conformed object or None, reason to escalate or None)."""
+    # Stub output and echoed prompts carry the prompt's schema example, not an answer
+    if text and (not _not_stub(text) or registry.echoes(text)):
+        return None, "invalid"
+    obj, _ = repair_json(text)
+    if schema:
+        obj = conform(obj, schema)
+    if not isinstance(obj, dict) or is_placeholder(obj):
+        return None, "invalid"
+    confidence = obj.get("confidence")
+    if isinstance(confidence, (int, float)) and not isinstance(confidence, bool):
+        if confidence < threshold:
+            return obj, "low_confidence"
+    elif threshold > 0:
+        return obj, "no_confidence"
+    return obj, None
+
+
+class Cascade:
+    def __init__(self, tiers: Optional[List[str]] = None):
+        self.tiers = list(tiers or CASCADE_TIERS)
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, Any]] = {}
+
+    def _record(self, key: str, served_by: str, attempts: List[Dict[str, Any]]):
+        with self._lock:
+            st = self._stats.setdefault(key, {"calls": 0, "escalated": 0, "served_by": Counter(), "reasons": Counter()})
+            st["calls"] += 1
+            st["served_by"][served_by] += 1
+            if len(attempts) > 1:
+                st["escalated"] += 1
+            for a in attempts:
+                if a["reason"]:
+                    st["reasons"][a["reason"]] += 1
+
+    def run(self, prompt: str, schema: Optional[Dict[str, str]] = None, agent: Optional[str] = None, domain: Optional[str] = None, threshold: Optional[float] = None, json_object: bool = True) -> Dict[str, Any]:
+        """Returns {"text", "obj", "tier", "attempts": [{"tier", "reason", "seconds"}]}.
+        `text` is the conformed JSON when a tier produced one, else the last raw output."""
+        threshold = min_confidence(agent, domain) if threshold is None else threshold
+        key = agent or domain or "default"
+        attempts: List[Dict[str, Any]] = []
+        best = None  # (rank, tier, obj, text)
+        with span("cascade.run", key=key, threshold=threshold) as s:
+            tiers = [t for t in self.tiers if router.available(t)] or self.tiers
+            for tier in tiers:
+                t0 = time.time()
+                try:
+                    text = router.call([(tier, _tier_call(tier, prompt, json_object))], hedge=False)[1]
+                except Exception as e:
+                    attempts.append({"tier": tier, "reason": "error", "seconds": time.time() - t0, "error": str(e)[:200]})
+                    continue
+                obj, reason = assess(text, schema, threshold)
+                attempts.append({"tier": tier, "reason": reason, "seconds": time.time() - t0})
+                if reason is None:
+                    best = (3, tier, obj, text)
+                    break
+                confidence = obj.get("confidence") if obj else None
+                rank = (1 + (confidence if isinstance(confidence, (int, float)) else 0) / 2) if obj else 0
+                if best is None or rank > best[0]:
+                    best = (rank, tier, obj, text)
+            s.set(tiers_tried=len(attempts), escalations=max(0, len(attempts) - 1))
+            if best is None:
+                self._record(key, "none", attempts)
+                s.set(served_by="none")
+                return {"text": "", "obj": None, "tier": None, "attempts": attempts}
+            _, tier, obj, text = best
+            self._record(key, tier, attempts)
+            s.set(served_by=tier, passed=attempts[-1]["reason"] is None)
+            return {"text": json.dumps(obj, ensure_ascii=False) if obj else text, "obj": obj, "tier": tier, "attempts": attempts}
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out = {}
+            for key, st in self._stats.items():
+                out[key] = {
+                    "calls": st["calls"],
+                    "escalated": st["escalated"],
+                    "escalation_rate": st["escalated"] / st["calls"] if st["calls"] else 0.0,
+                    "served_by": dict(st["served_by"]),
+                    "reasons": dict(st["reasons"]),
+                }
+            return out
+
+
+cascade = Cascade()
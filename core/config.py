@@ -1,27 +1,63 @@
 import os
+import sys
+from collections.abc import Mapping
 from dotenv import load_dotenv
 
 load_dotenv()
 
-# Read from environment first, then fallback to Streamlit secrets if available
-try:
-    import streamlit as st  # type: ignore
-    _SECRETS = getattr(st, "secrets", {})
-except Exception:
-    _SECRETS = {}
+# Read from environment first, then fallback to Streamlit secrets if available.
+# Streamlit is only consulted when the process already imported it (i.e. we run under
+# `streamlit run`); importing it just to read secrets costs seconds on cold start.
+_SECRETS: Mapping | None = None
+
+
+def _secrets() -> Mapping:
+    global _SECRETS
+    if _SECRETS is None:
+        _SECRETS = {}
+        st = sys.modules.get("streamlit")
+        if st is not None:
+            try:
+                secrets = st.secrets
+                # st.secrets is a Mapping, not a dict; touching it raises if no secrets file exists
+                if isinstance(secrets, Mapping):
+                    _SECRETS = {k: secrets[k] for k in secrets.keys()}
+            except Exception:
+                pass
+    return _SECRETS
 
 
 def _get(name: str, default: str | None = None) -> str | None:
     val = os.getenv(name)
     if val is not None and val != "":
         return val
-    if isinstance(_SECRETS, dict):
-        sec_val = _SECRETS.get(name)
-        if sec_val is not None and str(sec_val) != "":
-            return str(sec_val)
+    sec_val = _secrets().get(name)
+    if sec_val is not None and str(sec_val) != "":
+        return str(sec_val)
     return default
 
 
+def _get_float(name: str, default: float) -> float:
+    try:
+        return float(_get(name) or default)
+    except ValueError:
+        return default
+
+
+def _get_int(name: str, default: int) -> int:
+    try:
+        return int(_get(name) or default)
+    except ValueError:
+        return default
+
+
+def _get_bool(name: str, default: bool) -> bool:
+    val = _get(name)
+    if val is None:
+        return default
+    return val.strip().lower() in ("1", "true", "yes", "on")
+
+
 def _get_any(names: list[str], default: str | None = None) -> str | None:
     for n in names:
         v = _get(n)
@@ -35,6 +71,7 @@ GEMINI_API_KEY = _get("GEMINI_API_KEY")
 # Prefer HF_API_KEY, keep backward-compatible fallbacks
 HF_API_KEY = _get_any(["HF_API_KEY", "HF_TOKEN", "HUGGINGFACE_API_KEY", "HUGGINGFACEHUB_API_TOKEN"]) 
 MONGO_URI = _get_any(["MONGO_URI", "MONGODB_URI"]) 
+MONGO_CONNECT_TIMEOUT_MS = _get_int("MONGO_CONNECT_TIMEOUT_MS", 2000)
 
 # Hugging Face model selection and URL (default to Mistral as requested)
 HF_MODEL = _get("HF_MODEL", "mistralai/Mistral-7B-Instruct-v0.2") or "mistralai/Mistral-7B-Instruct-v0.2"
@@ -60,3 +97,172 @@ MODEL_CONFIG = {
     "top_p": 0.9,
     "repetition_penalty": 1.1,
 }
+
+# Multi-provider fan-out (call_all_providers)
+PROVIDER_TIMEOUT = _get_float("PROVIDER_TIMEOUT", 120.0)
+ALL_PROVIDERS_DEADLINE = _get_float("ALL_PROVIDERS_DEADLINE", 60.0)
+ALL_PROVIDERS_FIRST_N = _get_int("ALL_PROVIDERS_FIRST_N", 0)  # 0 = wait for all providers
+
+# HTTP transport (keep-alive pools per provider host; HTTP/2 needs httpx[http2])
+HTTP_POOL_SIZE = _get_int("HTTP_POOL_SIZE", 16)
+HTTP2_ENABLED = _get_bool("HTTP2_ENABLED", True)
+
+# Provider response cache (in-memory LRU + SQLite). Set LLM_CACHE_BYPASS_SAMPLED to
+# always go to the network when temperature > 0.
+LLM_CACHE_ENABLED = _get_bool("LLM_CACHE_ENABLED", True)
+LLM_CACHE_MAX_ENTRIES = _get_int("LLM_CACHE_MAX_ENTRIES", 1024)
+LLM_CACHE_TTL = _get_float("LLM_CACHE_TTL", 24 * 3600.0)
+LLM_CACHE_DISK = _get_bool("LLM_CACHE_DISK", True)
+LLM_CACHE_PATH = _get("LLM_CACHE_PATH", ".cache/llm_cache.sqlite3") or ".cache/llm_cache.sqlite3"
+LLM_CACHE_BYPASS_SAMPLED = _get_bool("LLM_CACHE_BYPASS_SAMPLED", False)
+
+# Semantic near-duplicate answer cache for process_question (FAISS over EMBED_MODEL)
+SEMANTIC_CACHE_ENABLED = _get_bool("SEMANTIC_CACHE_ENABLED", True)
+SEMANTIC_CACHE_THRESHOLD = _get_float("SEMANTIC_CACHE_THRESHOLD", 0.92)
+SEMANTIC_CACHE_DIR = _get("SEMANTIC_CACHE_DIR", ".cache/semantic") or ".cache/semantic"
+SEMANTIC_CACHE_SAVE_EVERY = _get_int("SEMANTIC_CACHE_SAVE_EVERY", 20)
+
+# Session store: LRU by serialized size with idle TTL; evicted sessions can spill to
+# "sqlite" or "mongo" ("none" drops them)
+SESSION_MAX_BYTES = _get_int("SESSION_MAX_BYTES", 64 * 1024 * 1024)
+SESSION_TTL = _get_float("SESSION_TTL", 6 * 3600.0)
+SESSION_MAX_HISTORY = _get_int("SESSION_MAX_HISTORY", 50)
+SESSION_KEEP_MULTI = _get_int("SESSION_KEEP_MULTI", 1)
+SESSION_SPILL = (_get("SESSION_SPILL", "none") or "none").lower()
+SESSION_SPILL_PATH = _get("SESSION_SPILL_PATH", ".cache/sessions.sqlite3") or ".cache/sessions.sqlite3"
+
+# Prompt context compaction: context windows (tokens) per model, turns kept verbatim,
+# and the share of the context budget the rolling summary of older turns may use
+MODEL_CONTEXT_TOKENS = {
+    "default": 4096,
+    "mistralai/Mistral-7B-Instruct-v0.2": 32768,
+    "gpt-4o-mini": 128000,
+    "llama3-8b-8192": 8192,
+    "llama-3.3-70b-versatile": 128000,
+    "gemini-1.5-pro": 1000000,
+    "gemini-1.5-flash": 1000000,
+}
+CONTEXT_RECENT_TURNS = _get_int("CONTEXT_RECENT_TURNS", 3)
+CONTEXT_SUMMARY_SHARE = _get_float("CONTEXT_SUMMARY_SHARE", 0.3)
+
+# Mongo write-behind: batch size / flush interval (s), bounded queue with enqueue
+# timeout (s) before falling back to a synchronous write, retries of a failed batch with
+# the first backoff (s, doubled per retry), and the in-memory ring size
+DB_WRITE_BEHIND = _get_bool("DB_WRITE_BEHIND", True)
+DB_BATCH_SIZE = _get_int("DB_BATCH_SIZE", 100)
+DB_FLUSH_INTERVAL = _get_float("DB_FLUSH_INTERVAL", 1.0)
+DB_QUEUE_MAX = _get_int("DB_QUEUE_MAX", 10000)
+DB_ENQUEUE_TIMEOUT = _get_float("DB_ENQUEUE_TIMEOUT", 0.5)
+DB_WRITE_RETRIES = _get_int("DB_WRITE_RETRIES", 3)
+DB_RETRY_BACKOFF = _get_float("DB_RETRY_BACKOFF", 0.5)
+DB_MEM_MAX = _get_int("DB_MEM_MAX", 10000)
+
+# Tracing: comma-separated exporters ("jsonl", "otlp" or "none"); OTLP uses the
+# standard OTEL_EXPORTER_OTLP_* env vars for the collector endpoint
+TRACE_EXPORT = (_get("TRACE_EXPORT", "none") or "none").lower()
+TRACE_JSONL_PATH = _get("TRACE_JSONL_PATH", ".cache/traces.jsonl") or ".cache/traces.jsonl"
+TRACE_SERVICE_NAME = _get("TRACE_SERVICE_NAME", "survey-agent") or "survey-agent"
+
+# Adaptive provider routing: rolling health window, hedging past p95 and circuit breakers
+ROUTER_WINDOW = _get_int("ROUTER_WINDOW", 50)
+ROUTER_MIN_SAMPLES = _get_int("ROUTER_MIN_SAMPLES", 5)
+ROUTER_DEFAULT_LATENCY = _get_float("ROUTER_DEFAULT_LATENCY", 5.0)  # assumed until measured
+ROUTER_HEDGE = _get_bool("ROUTER_HEDGE", True)
+ROUTER_HEDGE_MIN_DELAY = _get_float("ROUTER_HEDGE_MIN_DELAY", 1.0)
+ROUTER_CALL_TIMEOUT = _get_float("ROUTER_CALL_TIMEOUT", 30.0)
+BREAKER_FAILURE_THRESHOLD = _get_int("BREAKER_FAILURE_THRESHOLD", 5)
+BREAKER_ERROR_RATE = _get_float("BREAKER_ERROR_RATE", 0.5)
+BREAKER_COOLDOWN = _get_float("BREAKER_COOLDOWN", 30.0)
+
+# Provider rate limits: requests and tokens per minute (0 = unlimited). Keys are
+# "provider" or "provider:model"; the most specific entry wins. Requests over the limit
+# queue by priority for up to RATE_LIMIT_MAX_WAIT seconds; 429/503 responses are retried
+# after Retry-After (or a jittered exponential backoff)
+RATE_LIMITS = {
+    "openai": {"rpm": _get_int("OPENAI_RPM", 500), "tpm": _get_int("OPENAI_TPM", 200000)},
+    "groq": {"rpm": _get_int("GROQ_RPM", 30), "tpm": _get_int("GROQ_TPM", 6000)},
+    "gemini": {"rpm": _get_int("GEMINI_RPM", 15), "tpm": _get_int("GEMINI_TPM", 1000000)},
+    "huggingface": {"rpm": _get_int("HF_RPM", 60), "tpm": _get_int("HF_TPM", 0)},
+}
+RATE_LIMIT_ENABLED = _get_bool("RATE_LIMIT_ENABLED", True)
+RATE_LIMIT_MAX_WAIT = _get_float("RATE_LIMIT_MAX_WAIT", 60.0)
+RATE_LIMIT_MAX_RETRIES = _get_int("RATE_LIMIT_MAX_RETRIES", 3)
+RATE_LIMIT_BACKOFF_BASE = _get_float("RATE_LIMIT_BACKOFF_BASE", 1.0)
+RATE_LIMIT_BACKOFF_MAX = _get_float("RATE_LIMIT_BACKOFF_MAX", 30.0)
+
+# Web research cache (tools.py): raw search hits and research summaries keyed on the
+# normalised query/topic, in memory and on disk
+RESEARCH_CACHE_ENABLED = _get_bool("RESEARCH_CACHE_ENABLED", True)
+RESEARCH_CACHE_TTL = _get_float("RESEARCH_CACHE_TTL", 7 * 24 * 3600.0)
+RESEARCH_CACHE_MAX_ENTRIES = _get_int("RESEARCH_CACHE_MAX_ENTRIES", 256)
+RESEARCH_CACHE_PATH = _get("RESEARCH_CACHE_PATH", ".cache/research.sqlite3") or ".cache/research.sqlite3"
+
+# HTTP service (api.py): worker threads, queued requests allowed beyond them before
+# shedding load with 503, per-request timeout (s) and coalescing of identical requests
+API_WORKERS = _get_int("API_WORKERS", 8)
+API_MAX_QUEUE = _get_int("API_MAX_QUEUE", 64)
+API_REQUEST_TIMEOUT = _get_float("API_REQUEST_TIMEOUT", 120.0)
+API_COALESCE = _get_bool("API_COALESCE", True)
+
+# Incremental session summaries: folded in the background after each turn so
+# finalize_session answers from precomputed state; list fields are capped at SUMMARY_MAX_ITEMS
+SUMMARY_BACKGROUND = _get_bool("SUMMARY_BACKGROUND", True)
+SUMMARY_WORKERS = _get_int("SUMMARY_WORKERS", 2)
+SUMMARY_USE_LLM = _get_bool("SUMMARY_USE_LLM", True)
+SUMMARY_MAX_ITEMS = _get_int("SUMMARY_MAX_ITEMS", 10)
+SUMMARY_MAX_JOBS = _get_int("SUMMARY_MAX_JOBS", 1000)
+
+# Startup: components to warm in the background when a long-running service starts
+# (comma-separated: db, agents, prompts, embeddings, semantic_cache, tokenizer, local_models;
+# empty = none)
+WARM_UP = [c.strip() for c in (_get("WARM_UP", "db,agents,prompts") or "").split(",") if c.strip()]
+
+# Multi-respondent simulation: respondents per batched prompt, cap on answers per prompt
+# (respondents x questions), completion tokens budgeted per answer, and parallel prompts
+SIM_BATCH_RESPONDENTS = _get_int("SIM_BATCH_RESPONDENTS", 10)
+SIM_MAX_ANSWERS_PER_CALL = _get_int("SIM_MAX_ANSWERS_PER_CALL", 40)
+SIM_TOKENS_PER_ANSWER = _get_int("SIM_TOKENS_PER_ANSWER", 90)
+SIM_CONCURRENCY = _get_int("SIM_CONCURRENCY", 8)
+# Times the cells a truncated batch reply left out are asked again
+SIM_RETRIES = _get_int("SIM_RETRIES", 2)
+
+# Analytics over stored responses: confidence histogram bins and distinct key insights
+# kept per domain/region in the incremental rollups
+ANALYTICS_CONFIDENCE_BINS = _get_int("ANALYTICS_CONFIDENCE_BINS", 10)
+ANALYTICS_MAX_INSIGHTS = _get_int("ANALYTICS_MAX_INSIGHTS", 500)
+
+# Survey compilation (core.survey_compiler): near-duplicate thresholds for embedding
+# cosine and the token-Jaccard fallback, questions per section, section cap, and whether
+# an LLM polishes the deterministic Markdown afterwards
+COMPILER_DEDUP_THRESHOLD = _get_float("COMPILER_DEDUP_THRESHOLD", 0.85)
+COMPILER_JACCARD_THRESHOLD = _get_float("COMPILER_JACCARD_THRESHOLD", 0.7)
+COMPILER_SECTION_SIZE = _get_int("COMPILER_SECTION_SIZE", 4)
+COMPILER_MAX_SECTIONS = _get_int("COMPILER_MAX_SECTIONS", 4)
+COMPILER_POLISH = _get_bool("COMPILER_POLISH", False)
+
+# Agent inference backend for BaseAgent.run: "hf" (HuggingFace Inference API), "cascade"
+# (see CASCADE_* below) or "local" (llama.cpp in-process, needs llama-cpp-python and a
+# GGUF file). Per-domain models via AGRICULTURE_LOCAL_MODEL_PATH etc.
+# Concurrent prompts are micro-batched per model for up to LOCAL_BATCH_WAIT_MS;
+# LOCAL_PREFIX_CACHE_BYTES of KV state is kept for shared preambles
+INFERENCE_BACKEND = (_get("INFERENCE_BACKEND", "hf") or "hf").strip().lower()
+LOCAL_MODEL_PATH = _get("LOCAL_MODEL_PATH", "") or ""
+LOCAL_N_CTX = _get_int("LOCAL_N_CTX", 4096)
+LOCAL_N_THREADS = _get_int("LOCAL_N_THREADS", 0)
+LOCAL_N_BATCH = _get_int("LOCAL_N_BATCH", 512)
+LOCAL_BATCH_MAX = _get_int("LOCAL_BATCH_MAX", 8)
+LOCAL_BATCH_WAIT_MS = _get_float("LOCAL_BATCH_WAIT_MS", 10.0)
+LOCAL_PREFIX_CACHE_BYTES = _get_int("LOCAL_PREFIX_CACHE_BYTES", 512 * 1024 * 1024)
+LOCAL_MAX_MODELS = _get_int("LOCAL_MAX_MODELS", 2)
+LOCAL_TIMEOUT = _get_float("LOCAL_TIMEOUT", 120.0)
+
+# Model cascade (INFERENCE_BACKEND=cascade): "provider:model" tiers tried cheapest first;
+# an answer that fails the agent schema or reports confidence below the threshold escalates
+# to the next tier. Thresholds are per domain (CASCADE_MIN_CONFIDENCE_HEALTHCARE) and per
+# agent (CASCADE_MIN_CONFIDENCE_HEALTHAGENT), an agent defaulting to its domain's value
+CASCADE_TIERS = [t.strip() for t in (_get("CASCADE_TIERS", "groq:llama3-8b-8192,openai:gpt-4o-mini,gemini:gemini-1.5-pro,groq:llama-3.3-70b-versatile") or "").split(",") if t.strip()]
+CASCADE_MIN_CONFIDENCE = _get_float("CASCADE_MIN_CONFIDENCE", 0.6)
+CASCADE_THRESHOLDS = {}
+for _domain, _agent in (("agriculture", "AgricultureAgent"), ("education", "EducationAgent"), ("healthcare", "HealthAgent")):
+    CASCADE_THRESHOLDS[_domain] = _get_float(f"CASCADE_MIN_CONFIDENCE_{_domain.upper()}", CASCADE_MIN_CONFIDENCE)
+    CASCADE_THRESHOLDS[_agent] = _get_float(f"CASCADE_MIN_CONFIDENCE_{_agent.upper()}", CASCADE_THRESHOLDS[_domain])
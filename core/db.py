@@ -1,28 +1,187 @@
+from collections import deque
 from datetime import datetime
-from typing import Dict, Any, List, Optional
+from typing import Callable, Dict, Any, List, Optional, Tuple
+import atexit
 import logging
+import queue
+import threading
+import time
 
-from pymongo import MongoClient
-from pymongo.errors import ConnectionFailure
-from .config import MONGO_URI
+from .config import MONGO_URI, MONGO_CONNECT_TIMEOUT_MS, DB_WRITE_BEHIND, DB_BATCH_SIZE, DB_FLUSH_INTERVAL, DB_QUEUE_MAX, DB_ENQUEUE_TIMEOUT, DB_WRITE_RETRIES, DB_RETRY_BACKOFF, DB_MEM_MAX
+from .tracing import span
 
 logger = logging.getLogger(__name__)
 
+
+class WriteBehindBuffer:
+    """Batches documents into insert_many calls on a background thread.
+
+    Flushes when `batch_size` documents are pending or `flush_interval` seconds pass.
+    The queue is bounded: when it's full, `submit` blocks up to `enqueue_timeout` and
+    then writes synchronously, so producers slow down instead of losing data. A failed
+    insert_many is retried with backoff for the documents it didn't write; only those
+    still failing after `retries` are dropped (counted in stats["dropped"]).
+    """
+
+    def __init__(self, database, batch_size: int = DB_BATCH_SIZE, flush_interval: float = DB_FLUSH_INTERVAL, max_queue: int = DB_QUEUE_MAX, enqueue_timeout: float = DB_ENQUEUE_TIMEOUT, retries: int = DB_WRITE_RETRIES, backoff: float = DB_RETRY_BACKOFF):
+        self.database = database
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.enqueue_timeout = enqueue_timeout
+        self.retries = retries
+        self.backoff = backoff
+        self._queue: "queue.Queue[Tuple[str, Dict[str, Any]]]" = queue.Queue(maxsize=max_queue)
+        self._stop = threading.Event()
+        self.stats = {"enqueued": 0, "written": 0, "batches": 0, "sync_writes": 0, "errors": 0, "retries": 0, "dropped": 0}
+        self._thread = threading.Thread(target=self._run, name="db-write-behind", daemon=True)
+        self._thread.start()
+
+    def submit(self, collection: str, doc: Dict[str, Any]):
+        try:
+            self._queue.put((collection, doc), timeout=self.enqueue_timeout)
+            self.stats["enqueued"] += 1
+        except queue.Full:
+            self.stats["sync_writes"] += 1
+            self.database[collection].insert_one(doc)
+
+    def _write(self, batch: List[Tuple[str, Dict[str, Any]]]):
+        grouped: Dict[str, List[Dict[str, Any]]] = {}
+        for collection, doc in batch:
+            grouped.setdefault(collection, []).append(doc)
+        for collection, docs in grouped.items():
+            self._insert(collection, docs)
+
+    def _insert(self, collection: str, docs: List[Dict[str, Any]]):
+        delay = self.backoff
+        for attempt in range(self.retries + 1):
+            if attempt:
+                self.stats["retries"] += 1
+                time.sleep(delay)
+                delay *= 2
+            try:
+                with span("db.insert_many", collection=collection, docs=len(docs), attempt=attempt):
+                    self.database[collection].insert_many(docs, ordered=False)
+                self.stats["written"] += len(docs)
+                self.stats["batches"] += 1
+                return
+            except Exception as e:
+                self.stats["errors"] += 1
+                failed = _unwritten(docs, e)
+                self.stats["written"] += len(docs) - len(failed)
+                docs = failed
+                if not docs:
+                    return
+                logger.warning(f"⚠️ Batched write of {len(docs)} docs to {collection} failed (attempt {attempt + 1}): {e}")
+        self.stats["dropped"] += len(docs)
+        logger.warning(f"⚠️ Dropped {len(docs)} docs for {collection} after {self.retries} retries")
+
+    def _run(self):
+        while not (self._stop.is_set() and self._queue.empty()):
+            batch = []
+            deadline = time.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            if batch:
+                self._write(batch)
+                for _ in batch:
+                    self._queue.task_done()
+
+    def flush(self):
+        """Block until everything enqueued so far has been written."""
+        self._queue.join()
+
+    def close(self, timeout: float = 10.0):
+        self._stop.set()
+        self._thread.join(timeout=timeout)
+
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+
+_DUPLICATE_KEY = 11000
+
+
+def _unwritten(docs: List[Dict[str, Any]], error: Exception) -> List[Dict[str, Any]]:
+    """The docs an unordered insert_many that raised `error` didn't store. A BulkWriteError
+    lists the failed ones; anything else may have failed anywhere, so all are retried.
+    insert_many sets each doc's _id in place, so a retried doc that did land comes back
+    as a duplicate key, which counts as written."""
+    details = getattr(error, "details", None)
+    if not isinstance(details, dict) or "writeErrors" not in details:
+        return docs
+    return [docs[err["index"]] for err in details["writeErrors"] if err.get("code") != _DUPLICATE_KEY]
+
+
 class DB:
+    """Mongo with an in-memory fallback. pymongo is imported and the connection made on
+    first use (or `connect()` from a warm-up hook), not at import time."""
+
     def __init__(self):
         self.client = None
-        self.db = None
-        self.mem = {"responses": [], "logs": []}
-        if MONGO_URI:
+        self._db = None
+        self._connected = False
+        self._connect_lock = threading.Lock()
+        self.writer: Optional[WriteBehindBuffer] = None
+        # Ring buffers: the memory fallback keeps only the newest DB_MEM_MAX docs
+        self.mem = {"responses": deque(maxlen=DB_MEM_MAX), "logs": deque(maxlen=DB_MEM_MAX)}
+        self._listeners: List[Callable[[Dict[str, Any]], None]] = []
+        atexit.register(self.close)
+
+    @property
+    def db(self):
+        if not self._connected:
+            self.connect()
+        return self._db
+
+    def connect(self):
+        with self._connect_lock:
+            if self._connected:
+                return self._db
             try:
-                self.client = MongoClient(MONGO_URI)
-                self.client.admin.command("ping")
-                self.db = self.client["survey_ai"]
-                logger.info("✅ Mongo connected")
-            except Exception as e:
-                logger.warning(f"⚠️ Mongo connection failed: {e}. Using memory store.")
-                self.client = None
-                self.db = None
+                if MONGO_URI:
+                    try:
+                        from pymongo import MongoClient
+                        # Fail fast on an unreachable URI instead of pymongo's 30s default
+                        self.client = MongoClient(MONGO_URI, serverSelectionTimeoutMS=MONGO_CONNECT_TIMEOUT_MS)
+                        self.client.admin.command("ping")
+                        self._db = self.client["survey_ai"]
+                        logger.info("✅ Mongo connected")
+                    except Exception as e:
+                        logger.warning(f"⚠️ Mongo connection failed: {e}. Using memory store.")
+                        self.client = None
+                        self._db = None
+                if self._db is not None:
+                    self._ensure_indexes()
+                    if DB_WRITE_BEHIND:
+                        self.writer = WriteBehindBuffer(self._db)
+            finally:
+                # Set last: callers that skip the lock on this flag must see a finished connection
+                self._connected = True
+            return self._db
+
+    def _ensure_indexes(self):
+        from pymongo import ASCENDING, DESCENDING
+        try:
+            self._db["responses"].create_index([("timestamp", DESCENDING)])
+            self._db["responses"].create_index([("session_id", ASCENDING), ("timestamp", DESCENDING)])
+            self._db["responses"].create_index([("domain", ASCENDING), ("region", ASCENDING), ("timestamp", DESCENDING)])
+            self._db["logs"].create_index([("timestamp", DESCENDING)])
+            self._db["logs"].create_index([("session_id", ASCENDING)])
+        except Exception as e:
+            logger.warning(f"⚠️ Index creation failed: {e}")
+
+    def _insert(self, collection: str, doc: Dict[str, Any]):
+        with span("db.insert", collection=collection, docs=1, write_behind=self.writer is not None):
+            if self.writer is not None:
+                self.writer.submit(collection, doc)
+            else:
+                self.db[collection].insert_one(doc)
 
     def save_response(self, session_id: str, payload: Dict[str, Any]) -> str:
         doc = {
@@ -30,23 +189,50 @@ class DB:
             "session_id": session_id,
             "timestamp": datetime.utcnow(),
         }
-        if self.db:
-            return str(self.db["responses"].insert_one(doc).inserted_id)
+        if self.db is not None:
+            from bson import ObjectId
+            # Client-side id so the caller gets it back without waiting on the write
+            doc["_id"] = ObjectId()
+            self._insert("responses", doc)
+            self._notify(doc)
+            return str(doc["_id"])
         self.mem["responses"].append(doc)
+        self._notify(doc)
         return "mem_response"
 
+    def subscribe(self, fn: Callable[[Dict[str, Any]], None]):
+        """Call `fn(doc)` after each save_response (e.g. to update analytics rollups)."""
+        self._listeners.append(fn)
+
+    def _notify(self, doc: Dict[str, Any]):
+        for fn in self._listeners:
+            try:
+                fn(doc)
+            except Exception as e:
+                logger.warning(f"⚠️ Response listener failed: {e}")
+
     def list_responses(self, limit: int = 100) -> List[Dict[str, Any]]:
-        if self.db:
+        if self.db is not None:
+            self.flush()
             cur = self.db["responses"].find({}, {"_id": 0}).sort("timestamp", -1).limit(limit)
             return list(cur)
-        return self.mem["responses"][-limit:]
+        return list(self.mem["responses"])[-limit:]
 
     def log(self, agent: str, input_data: str, output_data: str, duration: float, session_id: Optional[str] = None):
         doc = {"agent": agent, "input": input_data, "output": output_data, "duration": duration, "session_id": session_id, "timestamp": datetime.utcnow()}
-        if self.db:
-            self.db["logs"].insert_one(doc)
+        if self.db is not None:
+            self._insert("logs", doc)
         else:
             self.mem["logs"].append(doc)
 
+    def flush(self):
+        if self.writer is not None:
+            self.writer.flush()
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
 
-db = DB()
\ No newline at end of file
+db = DB()
@@ -0,0 +1,38 @@
+from typing import List, Optional
+import logging
+import threading
+
+from .config import EMBED_MODEL
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_model = None
+_unavailable: Optional[str] = None
+
+
+def get_embedder():
+    """Load the sentence-transformers model named by EMBED_MODEL on first use.
+    Returns None (and logs once) when sentence-transformers isn't installed."""
+    global _model, _unavailable
+    if _model is not None or _unavailable:
+        return _model
+    with _lock:
+        if _model is None and not _unavailable:
+            try:
+                from sentence_transformers import SentenceTransformer  # type: ignore
+                _model = SentenceTransformer(EMBED_MODEL)
+            except Exception as e:
+                _unavailable = str(e)
+                logger.warning(f"⚠️ Embedding model unavailable ({e}); semantic features disabled.")
+    return _model
+
+
+def embed(texts: List[str]):
+    """L2-normalised float32 embeddings, so inner product == cosine similarity."""
+    model = get_embedder()
+    if model is None:
+        return None
+    import numpy as np
+    vecs = model.encode(texts, batch_size=32, convert_to_numpy=True, normalize_embeddings=True)
+    return np.asarray(vecs, dtype="float32")
@@ -0,0 +1,226 @@
+import json
+import re
+from typing import Any, Dict, Optional, Tuple
+
+# Deterministic local JSON repair. Stages are tried cheapest first; each returns the
+# parsed object and the stage name so callers can report hit rates.
+
+_FENCE_RE = re.compile(r"```(?:json|JSON)?\s*(.*?)(?:```|$)", re.S)
+_TRAILING_COMMA_RE = re.compile(r",\s*([}\]])")
+_PY_LITERALS = {"True": "true", "False": "false", "None": "null"}
+
+
+def _loads(text: str) -> Optional[Any]:
+    try:
+        return json.loads(text)
+    except (ValueError, TypeError):
+        return None
+
+
+def strip_fences(text: str) -> str:
+    m = _FENCE_RE.search(text)
+    return m.group(1).strip() if m else text
+
+
+def extract_balanced(text: str) -> Optional[str]:
+    """Return the first top-level {...} or [...] block, or the unterminated tail if truncated."""
+    start = None
+    for i, ch in enumerate(text):
+        if ch in "{[":
+            start = i
+            break
+    if start is None:
+        return None
+    depth = 0
+    in_str = False
+    quote = ""
+    escape = False
+    for i in range(start, len(text)):
+        ch = text[i]
+        if in_str:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == quote:
+                in_str = False
+        elif ch in "\"'":
+            in_str = True
+            quote = ch
+        elif ch in "{[":
+            depth += 1
+        elif ch in "}]":
+            depth -= 1
+            if depth == 0:
+                return text[start:i + 1]
+    return text[start:]
+
+
+def _normalize_quotes_and_literals(text: str) -> str:
+    """Convert single-quoted strings to double-quoted and Python literals to JSON ones."""
+    out = []
+    i = 0
+    n = len(text)
+    while i < n:
+        ch = text[i]
+        if ch in "\"'":
+            quote = ch
+            j = i + 1
+            buf = []
+            while j < n:
+                c = text[j]
+                if c == "\\" and j + 1 < n:
+                    nxt = text[j + 1]
+                    # \' is not a valid JSON escape
+                    buf.append("'" if nxt == "'" else c + nxt)
+                    j += 2
+                    continue
+                if c == quote:
+                    break
+                if c == '"' and quote == "'":
+                    buf.append('\\"')
+                elif c == "\n":
+                    buf.append("\\n")
+                else:
+                    buf.append(c)
+                j += 1
+            out.append('"' + "".join(buf) + ('"' if j < n else ""))
+            i = j + 1
+            continue
+        if ch.isalpha():
+            j = i
+            while j < n and (text[j].isalnum() or text[j] == "_"):
+                j += 1
+            word = text[i:j]
+            out.append(_PY_LITERALS.get(word, word))
+            i = j
+            continue
+        out.append(ch)
+        i += 1
+    return "".join(out)
+
+
+def close_truncated(text: str, drop_dangling: bool = False) -> str:
+    """Close any string, array or object left open by a truncated generation.
+    With `drop_dangling`, a trailing bare string (e.g. a cut-off object key) is dropped."""
+    stack = []
+    in_str = False
+    escape = False
+    for ch in text:
+        if in_str:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_str = False
+        elif ch == '"':
+            in_str = True
+        elif ch in "{[":
+            stack.append("}" if ch == "{" else "]")
+        elif ch in "}]" and stack:
+            stack.pop()
+    if in_str:
+        text += '"'
+    text = text.rstrip()
+    # Drop a dangling separator or a key without a value
+    text = re.sub(r',\s*$', "", text)
+    text = re.sub(r',?\s*"[^"]*"\s*:\s*$', "", text)
+    if drop_dangling:
+        text = re.sub(r',\s*"[^"]*"\s*$', "", text)
+    return text + "".join(reversed(stack))
+
+
+def _fix(text: str) -> str:
+    text = _normalize_quotes_and_literals(text)
+    text = _TRAILING_COMMA_RE.sub(r"\1", text)
+    return text
+
+
+def repair_json(raw_text: str) -> Tuple[Optional[Any], str]:
+    """Parse `raw_text` locally. Returns (obj, stage) or (None, "failed")."""
+    if not raw_text or not raw_text.strip():
+        return None, "failed"
+    text = raw_text.strip()
+    obj = _loads(text)
+    if obj is not None:
+        return obj, "strict"
+    unfenced = strip_fences(text)
+    if unfenced != text:
+        obj = _loads(unfenced)
+        if obj is not None:
+            return obj, "fenced"
+    # Leading prose like "[note] {...}" would hide the object behind a bracket block
+    starts = sorted({i for i in (unfenced.find("{"), unfenced.find("[")) if i >= 0})
+    for start in starts:
+        obj, stage = _repair_block(extract_balanced(unfenced[start:]))
+        if obj is not None:
+            return obj, stage
+    return None, "failed"
+
+
+def _repair_block(block: Optional[str]) -> Tuple[Optional[Any], str]:
+    if block is None:
+        return None, "failed"
+    obj = _loads(block)
+    if obj is not None:
+        return obj, "extracted"
+    fixed = _fix(block)
+    obj = _loads(fixed)
+    if obj is not None:
+        return obj, "fixed"
+    for drop in (False, True):
+        obj = _loads(_TRAILING_COMMA_RE.sub(r"\1", close_truncated(fixed, drop_dangling=drop)))
+        if obj is not None:
+            return obj, "truncated"
+    return None, "failed"
+
+
+_PLACEHOLDER_RE = re.compile(r"^\s*(\.{3}|…)?\s*$")
+
+
+def is_placeholder(obj: Any) -> bool:
+    """True for a prompt's schema example echoed back: a dict whose string values
+    (including array items) are all "..." or empty."""
+    if not isinstance(obj, dict) or not obj:
+        return False
+    strings = []
+    for val in obj.values():
+        items = val if isinstance(val, list) else [val]
+        if any(isinstance(i, (dict, list)) for i in items):
+            return False
+        strings.extend(i for i in items if isinstance(i, str))
+    return bool(strings) and all(_PLACEHOLDER_RE.match(s) for s in strings)
+
+
+def conform(obj: Any, schema: Optional[Dict[str, str]]) -> Optional[Dict[str, Any]]:
+    """Check `obj` against a flat {key: "string"|"number"|"array"} schema, coercing
+    where it's lossless. Missing arrays default to []; any other mismatch returns None."""
+    if not isinstance(obj, dict):
+        return None
+    if not schema:
+        return obj
+    out = dict(obj)
+    for key, typ in schema.items():
+        val = out.get(key)
+        if typ == "array":
+            if val is None:
+                out[key] = []
+            elif isinstance(val, str):
+                out[key] = [val]
+            elif not isinstance(val, list):
+                return None
+        elif typ == "number":
+            if isinstance(val, bool) or val is None:
+                return None
+            if not isinstance(val, (int, float)):
+                try:
+                    out[key] = float(val)
+                except (TypeError, ValueError):
+                    return None
+        elif typ == "string":
+            if val is None or isinstance(val, (dict, list)):
+                return None
+            if not isinstance(val, str):
+                out[key] = str(val)
+    return out
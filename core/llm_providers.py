@@ -1,9 +1,18 @@
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Tuple
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FuturesTimeout
 import os
 import json
-import requests
+import time
 
-from .config import OPENAI_API_KEY, GROQ_API_KEY, GEMINI_API_KEY, HF_API_KEY, HF_URL, MODEL_CONFIG, HF_MODEL
+from .config import (
+    OPENAI_API_KEY, GROQ_API_KEY, GEMINI_API_KEY, HF_API_KEY, HF_URL, MODEL_CONFIG, HF_MODEL,
+    PROVIDER_TIMEOUT, ALL_PROVIDERS_DEADLINE, ALL_PROVIDERS_FIRST_N,
+)
+from .transport import post_json, apost_json
+from .rate_limit import estimate_tokens
+from .cache import cached
+from .tracing import current_span, traced_provider, propagate
+from .prompts import cached_tokens, record_usage
 
 # Lightweight provider adapters. We keep to chat/completions-like interface returning text.
 
@@ -11,29 +20,54 @@ class ProviderError(Exception):
     pass
 
 
-def call_all_providers(prompt: str) -> Dict[str, Any]:
-    results: Dict[str, Any] = {}
-    # Hugging Face
-    try:
-        results["huggingface"] = {"ok": True, "text": call_huggingface_inference(prompt)}
-    except Exception as e:
-        results["huggingface"] = {"ok": False, "error": str(e)}
-    # OpenAI
-    try:
-        results["openai"] = {"ok": True, "text": call_openai(prompt, model="gpt-4o-mini")}
-    except Exception as e:
-        results["openai"] = {"ok": False, "error": str(e)}
-    # Groq
+_ALL_PROVIDERS = [
+    ("huggingface", lambda prompt, timeout: call_huggingface_inference(prompt, timeout=timeout)),
+    ("openai", lambda prompt, timeout: call_openai(prompt, model="gpt-4o-mini", timeout=timeout)),
+    ("groq", lambda prompt, timeout: call_groq(prompt, model="llama3-8b-8192", timeout=timeout)),
+    ("gemini", lambda prompt, timeout: call_gemini(prompt, model="gemini-1.5-pro", timeout=timeout)),
+]
+
+
+def _timed_call(fn, prompt: str, timeout: float) -> Dict[str, Any]:
+    t0 = time.time()
     try:
-        results["groq"] = {"ok": True, "text": call_groq(prompt, model="llama3-8b-8192")}
+        return {"ok": True, "text": fn(prompt, timeout), "latency": time.time() - t0}
     except Exception as e:
-        results["groq"] = {"ok": False, "error": str(e)}
-    # Gemini
+        return {"ok": False, "error": str(e), "latency": time.time() - t0}
+
+
+def call_all_providers(prompt: str, parallel: bool = True, deadline: Optional[float] = None, timeout: Optional[float] = None, first_n: Optional[int] = None) -> Dict[str, Any]:
+    """Fan the prompt out to every provider.
+
+    In parallel mode the call returns once all providers answer, `first_n` providers
+    have succeeded, or `deadline` seconds elapse; stragglers are cancelled and
+    reported as timed out. Every result carries its `latency` in seconds.
+    """
+    timeout = timeout or PROVIDER_TIMEOUT
+    if not parallel:
+        return {name: _timed_call(fn, prompt, timeout) for name, fn in _ALL_PROVIDERS}
+
+    deadline = deadline or ALL_PROVIDERS_DEADLINE
+    first_n = first_n if first_n is not None else ALL_PROVIDERS_FIRST_N
+    t0 = time.time()
+    results: Dict[str, Any] = {}
+    pool = ThreadPoolExecutor(max_workers=len(_ALL_PROVIDERS))
+    futures = {pool.submit(propagate(_timed_call), fn, prompt, timeout): name for name, fn in _ALL_PROVIDERS}
     try:
-        results["gemini"] = {"ok": True, "text": call_gemini(prompt, model="gemini-1.5-pro")}
-    except Exception as e:
-        results["gemini"] = {"ok": False, "error": str(e)}
-    return results
+        for fut in as_completed(futures, timeout=deadline):
+            results[futures[fut]] = fut.result()
+            if first_n and sum(1 for r in results.values() if r["ok"]) >= first_n:
+                break
+    except FuturesTimeout:
+        pass
+    finally:
+        # Don't block on stragglers; their sockets close when the per-provider timeout hits
+        pool.shutdown(wait=False, cancel_futures=True)
+    for fut, name in futures.items():
+        if name not in results:
+            fut.cancel()
+            results[name] = {"ok": False, "error": "cancelled: deadline reached or enough providers answered", "latency": time.time() - t0}
+    return {name: results[name] for name, _ in _ALL_PROVIDERS}
 
 
 def _headers_json(api_key: Optional[str]) -> Dict[str, str]:
@@ -43,50 +77,62 @@ def _headers_json(api_key: Optional[str]) -> Dict[str, str]:
     return h
 
 
-def call_openai(prompt: str, model: str = "gpt-4o-mini", json_object: bool = False) -> str:
-    if not OPENAI_API_KEY:
-        raise ProviderError("OPENAI_API_KEY missing")
-    url = "https://api.openai.com/v1/chat/completions"
+def _chat_request(base_url: str, api_key: Optional[str], prompt: str, model: str, json_object: bool, max_tokens: Optional[int] = None) -> Tuple[str, Dict[str, str], Dict[str, Any]]:
     payload = {
         "model": model,
         "messages": [{"role": "user", "content": prompt}],
         "temperature": MODEL_CONFIG["temperature"],
-        "max_tokens": MODEL_CONFIG["max_new_tokens"],
+        "max_tokens": max_tokens or MODEL_CONFIG["max_new_tokens"],
     }
     if json_object:
         payload["response_format"] = {"type": "json_object"}
-    r = requests.post(url, headers=_headers_json(OPENAI_API_KEY), json=payload, timeout=120)
-    r.raise_for_status()
-    data = r.json()
+    return f"{base_url}/chat/completions", _headers_json(api_key), payload
+
+
+def _usage(data: Any, provider: str) -> Any:
+    # Token counts for the active span: OpenAI/Groq "usage", Gemini "usageMetadata".
+    # cached_tokens is the part of the prompt served from the provider's prefix cache
+    if isinstance(data, dict):
+        usage = data.get("usage") or {}
+        meta = data.get("usageMetadata") or {}
+        prompt_tokens = usage.get("prompt_tokens", meta.get("promptTokenCount"))
+        cached = cached_tokens(usage, meta)
+        current_span().set(
+            prompt_tokens=prompt_tokens,
+            completion_tokens=usage.get("completion_tokens", meta.get("candidatesTokenCount")),
+            cached_tokens=cached,
+        )
+        record_usage(provider, prompt_tokens, cached)
+    return data
+
+
+def _chat_text(data: Dict[str, Any]) -> str:
     return data["choices"][0]["message"]["content"].strip()
 
 
-def call_groq(prompt: str, model: str = "llama3-8b-8192", json_object: bool = False) -> str:
+def _openai_request(prompt: str, model: str, json_object: bool, max_tokens: Optional[int] = None):
+    if not OPENAI_API_KEY:
+        raise ProviderError("OPENAI_API_KEY missing")
+    return _chat_request("https://api.openai.com/v1", OPENAI_API_KEY, prompt, model, json_object, max_tokens)
+
+
+def _groq_request(prompt: str, model: str, json_object: bool, max_tokens: Optional[int] = None):
     if not GROQ_API_KEY:
         raise ProviderError("GROQ_API_KEY missing")
-    url = "https://api.groq.com/openai/v1/chat/completions"
-    payload = {
-        "model": model,
-        "messages": [{"role": "user", "content": prompt}],
-        "temperature": MODEL_CONFIG["temperature"],
-        "max_tokens": MODEL_CONFIG["max_new_tokens"],
-    }
-    if json_object:
-        payload["response_format"] = {"type": "json_object"}
-    r = requests.post(url, headers=_headers_json(GROQ_API_KEY), json=payload, timeout=120)
-    r.raise_for_status()
-    data = r.json()
-    return data["choices"][0]["message"]["content"].strip()
+    return _chat_request("https://api.groq.com/openai/v1", GROQ_API_KEY, prompt, model, json_object, max_tokens)
 
 
-def call_gemini(prompt: str, model: str = "gemini-1.5-pro") -> str:
+def _gemini_request(prompt: str, model: str, max_tokens: Optional[int] = None):
     if not GEMINI_API_KEY:
         raise ProviderError("GEMINI_API_KEY missing")
     url = f"https://generativelanguage.googleapis.com/v1beta/models/{model}:generateContent?key={GEMINI_API_KEY}"
     payload = {"contents": [{"parts": [{"text": prompt}]}]}
-    r = requests.post(url, json=payload, timeout=120)
-    r.raise_for_status()
-    data = r.json()
+    if max_tokens:
+        payload["generationConfig"] = {"maxOutputTokens": max_tokens}
+    return url, None, payload
+
+
+def _gemini_text(data: Dict[str, Any]) -> str:
     # Extract text safely
     try:
         return data["candidates"][0]["content"]["parts"][0]["text"].strip()
@@ -94,19 +140,87 @@ def call_gemini(prompt: str, model: str = "gemini-1.5-pro") -> str:
         return json.dumps(data)
 
 
-def call_huggingface_inference(prompt: str, model: Optional[str] = None) -> str:
-    # Uses Inference API if HF key set; fallback to echo
+def _hf_request(prompt: str, model: Optional[str]):
     selected_model = model or HF_MODEL
-    if not HF_API_KEY:
-        # Fallback stub
-        return f"[HF local stub] {prompt[:200]}"
     url = f"https://api-inference.huggingface.co/models/{selected_model}"
     headers = {"Authorization": f"Bearer {HF_API_KEY}", "Content-Type": "application/json"}
     payload = {"inputs": prompt, "parameters": {"max_new_tokens": MODEL_CONFIG["max_new_tokens"], "temperature": MODEL_CONFIG["temperature"]}}
-    r = requests.post(url, headers=headers, json=payload, timeout=120)
-    r.raise_for_status()
-    data = r.json()
+    return url, headers, payload
+
+
+def _hf_text(data: Any, prompt: str) -> str:
     # HF responses vary; normalize to text
     if isinstance(data, list) and len(data) and "generated_text" in data[0]:
         return data[0]["generated_text"][len(prompt):].strip()
     return json.dumps(data)
+
+
+def _hf_stub(prompt: str) -> str:
+    return f"[HF local stub] {prompt[:200]}"
+
+
+def _not_stub(text: str) -> bool:
+    return not text.startswith("[HF local stub]")
+
+
+@traced_provider("openai")
+@cached("openai")
+def call_openai(prompt: str, model: str = "gpt-4o-mini", json_object: bool = False, timeout: Optional[float] = None, max_tokens: Optional[int] = None) -> str:
+    url, headers, payload = _openai_request(prompt, model, json_object, max_tokens)
+    return _chat_text(_usage(post_json(url, payload, headers, timeout or PROVIDER_TIMEOUT, ("openai", model), estimate_tokens(prompt, max_tokens)), "openai"))
+
+
+@traced_provider("groq")
+@cached("groq")
+def call_groq(prompt: str, model: str = "llama3-8b-8192", json_object: bool = False, timeout: Optional[float] = None, max_tokens: Optional[int] = None) -> str:
+    url, headers, payload = _groq_request(prompt, model, json_object, max_tokens)
+    return _chat_text(_usage(post_json(url, payload, headers, timeout or PROVIDER_TIMEOUT, ("groq", model), estimate_tokens(prompt, max_tokens)), "groq"))
+
+
+@traced_provider("gemini")
+@cached("gemini")
+def call_gemini(prompt: str, model: str = "gemini-1.5-pro", timeout: Optional[float] = None, max_tokens: Optional[int] = None) -> str:
+    url, headers, payload = _gemini_request(prompt, model, max_tokens)
+    return _gemini_text(_usage(post_json(url, payload, headers, timeout or PROVIDER_TIMEOUT, ("gemini", model), estimate_tokens(prompt, max_tokens)), "gemini"))
+
+
+@traced_provider("huggingface")
+@cached("huggingface", cacheable=_not_stub)
+def call_huggingface_inference(prompt: str, model: Optional[str] = None, timeout: Optional[float] = None) -> str:
+    # Uses Inference API if HF key set; fallback to echo
+    if not HF_API_KEY:
+        return _hf_stub(prompt)
+    url, headers, payload = _hf_request(prompt, model)
+    return _hf_text(post_json(url, payload, headers, timeout or PROVIDER_TIMEOUT, ("huggingface", model or HF_MODEL), estimate_tokens(prompt)), prompt)
+
+
+# Async variants share the request builders/parsers and the pooled transport
+
+@traced_provider("openai")
+@cached("openai")
+async def acall_openai(prompt: str, model: str = "gpt-4o-mini", json_object: bool = False, timeout: Optional[float] = None, max_tokens: Optional[int] = None) -> str:
+    url, headers, payload = _openai_request(prompt, model, json_object, max_tokens)
+    return _chat_text(_usage(await apost_json(url, payload, headers, timeout or PROVIDER_TIMEOUT, ("openai", model), estimate_tokens(prompt, max_tokens)), "openai"))
+
+
+@traced_provider("groq")
+@cached("groq")
+async def acall_groq(prompt: str, model: str = "llama3-8b-8192", json_object: bool = False, timeout: Optional[float] = None, max_tokens: Optional[int] = None) -> str:
+    url, headers, payload = _groq_request(prompt, model, json_object, max_tokens)
+    return _chat_text(_usage(await apost_json(url, payload, headers, timeout or PROVIDER_TIMEOUT, ("groq", model), estimate_tokens(prompt, max_tokens)), "groq"))
+
+
+@traced_provider("gemini")
+@cached("gemini")
+async def acall_gemini(prompt: str, model: str = "gemini-1.5-pro", timeout: Optional[float] = None, max_tokens: Optional[int] = None) -> str:
+    url, headers, payload = _gemini_request(prompt, model, max_tokens)
+    return _gemini_text(_usage(await apost_json(url, payload, headers, timeout or PROVIDER_TIMEOUT, ("gemini", model), estimate_tokens(prompt, max_tokens)), "gemini"))
+
+
+@traced_provider("huggingface")
+@cached("huggingface", cacheable=_not_stub)
+async def acall_huggingface_inference(prompt: str, model: Optional[str] = None, timeout: Optional[float] = None) -> str:
+    if not HF_API_KEY:
+        return _hf_stub(prompt)
+    url, headers, payload = _hf_request(prompt, model)
+    return _hf_text(await apost_json(url, payload, headers, timeout or PROVIDER_TIMEOUT, ("huggingface", model or HF_MODEL), estimate_tokens(prompt)), prompt)
@@ -0,0 +1,207 @@
+"""In-process CPU inference with llama.cpp (llama-cpp-python, imported on first use).
+
+Each GGUF model stays loaded and is served by one worker thread, since a llama.cpp
+context runs one sequence at a time. Concurrent prompts are micro-batched: the worker
+collects up to LOCAL_BATCH_MAX requests (waiting at most LOCAL_BATCH_WAIT_MS), answers
+identical prompts once, and runs the rest in sorted order so prompts that share a
+preamble run back to back and reuse its KV state. A LlamaRAMCache keeps KV state for
+other preambles (e.g. other regions) across batches.
+"""
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional
+import logging
+import os
+import queue
+import threading
+import time
+
+from .cache import cached
+from .config import (
+    MODEL_CONFIG, LOCAL_MODEL_PATH, LOCAL_N_CTX, LOCAL_N_THREADS, LOCAL_N_BATCH, LOCAL_BATCH_MAX,
+    LOCAL_BATCH_WAIT_MS, LOCAL_PREFIX_CACHE_BYTES, LOCAL_MAX_MODELS, LOCAL_TIMEOUT,
+)
+from .tracing import current_span, traced_provider
+
+logger = logging.getLogger(__name__)
+
+
+class LocalInferenceError(Exception):
+    pass
+
+
+class _Request:
+    __slots__ = ("prompt", "future", "queued")
+
+    def __init__(self, prompt: str):
+        self.prompt = prompt
+        self.future: Future = Future()
+        self.queued = time.time()
+
+
+class LocalModel:
+    """A resident llama.cpp model with a micro-batching worker."""
+
+    def __init__(self, path: str, batch_max: int = LOCAL_BATCH_MAX, batch_wait: float = LOCAL_BATCH_WAIT_MS / 1000.0):
+        self.path = path
+        self.batch_max = batch_max
+        self.batch_wait = batch_wait
+        self.stats = {"requests": 0, "batches": 0, "generations": 0, "deduplicated": 0, "largest_batch": 0, "errors": 0}
+        self._queue: "queue.Queue[Optional[_Request]]" = queue.Queue()
+        self._llm = None
+        self._error: Optional[Exception] = None
+        self._closed = False
+        self._loaded = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"llama-{os.path.basename(path)}", daemon=True)
+        self._thread.start()
+
+    def _load(self):
+        try:
+            from llama_cpp import Llama, LlamaRAMCache  # type: ignore
+        except Exception as e:
+            raise LocalInferenceError(f"llama-cpp-python is not installed: {e}")
+        if not os.path.exists(self.path):
+            raise LocalInferenceError(f"Model file not found: {self.path}")
+        t0 = time.time()
+        llm = Llama(model_path=self.path, n_ctx=LOCAL_N_CTX, n_threads=LOCAL_N_THREADS or None, n_batch=LOCAL_N_BATCH, verbose=False)
+        if LOCAL_PREFIX_CACHE_BYTES:
+            llm.set_cache(LlamaRAMCache(capacity_bytes=LOCAL_PREFIX_CACHE_BYTES))
+        logger.info(f"✅ Loaded {self.path} in {time.time() - t0:.1f}s")
+        return llm
+
+    def wait_loaded(self, timeout: Optional[float] = None) -> bool:
+        """Block until the model is loaded; raises if loading failed."""
+        ready = self._loaded.wait(timeout)
+        if self._error is not None:
+            raise self._error
+        return ready
+
+    def submit(self, prompt: str) -> Future:
+        if self._error is not None:
+            raise self._error
+        if self._closed:
+            raise LocalInferenceError(f"{self.path} was unloaded")
+        req = _Request(prompt)
+        self.stats["requests"] += 1
+        self._queue.put(req)
+        return req.future
+
+    def _collect(self, first: _Request) -> List[_Request]:
+        batch = [first]
+        deadline = time.time() + self.batch_wait
+        while len(batch) < self.batch_max:
+            remaining = deadline - time.time()
+            try:
+                req = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if req is None:
+                # Closing: finish this batch, then stop
+                self._queue.put(None)
+                break
+            batch.append(req)
+        return batch
+
+    def _generate(self, prompt: str) -> str:
+        out = self._llm.create_chat_completion(
+            messages=[{"role": "user", "content": prompt}],
+            max_tokens=MODEL_CONFIG["max_new_tokens"],
+            temperature=MODEL_CONFIG["temperature"] if MODEL_CONFIG.get("do_sample", True) else 0.0,
+            top_p=MODEL_CONFIG["top_p"],
+            repeat_penalty=MODEL_CONFIG["repetition_penalty"],
+        )
+        return out["choices"][0]["message"]["content"] or ""
+
+    def _run(self):
+        try:
+            self._llm = self._load()
+        except Exception as e:
+            self._error = e if isinstance(e, LocalInferenceError) else LocalInferenceError(f"Loading {self.path} failed: {e}")
+            logger.warning(f"⚠️ Local model unavailable: {self._error}")
+        finally:
+            self._loaded.set()
+        while True:
+            req = self._queue.get()
+            if req is None:
+                break
+            batch = self._collect(req)
+            if self._error is not None:
+                for r in batch:
+                    r.future.set_exception(self._error)
+                continue
+            by_prompt: Dict[str, List[_Request]] = {}
+            for r in batch:
+                if r.future.set_running_or_notify_cancel():
+                    by_prompt.setdefault(r.prompt, []).append(r)
+            self.stats["batches"] += 1
+            self.stats["largest_batch"] = max(self.stats["largest_batch"], len(batch))
+            self.stats["deduplicated"] += sum(len(rs) - 1 for rs in by_prompt.values())
+            # Sorted prompts put shared preambles next to each other for KV reuse
+            for prompt in sorted(by_prompt):
+                try:
+                    text = self._generate(prompt)
+                    self.stats["generations"] += 1
+                    for r in by_prompt[prompt]:
+                        r.future.set_result(text)
+                except Exception as e:
+                    self.stats["errors"] += 1
+                    for r in by_prompt[prompt]:
+                        r.future.set_exception(e)
+        self._llm = None
+        # Requests that raced with eviction
+        while True:
+            try:
+                r = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if r is not None:
+                r.future.set_exception(LocalInferenceError(f"{self.path} was unloaded"))
+
+    def close(self):
+        self._closed = True
+        self._queue.put(None)
+
+
+_models: "OrderedDict[str, LocalModel]" = OrderedDict()
+_models_lock = threading.Lock()
+
+
+def get_model(path: Optional[str] = None) -> LocalModel:
+    """The resident model for `path` (default LOCAL_MODEL_PATH), loading it on first use.
+    At most LOCAL_MAX_MODELS stay loaded; the least recently used one is released."""
+    path = path or LOCAL_MODEL_PATH
+    if not path:
+        raise LocalInferenceError("LOCAL_MODEL_PATH is not set")
+    with _models_lock:
+        model = _models.get(path)
+        # A model that failed to load stays cached so callers fail fast until restart
+        if model is None:
+            model = _models[path] = LocalModel(path)
+        _models.move_to_end(path)
+        while len(_models) > max(1, LOCAL_MAX_MODELS):
+            _, evicted = _models.popitem(last=False)
+            evicted.close()
+    return model
+
+
+@traced_provider("local")
+@cached("local")
+def call_local(prompt: str, model: Optional[str] = None, timeout: Optional[float] = None) -> str:
+    """Generate with the local model at path `model`. Raises LocalInferenceError if the
+    runtime or model file is missing."""
+    t0 = time.time()
+    text = get_model(model).submit(prompt).result(timeout=timeout or LOCAL_TIMEOUT)
+    current_span().set(local_seconds=time.time() - t0)
+    return text
+
+
+def warm(paths: Optional[List[str]] = None):
+    """Load the given models (default LOCAL_MODEL_PATH) and wait until they're resident."""
+    for path in paths or [LOCAL_MODEL_PATH]:
+        if path:
+            get_model(path).wait_loaded()
+
+
+def get_stats() -> Dict[str, Any]:
+    with _models_lock:
+        return {path: {**m.stats, "loaded": m._llm is not None, "queued": m._queue.qsize()} for path, m in _models.items()}
@@ -1,43 +1,99 @@
+from collections.abc import Mapping
 from typing import Dict, Any, Optional
+import importlib
+import threading
 import time
 import json
-from .agents.agriculture import AgricultureAgent
-from .agents.education import EducationAgent
-from .agents.healthcare import HealthAgent
+import uuid
 from .validator import validate_json
 from .db import db
-from .llm_providers import call_openai, call_all_providers
+from .llm_providers import call_all_providers
+from .json_repair import conform
+from .semantic_cache import semantic_cache
+from .session_store import build_session_store, session_lock
+from .tracing import span
+from .summarizer import Summarizer, STATE_KEY, empty_summary, fold_deterministic, turn_count, unfolded
+from .config import SUMMARY_BACKGROUND
 
-AGENTS = {
-    "agriculture": AgricultureAgent(),
-    "education": EducationAgent(),
-    "healthcare": HealthAgent(),
-}
+class _LazyAgents(Mapping):
+    """Domain -> agent; each agent module is imported and instantiated on first use."""
+
+    _classes = {
+        "agriculture": (".agents.agriculture", "AgricultureAgent"),
+        "education": (".agents.education", "EducationAgent"),
+        "healthcare": (".agents.healthcare", "HealthAgent"),
+    }
+
+    def __init__(self):
+        self._agents: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def __getitem__(self, domain: str):
+        agent = self._agents.get(domain)
+        if agent is None:
+            module, cls = self._classes[domain]
+            with self._lock:
+                agent = self._agents.get(domain)
+                if agent is None:
+                    agent = getattr(importlib.import_module(module, __package__), cls)()
+                    self._agents[domain] = agent
+        return agent
+
+    def __iter__(self):
+        return iter(self._classes)
+
+    def __len__(self):
+        return len(self._classes)
+
+
+AGENTS = _LazyAgents()
+
+_sessions = build_session_store()
+_summarizer = Summarizer(_sessions.get, _sessions.put)
 
-_session_ctx: Dict[str, Dict[str, Any]] = {}
 
+def process_question(domain: str, question: str, region: str, session_id: Optional[str] = None, context: Optional[Dict[str, Any]] = None, all_providers: bool = False, use_cache: bool = True) -> Dict[str, Any]:
+    with span("orchestrator.process_question", domain=domain, region=region, session_id=session_id, all_providers=all_providers) as s:
+        result = _process_question(domain, question, region, session_id, context, all_providers, use_cache)
+        s.set(status=result.get("status"), semantic_cache_hit=bool(result.get("cache_hit")))
+        return result
 
-def process_question(domain: str, question: str, region: str, session_id: Optional[str] = None, context: Optional[Dict[str, Any]] = None, all_providers: bool = False) -> Dict[str, Any]:
+
+def _context_free(ctx: Dict[str, Any], context: Optional[Dict[str, Any]]) -> bool:
+    return not context and not ctx.get("history") and not ctx.get("turns_dropped")
+
+
+def _process_question(domain: str, question: str, region: str, session_id: Optional[str], context: Optional[Dict[str, Any]], all_providers: bool, use_cache: bool) -> Dict[str, Any]:
     t0 = time.time()
-    sid = session_id or str(int(time.time() * 1000))
-    ctx = _session_ctx.get(sid, {})
+    # Millisecond timestamps collide under concurrent requests
+    sid = session_id or uuid.uuid4().hex
+    ctx = _sessions.get(sid) or {}
     if context:
         ctx.update(context)
     agent = AGENTS.get(domain)
     if not agent:
         return {"status": "error", "error": f"Unknown domain {domain}"}
 
-    raw = agent.process(question, region, ctx)
-    cleaned = validate_json(raw.get("raw_response", ""))
+    # Answers shaped by a session's history or caller context are neither served from nor
+    # added to the shared cache
+    use_cache = use_cache and _context_free(ctx, context)
+    hit = semantic_cache.lookup(domain, region, question) if use_cache else None
+    if hit:
+        cleaned = hit["answer"]
+    else:
+        t_agent = time.time()
+        raw = agent.process(question, region, ctx)
+        cleaned = validate_json(raw.get("raw_response", ""), agent.schema or None)
+        db.log(agent.name, question, json.dumps(cleaned, ensure_ascii=False, default=str), time.time() - t_agent, sid)
+        # Only fully validated answers are worth serving to paraphrased questions
+        if use_cache and conform(cleaned, agent.schema) is not None:
+            semantic_cache.add(domain, region, question, cleaned)
 
     multi = None
     if all_providers:
         multi = call_all_providers(agent.build_prompt(question, region, ctx))
 
-    ctx.setdefault("history", []).append({"q": question, "a": cleaned, "multi": multi})
-    ctx["domain"] = domain
-    ctx["region"] = region
-    _session_ctx[sid] = ctx
+    _record_turn(sid, ctx, domain, region, question, cleaned, multi)
 
     result = {
         "session_id": sid,
@@ -46,6 +102,7 @@ def process_question(domain: str, question: str, region: str, session_id: Option
         "question": question,
         "agent_response": cleaned,
         "all_providers": multi,
+        "cache_hit": {"similarity": hit["similarity"], "matched_question": hit["matched_question"]} if hit else None,
         "processing_time": time.time() - t0,
         "status": "success",
     }
@@ -53,28 +110,62 @@ def process_question(domain: str, question: str, region: str, session_id: Option
     return result
 
 
+def _record_turn(sid: str, ctx: Dict[str, Any], domain: str, region: str, question: str, cleaned: Any, multi: Any):
+    with session_lock(sid):
+        latest = _sessions.get(sid)
+        if latest is not None and latest is not ctx and STATE_KEY in latest:
+            # A background fold saved a newer summary since this request read the session
+            ctx[STATE_KEY] = latest[STATE_KEY]
+        ctx.setdefault("history", []).append({"q": question, "a": cleaned, "multi": multi})
+        ctx["domain"] = domain
+        ctx["region"] = region
+        # Created here so the background fold only ever replaces the value
+        ctx.setdefault(STATE_KEY, {"upto": 0, "summary": empty_summary()})
+        _sessions.put(sid, ctx)
+    if SUMMARY_BACKGROUND:
+        _summarizer.schedule(sid)
+
+
+def adopt_answer(result: Dict[str, Any]) -> Dict[str, Any]:
+    """`result` of another caller's process_question, moved into a new session of its own.
+    For callers that shared an in-flight answer and must not share its session."""
+    if result.get("status") != "success":
+        return result
+    sid = uuid.uuid4().hex
+    _record_turn(sid, {}, result["domain"], result["region"], result["question"], result["agent_response"], result.get("all_providers"))
+    adopted = {**result, "session_id": sid}
+    db.save_response(sid, adopted)
+    return adopted
+
+
 def get_history(session_id: str):
-    return _session_ctx.get(session_id, {}).get("history", [])
+    return (_sessions.get(session_id) or {}).get("history", [])
 
 
-def finalize_session(session_id: str) -> Dict[str, Any]:
-    ctx = _session_ctx.get(session_id)
+def finalize_session(session_id: str, wait: float = 0.0) -> Dict[str, Any]:
+    """Final JSON for the session from the running summary. If background folding hasn't
+    caught up (after waiting up to `wait` seconds), the remaining turns are merged
+    deterministically and the result is marked "pending" with a `job_id` to poll via
+    get_finalize_job for the full summary."""
+    if wait:
+        _summarizer.wait(session_id, wait)
+    ctx = _sessions.get(session_id)
     if not ctx:
         return {"status": "error", "error": "No session"}
-    domain = ctx.get("domain", "unknown")
-    region = ctx.get("region", "unknown")
-    history = ctx.get("history", [])
-    # Build a concise final JSON by summarizing history
-    joined = "\n".join([f"Q: {h['q']}\nA: {json.dumps(h['a'], ensure_ascii=False)}" for h in history])
-    try:
-        prompt = f"Summarize the survey conversation into a final JSON object capturing key_insights, recommendations, follow_up_questions.\nDomain: {domain}\nRegion: {region}\nConversation:\n{joined}\nReturn JSON only with keys: final_summary, key_insights, recommendations, follow_up_questions."
-        text = call_openai(prompt, model="gpt-4o-mini", json_object=True)
-        return json.loads(text)
-    except Exception:
-        # Fallback minimal
-        return {
-            "final_summary": f"{len(history)} turns in {domain}/{region}",
-            "key_insights": [],
-            "recommendations": [],
-            "follow_up_questions": [],
-        }
+    state = ctx.get(STATE_KEY) or {"upto": 0, "summary": empty_summary()}
+    total = turn_count(ctx)
+    if state["upto"] >= total:
+        return {**state["summary"], "status": "complete", "turns": total}
+    job = _summarizer.pending(session_id) or _summarizer.schedule(session_id)
+    summary = fold_deterministic(state["summary"], unfolded(ctx, state["upto"]), ctx)
+    return {**summary, "status": "pending", "job_id": job.id, "turns": total}
+
+
+def get_finalize_job(job_id: str) -> Dict[str, Any]:
+    job = _summarizer.job(job_id)
+    if job is None:
+        return {"status": "error", "error": "Unknown job"}
+    out = job.to_dict()
+    if job.status == "done":
+        out["result"] = finalize_session(job.session_id)
+    return out
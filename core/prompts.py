@@ -0,0 +1,156 @@
+"""Prompt templates laid out for prefix caching, plus prefix-cache hit accounting.
+
+A template is a static prefix (instructions, schema, examples; optionally parameterised
+by slow-changing fields such as domain or region) followed by a dynamic suffix (question,
+context, text). Providers that cache prompt prefixes (OpenAI, Groq, Gemini) and local KV
+reuse only help when the long shared part comes first, so templates always put it there.
+Prefixes are rendered once per set of static values and kept; suffixes are parsed once.
+
+Usage fields report how much of each prompt was served from the provider's cache
+(`prompt_tokens_details.cached_tokens`, Gemini `cachedContentTokenCount`); see
+`record_usage` and `get_cache_stats`.
+"""
+from collections import OrderedDict
+from string import Formatter
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import threading
+
+_MAX_PREFIXES = 4096
+_MIN_LEAD = 20
+
+
+def _fields(text: str) -> List[str]:
+    return [field for _, field, _, _ in Formatter().parse(text) if field]
+
+
+class PromptTemplate:
+    """`prefix` and `suffix` are str.format templates (literal braces doubled). Fields in
+    the prefix are static, fields in the suffix dynamic; a field can't be both."""
+
+    def __init__(self, name: str, prefix: str, suffix: str):
+        self.name = name
+        self.prefix = prefix
+        # First literal line of the prefix; finding it in model output means the prompt was echoed
+        lead = next((line.strip() for line in prefix.split("{", 1)[0].splitlines() if line.strip()), "")
+        self.lead = lead if len(lead) >= _MIN_LEAD else ""
+        self.static_fields = tuple(dict.fromkeys(_fields(prefix)))
+        self.dynamic_fields = tuple(dict.fromkeys(_fields(suffix)))
+        overlap = set(self.static_fields) & set(self.dynamic_fields)
+        if overlap:
+            raise ValueError(f"{name}: fields {sorted(overlap)} appear in both prefix and suffix")
+        # Parsed once: (literal, field) pairs joined on every render
+        self._suffix: List[Tuple[str, Optional[str]]] = [(literal, field) for literal, field, _, _ in Formatter().parse(suffix)]
+        self._prefixes: "OrderedDict[tuple, str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def compile(self, **static) -> str:
+        """The rendered prefix for these static values, built once and kept."""
+        key = tuple(static.get(f) for f in self.static_fields)
+        with self._lock:
+            prefix = self._prefixes.get(key)
+            if prefix is not None:
+                self._prefixes.move_to_end(key)
+                return prefix
+        prefix = self.prefix.format(**static)
+        with self._lock:
+            self._prefixes[key] = prefix
+            while len(self._prefixes) > _MAX_PREFIXES:
+                self._prefixes.popitem(last=False)
+        return prefix
+
+    def render(self, **values) -> str:
+        prefix = self.compile(**{f: values[f] for f in self.static_fields})
+        parts = [prefix]
+        for literal, field in self._suffix:
+            parts.append(literal)
+            if field is not None:
+                parts.append(str(values[field]))
+        return "".join(parts)
+
+    def precompile(self, combos: Iterable[Dict[str, Any]]) -> int:
+        n = 0
+        for static in combos:
+            self.compile(**static)
+            n += 1
+        return n
+
+    def compiled(self) -> int:
+        with self._lock:
+            return len(self._prefixes)
+
+
+class PromptRegistry:
+    def __init__(self):
+        self._templates: Dict[str, PromptTemplate] = {}
+
+    def register(self, name: str, prefix: str, suffix: str) -> PromptTemplate:
+        template = PromptTemplate(name, prefix, suffix)
+        self._templates[name] = template
+        return template
+
+    def get(self, name: str) -> PromptTemplate:
+        return self._templates[name]
+
+    def render(self, name: str, **values) -> str:
+        return self._templates[name].render(**values)
+
+    def echoes(self, text: str) -> bool:
+        """True if `text` contains the opening line of a registered prompt."""
+        return bool(text) and any(t.lead and t.lead in text for t in self._templates.values())
+
+    def names(self) -> List[str]:
+        return list(self._templates)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {name: {"static_fields": t.static_fields, "compiled_prefixes": t.compiled()} for name, t in self._templates.items()}
+
+
+registry = PromptRegistry()
+
+
+# --- Provider prefix-cache accounting ---
+
+_cache_lock = threading.Lock()
+_cache_stats: Dict[str, Dict[str, int]] = {}
+
+
+def cached_tokens(usage: Optional[Dict[str, Any]] = None, usage_metadata: Optional[Dict[str, Any]] = None) -> Optional[int]:
+    """Cached prompt tokens from an OpenAI/Groq `usage` or Gemini `usageMetadata` dict."""
+    details = (usage or {}).get("prompt_tokens_details") or {}
+    if details.get("cached_tokens") is not None:
+        return int(details["cached_tokens"])
+    meta = usage_metadata or {}
+    if meta.get("cachedContentTokenCount") is not None:
+        return int(meta["cachedContentTokenCount"])
+    if usage or meta:
+        # Reported usage without a cache field means nothing was served from cache
+        return 0
+    return None
+
+
+def record_usage(provider: str, prompt_tokens: Optional[int], cached: Optional[int]):
+    if prompt_tokens is None:
+        return
+    with _cache_lock:
+        st = _cache_stats.setdefault(provider, {"calls": 0, "prompt_tokens": 0, "cached_tokens": 0, "calls_with_cache_hit": 0})
+        st["calls"] += 1
+        st["prompt_tokens"] += int(prompt_tokens)
+        st["cached_tokens"] += int(cached or 0)
+        st["calls_with_cache_hit"] += 1 if cached else 0
+
+
+def get_cache_stats() -> Dict[str, Dict[str, Any]]:
+    with _cache_lock:
+        out = {}
+        for provider, st in _cache_stats.items():
+            out[provider] = {
+                **st,
+                "token_hit_rate": st["cached_tokens"] / st["prompt_tokens"] if st["prompt_tokens"] else 0.0,
+                "call_hit_rate": st["calls_with_cache_hit"] / st["calls"] if st["calls"] else 0.0,
+            }
+        return out
+
+
+def reset_cache_stats():
+    with _cache_lock:
+        _cache_stats.clear()
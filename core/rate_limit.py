@@ -0,0 +1,207 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, List, Optional, Tuple
+import heapq
+import itertools
+import logging
+import random
+import threading
+import time
+
+from .config import (
+    RATE_LIMITS, RATE_LIMIT_ENABLED, RATE_LIMIT_MAX_WAIT, RATE_LIMIT_BACKOFF_BASE, RATE_LIMIT_BACKOFF_MAX,
+    MODEL_CONFIG,
+)
+from .tracing import current_span
+
+logger = logging.getLogger(__name__)
+
+# Lower value = served first
+INTERACTIVE = 0
+BACKGROUND = 10
+
+_priority: ContextVar[int] = ContextVar("request_priority", default=INTERACTIVE)
+
+
+@contextmanager
+def priority(level: int):
+    """Run provider calls made inside this block (and threads started via `propagate`)
+    at the given scheduling priority."""
+    token = _priority.set(level)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def current_priority() -> int:
+    return _priority.get()
+
+
+class RateLimitTimeout(Exception):
+    pass
+
+
+def estimate_tokens(prompt: str, max_tokens: Optional[int] = None) -> int:
+    # Rough prompt size plus the completion budget; providers count both against TPM
+    return len(prompt or "") // 4 + (max_tokens if max_tokens is not None else MODEL_CONFIG["max_new_tokens"])
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Retry-After is either delta-seconds or an HTTP date."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except Exception:
+        return None
+
+
+class TokenBucket:
+    """Continuously refilling bucket sized to one minute of capacity (0 = unlimited)."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        if self.rate <= 0:
+            return 0.0
+        self._refill(now)
+        # A single request larger than the bucket waits for a full bucket, not forever
+        amount = min(amount, self.capacity)
+        return 0.0 if self.tokens >= amount else (amount - self.tokens) / self.rate
+
+    def take(self, amount: float):
+        if self.rate > 0:
+            self.tokens -= min(amount, self.capacity)
+
+
+class Limiter:
+    """RPM and TPM buckets for one provider/model. Waiters are served strictly by
+    priority, then arrival, so queued interactive calls go before background work."""
+
+    def __init__(self, key: str, rpm: int, tpm: int):
+        self.key = key
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.blocked_until = 0.0
+        self._cond = threading.Condition()
+        self._waiters: List[Tuple[int, int]] = []
+        self._seq = itertools.count()
+        self.stats = {"granted": 0, "queued": 0, "wait_time": 0.0, "throttled": 0, "timeouts": 0}
+
+    def acquire(self, tokens: int, priority: int = INTERACTIVE, timeout: float = RATE_LIMIT_MAX_WAIT) -> float:
+        """Block until the request fits both buckets; returns the time spent waiting."""
+        entry = (priority, next(self._seq))
+        start = time.monotonic()
+        deadline = start + timeout
+        with self._cond:
+            heapq.heappush(self._waiters, entry)
+            try:
+                while True:
+                    now = time.monotonic()
+                    delay = None
+                    if self._waiters[0] == entry:
+                        delay = max(self.blocked_until - now, self.requests.wait_time(1, now), self.tokens.wait_time(tokens, now))
+                        if delay <= 0:
+                            self.requests.take(1)
+                            self.tokens.take(tokens)
+                            break
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        self.stats["timeouts"] += 1
+                        raise RateLimitTimeout(f"Rate limit wait for {self.key} exceeded {timeout:.0f}s")
+                    # Non-head waiters sleep until the head is served
+                    self._cond.wait(remaining if delay is None else min(delay, remaining))
+            finally:
+                self._waiters.remove(entry)
+                heapq.heapify(self._waiters)
+                self._cond.notify_all()
+            waited = time.monotonic() - start
+            self.stats["granted"] += 1
+            if waited > 0.001:
+                self.stats["queued"] += 1
+                self.stats["wait_time"] += waited
+        return waited
+
+    def block(self, seconds: float):
+        """Hold every caller off for `seconds` (the provider told us to back off)."""
+        with self._cond:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+            self.stats["throttled"] += 1
+            self._cond.notify_all()
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                **self.stats,
+                "waiting": len(self._waiters),
+                "blocked_for": max(0.0, self.blocked_until - time.monotonic()),
+            }
+
+
+class Scheduler:
+    """Central admission point for provider calls, one Limiter per provider/model."""
+
+    def __init__(self, limits: Dict[str, Dict[str, int]] = RATE_LIMITS, enabled: bool = RATE_LIMIT_ENABLED):
+        self.limits = limits
+        self.enabled = enabled
+        self._limiters: Dict[str, Limiter] = {}
+        self._lock = threading.Lock()
+
+    def limiter(self, provider: str, model: Optional[str] = None) -> Optional[Limiter]:
+        if not self.enabled:
+            return None
+        key = f"{provider}:{model}" if model else provider
+        with self._lock:
+            lim = self._limiters.get(key)
+            if lim is None:
+                conf = self.limits.get(key) or self.limits.get(provider)
+                if not conf:
+                    return None
+                lim = Limiter(key, conf.get("rpm", 0), conf.get("tpm", 0))
+                self._limiters[key] = lim
+        return lim
+
+    def acquire(self, provider: str, model: Optional[str] = None, tokens: int = 0, priority: Optional[int] = None):
+        lim = self.limiter(provider, model)
+        if lim is None:
+            return
+        waited = lim.acquire(tokens, current_priority() if priority is None else priority)
+        if waited > 0.001:
+            current_span().set(rate_wait=round(waited, 3))
+
+    def throttled(self, provider: Optional[str], model: Optional[str], attempt: int, retry_after: Optional[float] = None) -> float:
+        """Record a 429/503 and return how long this caller should sleep before retrying.
+        Honors Retry-After when given; otherwise exponential backoff. Both are jittered
+        so concurrent callers don't retry in lockstep."""
+        if retry_after is not None:
+            delay = retry_after + random.uniform(0, RATE_LIMIT_BACKOFF_BASE)
+        else:
+            delay = random.uniform(0, min(RATE_LIMIT_BACKOFF_MAX, RATE_LIMIT_BACKOFF_BASE * 2 ** attempt))
+        lim = self.limiter(provider, model) if provider else None
+        if lim is not None:
+            lim.block(retry_after or 0.0)
+        current_span().incr("throttled")
+        logger.warning(f"⚠️ {provider or 'provider'} rate limited; retrying in {delay:.1f}s")
+        return delay
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            items = list(self._limiters.items())
+        return {k: lim.snapshot() for k, lim in items}
+
+
+scheduler = Scheduler()
@@ -0,0 +1,218 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import logging
+import threading
+import time
+
+from .config import (
+    ROUTER_WINDOW, ROUTER_MIN_SAMPLES, ROUTER_DEFAULT_LATENCY, ROUTER_HEDGE, ROUTER_HEDGE_MIN_DELAY,
+    BREAKER_FAILURE_THRESHOLD, BREAKER_ERROR_RATE, BREAKER_COOLDOWN,
+)
+from .tracing import span, propagate
+
+logger = logging.getLogger(__name__)
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class AllProvidersFailed(Exception):
+    def __init__(self, errors: Dict[str, str]):
+        super().__init__("All providers failed: " + "; ".join(f"{k}: {v}" for k, v in errors.items()))
+        self.errors = errors
+
+
+class ProviderHealth:
+    """Rolling latency/error window plus a circuit breaker for one provider/model."""
+
+    def __init__(self, key: str, window: int = ROUTER_WINDOW):
+        self.key = key
+        self.samples: "deque[Tuple[float, bool]]" = deque(maxlen=window)
+        self.consecutive_failures = 0
+        self.state = CLOSED
+        self.opened_at = 0.0
+        # Start of the half-open probe in flight, 0 when there is none
+        self.probing_since = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, latency: float, ok: bool):
+        with self._lock:
+            self.samples.append((latency, ok))
+            self.probing_since = 0.0
+            if ok:
+                self.consecutive_failures = 0
+                if self.state != CLOSED:
+                    logger.info(f"Circuit for {self.key} closed")
+                self.state = CLOSED
+                return
+            self.consecutive_failures += 1
+            if self.state == HALF_OPEN or self._should_open():
+                if self.state != OPEN:
+                    logger.warning(f"⚠️ Circuit for {self.key} opened")
+                self.state = OPEN
+                self.opened_at = time.time()
+
+    def _should_open(self) -> bool:
+        if self.consecutive_failures >= BREAKER_FAILURE_THRESHOLD:
+            return True
+        return len(self.samples) >= ROUTER_MIN_SAMPLES and self._error_rate() >= BREAKER_ERROR_RATE
+
+    def _admits(self, now: float) -> bool:
+        if self.state == CLOSED:
+            return True
+        # A probe that never reported back stops blocking after another cooldown
+        if self.probing_since and now - self.probing_since < BREAKER_COOLDOWN:
+            return False
+        return self.state == HALF_OPEN or now - self.opened_at >= BREAKER_COOLDOWN
+
+    def available(self) -> bool:
+        """Whether a call would be admitted now. No side effects."""
+        with self._lock:
+            return self._admits(time.time())
+
+    def acquire(self, force: bool = False) -> bool:
+        """Admit a call that is about to start. Once the cooldown has passed, an open circuit
+        goes half-open and admits a single probe; its recorded outcome closes or reopens it.
+        `force` lets calls through an open circuit (never past an in-flight probe)."""
+        with self._lock:
+            now = time.time()
+            if self._admits(now):
+                if self.state != CLOSED:
+                    self.state = HALF_OPEN
+                    self.probing_since = now
+                return True
+            return force and self.state == OPEN
+
+    def _error_rate(self) -> float:
+        if not self.samples:
+            return 0.0
+        return sum(1 for _, ok in self.samples if not ok) / len(self.samples)
+
+    def _latency(self, pct: float) -> Optional[float]:
+        lat = sorted(l for l, ok in self.samples if ok)
+        if len(lat) < ROUTER_MIN_SAMPLES:
+            return None
+        return lat[min(len(lat) - 1, int(pct * len(lat)))]
+
+    def p50(self) -> Optional[float]:
+        return self._latency(0.5)
+
+    def p95(self) -> Optional[float]:
+        return self._latency(0.95)
+
+    def score(self) -> float:
+        """Expected cost of a call: median latency inflated by the error rate."""
+        p50 = self.p50()
+        return (p50 if p50 is not None else ROUTER_DEFAULT_LATENCY) * (1 + 4 * self._error_rate())
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "samples": len(self.samples),
+            "error_rate": self._error_rate(),
+            "p50": self.p50(),
+            "p95": self.p95(),
+            "consecutive_failures": self.consecutive_failures,
+            "probing": bool(self.probing_since),
+        }
+
+
+class Router:
+    """Orders candidate providers by rolling health, skips open circuits and hedges:
+    if the current attempt runs past its p95 latency, the next-best candidate is started
+    in parallel and the first success wins. Failures fall through immediately."""
+
+    def __init__(self, max_workers: int = 16):
+        self.health: Dict[str, ProviderHealth] = {}
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="router")
+
+    def _health(self, key: str) -> ProviderHealth:
+        with self._lock:
+            if key not in self.health:
+                self.health[key] = ProviderHealth(key)
+            return self.health[key]
+
+    def order(self, keys: List[str]) -> List[str]:
+        """Candidates best first, skipping open circuits. No side effects; admission
+        happens in `acquire` when a call actually starts."""
+        # Caller order acts as a prior: later candidates need to be clearly better to jump ahead
+        ranked = [k for _, k in sorted(enumerate(keys), key=lambda ik: self._health(ik[1]).score() * (1 + 0.25 * ik[0]))]
+        allowed = [k for k in ranked if self._health(k).available()]
+        # If every circuit is open, still try them rather than failing outright
+        return allowed or ranked
+
+    def available(self, key: str) -> bool:
+        """False while the key's circuit is open or its half-open probe is in flight."""
+        return self._health(key).available()
+
+    def acquire(self, key: str, force: bool = False) -> bool:
+        return self._health(key).acquire(force)
+
+    def record(self, key: str, latency: float, ok: bool):
+        """Feed an outcome observed outside `call` (e.g. a stream) into the health stats."""
+        self._health(key).record(latency, ok)
+
+    def _attempt(self, key: str, fn: Callable[[], Any]) -> Any:
+        t0 = time.time()
+        try:
+            result = fn()
+        except Exception:
+            self.record(key, time.time() - t0, False)
+            raise
+        self.record(key, time.time() - t0, True)
+        return result
+
+    def call(self, candidates: List[Tuple[str, Callable[[], Any]]], hedge: bool = ROUTER_HEDGE) -> Tuple[str, Any]:
+        """Run the best candidate (key, zero-arg callable); return (key, result) of the
+        first success. Raises AllProvidersFailed when every candidate fails."""
+        fns = dict(candidates)
+        order = self.order([k for k, _ in candidates])
+        force = not any(self.available(k) for k in order)
+        errors: Dict[str, str] = {}
+        pending: Dict[Any, str] = {}
+        launched = 0
+        with span("router.call", candidates=",".join(order)) as s:
+            def launch():
+                nonlocal launched
+                while launched < len(order):
+                    key = order[launched]
+                    launched += 1
+                    if self.acquire(key, force):
+                        pending[self._pool.submit(propagate(self._attempt), key, fns[key])] = key
+                        return
+                    errors[key] = "circuit open"
+
+            launch()
+            while pending:
+                hedge_delay = None
+                if hedge and launched < len(order):
+                    p95 = self._health(order[launched - 1]).p95()
+                    hedge_delay = max(ROUTER_HEDGE_MIN_DELAY, p95 if p95 is not None else ROUTER_DEFAULT_LATENCY)
+                done, _ = wait(pending, timeout=hedge_delay, return_when=FIRST_COMPLETED)
+                if not done:
+                    s.incr("hedged")
+                    launch()
+                    continue
+                for fut in done:
+                    key = pending.pop(fut)
+                    try:
+                        result = fut.result()
+                    except Exception as e:
+                        errors[key] = str(e)[:300]
+                        continue
+                    # Stragglers keep running and still feed the health stats
+                    s.set(winner=key, retries=len(errors))
+                    return key, result
+                if not pending and launched < len(order):
+                    launch()
+            s.set(retries=len(errors))
+        raise AllProvidersFailed(errors)
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            items = list(self.health.items())
+        return {k: h.snapshot() for k, h in items}
+
+
+router = Router()
@@ -0,0 +1,144 @@
+from typing import Dict, Any, Optional
+import atexit
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from .config import SEMANTIC_CACHE_ENABLED, SEMANTIC_CACHE_THRESHOLD, SEMANTIC_CACHE_DIR, SEMANTIC_CACHE_SAVE_EVERY
+from .embeddings import embed
+from .json_repair import is_placeholder
+
+logger = logging.getLogger(__name__)
+
+
+def _key_text(domain: str, region: str, question: str) -> str:
+    return f"{domain} | {region} | {question.strip()}"
+
+
+class SemanticCache:
+    """Near-duplicate answer cache: FAISS inner-product index over normalised
+    embeddings of (domain, region, question), with answers kept in SQLite by vector id.
+
+    The index is memory-mapped on startup when possible and swapped for a writable
+    in-RAM copy on the first insert; it is flushed every `save_every` inserts and at exit.
+    """
+
+    def __init__(self, directory: str = SEMANTIC_CACHE_DIR, threshold: float = SEMANTIC_CACHE_THRESHOLD, save_every: int = SEMANTIC_CACHE_SAVE_EVERY, enabled: bool = SEMANTIC_CACHE_ENABLED):
+        self.directory = directory
+        self.threshold = threshold
+        self.save_every = max(1, save_every)
+        self.enabled = enabled
+        self.index_path = os.path.join(directory, "index.faiss")
+        self.db_path = os.path.join(directory, "answers.sqlite3")
+        self.stats = {"hits": 0, "misses": 0, "adds": 0}
+        self._lock = threading.RLock()
+        self._index = None
+        self._mmapped = False
+        self._dirty = 0
+        self._conn: Optional[sqlite3.Connection] = None
+        self._loaded = False
+
+    def _load(self) -> bool:
+        if self._loaded:
+            return self._index is not None
+        self._loaded = True
+        try:
+            import faiss  # type: ignore
+        except Exception as e:
+            logger.warning(f"⚠️ faiss unavailable ({e}); semantic cache disabled.")
+            return False
+        os.makedirs(self.directory, exist_ok=True)
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS answers (id INTEGER PRIMARY KEY AUTOINCREMENT, domain TEXT, region TEXT, question TEXT, answer TEXT, created REAL)"
+        )
+        if os.path.exists(self.index_path):
+            try:
+                self._index = faiss.read_index(self.index_path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+                self._mmapped = True
+            except Exception:
+                self._index = faiss.read_index(self.index_path)
+        atexit.register(self.save)
+        return True
+
+    def _ensure_index(self, dim: int):
+        import faiss  # type: ignore
+        if self._index is None:
+            self._index = faiss.IndexIDMap(faiss.IndexFlatIP(dim))
+        elif self._mmapped:
+            self._index = faiss.read_index(self.index_path)
+            self._mmapped = False
+
+    def warm(self) -> bool:
+        """Open the index and answer store now instead of on the first lookup."""
+        if not self.enabled:
+            return False
+        with self._lock:
+            return self._load()
+
+    def lookup(self, domain: str, region: str, question: str) -> Optional[Dict[str, Any]]:
+        if not self.enabled:
+            return None
+        with self._lock:
+            if not self._load() or self._index is None or self._index.ntotal == 0:
+                self.stats["misses"] += 1
+                return None
+        # Model inference outside the lock so concurrent workers don't queue behind it
+        vec = embed([_key_text(domain, region, question)])
+        if vec is None:
+            return None
+        with self._lock:
+            scores, ids = self._index.search(vec, 5)
+            for score, vid in zip(scores[0], ids[0]):
+                if vid < 0 or score < self.threshold:
+                    break
+                row = self._conn.execute("SELECT domain, region, question, answer FROM answers WHERE id = ?", (int(vid),)).fetchone()
+                # Near-duplicate wording only counts within the same domain and region
+                if row and row[0] == domain and row[1].lower() == region.lower():
+                    self.stats["hits"] += 1
+                    return {"answer": json.loads(row[3]), "similarity": float(score), "matched_question": row[2]}
+            self.stats["misses"] += 1
+            return None
+
+    def add(self, domain: str, region: str, question: str, answer: Dict[str, Any]):
+        if not self.enabled:
+            return
+        if is_placeholder(answer):
+            # The prompt's schema example, not an answer; serving it to paraphrases would spread it
+            logger.warning(f"⚠️ Not caching placeholder answer for {domain}/{region}")
+            return
+        with self._lock:
+            if not self._load():
+                return
+        vec = embed([_key_text(domain, region, question)])
+        if vec is None:
+            return
+        import numpy as np
+        with self._lock:
+            self._ensure_index(vec.shape[1])
+            cur = self._conn.execute(
+                "INSERT INTO answers (domain, region, question, answer, created) VALUES (?, ?, ?, ?, ?)",
+                (domain, region, question, json.dumps(answer, ensure_ascii=False, default=str), time.time()),
+            )
+            self._conn.commit()
+            self._index.add_with_ids(vec, np.array([cur.lastrowid], dtype="int64"))
+            self.stats["adds"] += 1
+            self._dirty += 1
+            if self._dirty >= self.save_every:
+                self.save()
+
+    def save(self):
+        with self._lock:
+            if self._index is None or self._mmapped or not self._dirty:
+                return
+            import faiss  # type: ignore
+            tmp = self.index_path + ".tmp"
+            faiss.write_index(self._index, tmp)
+            os.replace(tmp, self.index_path)
+            self._dirty = 0
+
+
+semantic_cache = SemanticCache()
@@ -0,0 +1,233 @@
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from .config import (
+    SESSION_TTL, SESSION_MAX_BYTES, SESSION_MAX_HISTORY, SESSION_KEEP_MULTI, SESSION_SPILL, SESSION_SPILL_PATH,
+)
+
+logger = logging.getLogger(__name__)
+
+# Striped so memory stays bounded however many sessions exist
+_LOCK_STRIPES = 64
+_session_locks = [threading.Lock() for _ in range(_LOCK_STRIPES)]
+
+
+def session_lock(session_id: str) -> threading.Lock:
+    """Lock held for every read-modify-write of a session (turns, background folds)."""
+    return _session_locks[hash(session_id) % _LOCK_STRIPES]
+
+
+def session_size(ctx: Dict[str, Any]) -> int:
+    return len(json.dumps(ctx, ensure_ascii=False, default=str).encode("utf-8"))
+
+
+def compact_history(ctx: Dict[str, Any], max_history: int = SESSION_MAX_HISTORY, keep_multi: int = SESSION_KEEP_MULTI) -> Dict[str, Any]:
+    """Keep the last `max_history` turns and only the newest `keep_multi` all-provider payloads.
+    Mutates `ctx`; callers writing a live session hold its `session_lock`."""
+    history = ctx.get("history")
+    if not history:
+        return ctx
+    if max_history and len(history) > max_history:
+        dropped = len(history) - max_history
+        ctx["turns_dropped"] = ctx.get("turns_dropped", 0) + dropped
+        history = history[dropped:]
+    cutoff = len(history) - keep_multi
+    for i, turn in enumerate(history):
+        if i < cutoff and turn.get("multi") is not None:
+            turn["multi"] = None
+    ctx["history"] = history
+    return ctx
+
+
+class SessionStore(ABC):
+    @abstractmethod
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    def put(self, session_id: str, ctx: Dict[str, Any]):
+        ...
+
+    @abstractmethod
+    def delete(self, session_id: str):
+        ...
+
+    def prune(self, older_than: float) -> int:
+        """Drop sessions last written before `older_than` (epoch seconds)."""
+        return 0
+
+
+class SQLiteSessionStore(SessionStore):
+    def __init__(self, path: str = SESSION_SPILL_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("CREATE TABLE IF NOT EXISTS sessions (session_id TEXT PRIMARY KEY, ctx TEXT NOT NULL, updated REAL NOT NULL)")
+        self._lock = threading.Lock()
+
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute("SELECT ctx FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, session_id: str, ctx: Dict[str, Any]):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sessions (session_id, ctx, updated) VALUES (?, ?, ?)",
+                (session_id, json.dumps(ctx, ensure_ascii=False, default=str), time.time()),
+            )
+            self._conn.commit()
+
+    def delete(self, session_id: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+            self._conn.commit()
+
+    def prune(self, older_than: float) -> int:
+        with self._lock:
+            cur = self._conn.execute("DELETE FROM sessions WHERE updated < ?", (older_than,))
+            self._conn.commit()
+            return cur.rowcount
+
+
+class MongoSessionStore(SessionStore):
+    def __init__(self, database):
+        self.col = database["sessions"]
+
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        doc = self.col.find_one({"_id": session_id})
+        return doc.get("ctx") if doc else None
+
+    def put(self, session_id: str, ctx: Dict[str, Any]):
+        self.col.replace_one({"_id": session_id}, {"_id": session_id, "ctx": ctx, "updated": time.time()}, upsert=True)
+
+    def delete(self, session_id: str):
+        self.col.delete_one({"_id": session_id})
+
+    def prune(self, older_than: float) -> int:
+        return self.col.delete_many({"updated": {"$lt": older_than}}).deleted_count
+
+
+class MemorySessionStore(SessionStore):
+    """LRU session store bounded by total serialized bytes, with idle TTL.
+
+    Sessions pushed out by the byte budget are written to `spill` (if any) and
+    transparently reloaded on the next `get` (which removes the spilled copy); sessions
+    idle past `ttl` are dropped, spilled ones included.
+    """
+
+    def __init__(self, max_bytes: int = SESSION_MAX_BYTES, ttl: float = SESSION_TTL, spill: Optional[SessionStore] = None):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.spill = spill
+        self.total_bytes = 0
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()  # sid -> (ctx, size, last_access)
+        self._lock = threading.RLock()
+        self.stats = {"evicted": 0, "expired": 0, "spilled": 0, "reloaded": 0}
+        self._pruned = time.time()
+
+    def _drop(self, session_id: str):
+        _, size, _ = self._data.pop(session_id)
+        self.total_bytes -= size
+
+    def _expire(self):
+        now = time.time()
+        while self._data:
+            sid, (_, _, last) = next(iter(self._data.items()))
+            if now - last <= self.ttl:
+                break
+            self._drop(sid)
+            self.stats["expired"] += 1
+            if self.spill is not None:
+                self._spill_call("delete", sid)
+        # Spilled sessions that are never reloaded expire from the spill store itself
+        if self.spill is not None and now - self._pruned >= self.ttl:
+            self._pruned = now
+            self._spill_call("prune", now - self.ttl)
+
+    def _spill_call(self, method: str, arg: Any):
+        try:
+            getattr(self.spill, method)(arg)
+        except Exception as e:
+            logger.warning(f"⚠️ Session spill {method} failed for {arg}: {e}")
+
+    def _enforce_budget(self, keep: str):
+        while self.total_bytes > self.max_bytes and len(self._data) > 1:
+            sid = next(iter(self._data))
+            if sid == keep:
+                break
+            ctx, _, _ = self._data[sid]
+            self._drop(sid)
+            self.stats["evicted"] += 1
+            if self.spill is not None:
+                try:
+                    self.spill.put(sid, ctx)
+                    self.stats["spilled"] += 1
+                except Exception as e:
+                    logger.warning(f"⚠️ Session spill failed for {sid}: {e}")
+
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            self._expire()
+            item = self._data.get(session_id)
+            if item is not None:
+                ctx, size, _ = item
+                self._data[session_id] = (ctx, size, time.time())
+                self._data.move_to_end(session_id)
+                return ctx
+            if self.spill is None:
+                return None
+            # Under the lock so concurrent reloads of one session can't race the delete below
+            try:
+                ctx = self.spill.get(session_id)
+            except Exception as e:
+                logger.warning(f"⚠️ Session reload failed for {session_id}: {e}")
+                return None
+            if ctx is None:
+                return None
+            self.stats["reloaded"] += 1
+            self.put(session_id, ctx)
+            # Memory is authoritative again; a stale spilled copy would resurrect old turns
+            self._spill_call("delete", session_id)
+            return ctx
+
+    def put(self, session_id: str, ctx: Dict[str, Any]):
+        compact_history(ctx)
+        size = session_size(ctx)
+        with self._lock:
+            if session_id in self._data:
+                self._drop(session_id)
+            self._data[session_id] = (ctx, size, time.time())
+            self.total_bytes += size
+            self._expire()
+            self._enforce_budget(keep=session_id)
+
+    def delete(self, session_id: str):
+        with self._lock:
+            if session_id in self._data:
+                self._drop(session_id)
+        if self.spill is not None:
+            self.spill.delete(session_id)
+
+    def __len__(self):
+        return len(self._data)
+
+
+def build_session_store() -> SessionStore:
+    spill: Optional[SessionStore] = None
+    if SESSION_SPILL == "mongo":
+        from .db import db
+        if db.db is not None:
+            spill = MongoSessionStore(db.db)
+        else:
+            logger.warning("⚠️ SESSION_SPILL=mongo but Mongo is unavailable; spilling to SQLite.")
+            spill = SQLiteSessionStore()
+    elif SESSION_SPILL == "sqlite":
+        spill = SQLiteSessionStore()
+    return MemorySessionStore(spill=spill)
@@ -0,0 +1,268 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+import argparse
+import json
+import logging
+import random
+import sys
+import threading
+import time
+import zlib
+
+from .config import SIM_BATCH_RESPONDENTS, SIM_MAX_ANSWERS_PER_CALL, SIM_TOKENS_PER_ANSWER, SIM_CONCURRENCY, SIM_RETRIES, ROUTER_CALL_TIMEOUT
+from .json_repair import repair_json, conform, is_placeholder
+from .llm_providers import call_openai, call_groq, call_gemini
+from .orchestrator import AGENTS
+from .prompts import registry
+from .rate_limit import priority, BACKGROUND
+from .router import router, AllProvidersFailed
+from .tracing import span, propagate
+
+logger = logging.getLogger(__name__)
+
+# Persona attributes sampled per respondent: shared ones plus domain-specific ones
+PERSONA_TRAITS: Dict[str, Dict[str, List[str]]] = {
+    "common": {
+        "age_group": ["18-25", "26-35", "36-50", "51-65", "65+"],
+        "gender": ["female", "male"],
+        "setting": ["rural", "peri-urban", "urban"],
+        "income": ["low", "lower-middle", "middle", "upper-middle"],
+    },
+    "agriculture": {
+        "farm_size": ["marginal (<1 ha)", "small (1-2 ha)", "medium (2-10 ha)", "large (>10 ha)"],
+        "main_crop": ["rice", "wheat", "cotton", "pulses", "sugarcane", "vegetables", "millets"],
+        "irrigation": ["rain-fed", "canal", "borewell", "drip"],
+    },
+    "education": {
+        "role": ["primary student", "secondary student", "college student", "parent", "teacher"],
+        "school_type": ["government", "private", "aided"],
+        "device_access": ["none", "shared phone", "own phone", "laptop"],
+    },
+    "healthcare": {
+        "condition": ["none", "diabetes", "hypertension", "maternal care", "respiratory"],
+        "insurance": ["none", "Ayushman Bharat", "private", "employer"],
+        "clinic_distance": ["<2 km", "2-10 km", ">10 km"],
+    },
+}
+
+
+def make_personas(domain: str, region: str, n: int, seed: int = 0) -> List[Dict[str, Any]]:
+    """Deterministic personas for (domain, region, seed), so pilots are reproducible."""
+    rng = random.Random(zlib.crc32(f"{seed}|{domain}|{region}".encode("utf-8")))
+    traits = {**PERSONA_TRAITS["common"], **PERSONA_TRAITS.get(domain, {})}
+    return [{"id": f"{region}-{i + 1:04d}", **{k: rng.choice(v) for k, v in traits.items()}} for i in range(n)]
+
+
+def answer_schema(agent) -> Dict[str, str]:
+    # The respondent's own answer field (farmer_/student_/patient_response) plus a few extras
+    field = next((k for k in agent.schema if k.endswith("_response")), "response")
+    return {field: "string", "confidence": "number", "key_insights": "array"}
+
+
+def _profile(persona: Dict[str, Any]) -> str:
+    return ", ".join(f"{k}={v}" for k, v in persona.items() if k != "id")
+
+
+_BATCH_PROMPT = registry.register(
+    "simulation.batch",
+    prefix=(
+        "You are simulating respondents to a {domain} survey in India. Answer every question as each "
+        "respondent would, in their own voice and consistent with their profile and region. Keep each "
+        "answer to one or two sentences.\n"
+        "Return JSON only, with one entry per respondent and one answer per question:\n{example}\n\n"
+    ),
+    suffix="Region: {region}\nRespondents:\n{respondents}\nQuestions:\n{questions}\n",
+)
+
+
+def build_batch_prompt(domain: str, region: str, personas: List[Dict[str, Any]], questions: List[str], schema: Dict[str, str]) -> str:
+    field = next(iter(schema))
+    example = {"respondents": [{"id": "r1", "answers": [{"q": "q1", field: "...", "confidence": 0.8, "key_insights": ["..."]}]}]}
+    return _BATCH_PROMPT.render(
+        domain=domain,
+        example=json.dumps(example),
+        region=region,
+        respondents="\n".join(f"r{i + 1}: {_profile(p)}" for i, p in enumerate(personas)),
+        questions="\n".join(f"q{j + 1}: {q}" for j, q in enumerate(questions)),
+    )
+
+
+def parse_batch(text: str, n_personas: int, n_questions: int, schema: Dict[str, str]) -> Dict[Tuple[int, int], Dict[str, Any]]:
+    """Map (respondent index, question index) -> answer conforming to `schema`.
+    An echoed prompt and the prompt's placeholder example yield no answers."""
+    if registry.echoes(text):
+        return {}
+    obj, _ = repair_json(text)
+    rows = obj.get("respondents") if isinstance(obj, dict) else obj
+    answers: Dict[Tuple[int, int], Dict[str, Any]] = {}
+    if not isinstance(rows, list):
+        return answers
+    for pos, row in enumerate(rows):
+        if not isinstance(row, dict):
+            continue
+        i = _index(row.get("id"), "r", default=pos)
+        if i is None or i >= n_personas:
+            continue
+        for qpos, ans in enumerate(row.get("answers") or []):
+            if not isinstance(ans, dict):
+                continue
+            j = _index(ans.get("q"), "q", default=qpos)
+            fixed = conform(ans, schema)
+            if j is not None and j < n_questions and fixed is not None:
+                fixed = {k: fixed[k] for k in schema}
+                if not is_placeholder(fixed):
+                    answers[(i, j)] = fixed
+    return answers
+
+
+def _index(label: Any, prefix: str, default: int) -> Optional[int]:
+    if isinstance(label, int):
+        return label - 1
+    if isinstance(label, str) and label.lower().startswith(prefix) and label[1:].isdigit():
+        return int(label[1:]) - 1
+    return default
+
+
+def _call(prompt: str, max_tokens: int, fresh: bool) -> str:
+    kw = {"max_tokens": max_tokens, "timeout": ROUTER_CALL_TIMEOUT, "no_cache": fresh}
+    _, text = router.call([
+        ("openai:gpt-4o-mini", lambda: call_openai(prompt, model="gpt-4o-mini", json_object=True, **kw)),
+        ("groq:llama3-8b-8192", lambda: call_groq(prompt, model="llama3-8b-8192", json_object=True, **kw)),
+        ("gemini:gemini-1.5-pro", lambda: call_gemini(prompt, model="gemini-1.5-pro", **kw)),
+    ])
+    return text
+
+
+class Simulator:
+    """Runs personas x questions through batched prompts, many per provider call.
+
+    Work is split into (region, respondent chunk, question chunk) batches sized so the
+    answers fit the completion budget; all batches, across regions, share one pool.
+    A batch that comes back unparseable is split in half and retried; the cells a
+    truncated reply left out are asked again in a smaller batch, up to SIM_RETRIES times.
+    """
+
+    def __init__(self, domain: str, questions: List[str], batch_respondents: int = SIM_BATCH_RESPONDENTS, max_answers: int = SIM_MAX_ANSWERS_PER_CALL, concurrency: int = SIM_CONCURRENCY, fresh: bool = False):
+        if domain not in AGENTS:
+            raise ValueError(f"Unknown domain {domain}")
+        self.domain = domain
+        self.questions = questions
+        self.schema = answer_schema(AGENTS[domain])
+        self.q_chunk = max(1, min(len(questions), max_answers))
+        self.r_chunk = max(1, min(batch_respondents, max_answers // self.q_chunk))
+        self.concurrency = concurrency
+        self.fresh = fresh
+        self.stats = {"calls": 0, "splits": 0, "retries": 0, "failed_batches": 0}
+        self._lock = threading.Lock()
+
+    def _count(self, key: str):
+        with self._lock:
+            self.stats[key] += 1
+
+    def _answers(self, region: str, personas: List[Dict[str, Any]], questions: List[str], retries: int = SIM_RETRIES) -> Dict[Tuple[int, int], Dict[str, Any]]:
+        prompt = build_batch_prompt(self.domain, region, personas, questions, self.schema)
+        budget = len(personas) * len(questions) * SIM_TOKENS_PER_ANSWER + 100
+        with span("simulation.batch", domain=self.domain, region=region, respondents=len(personas), questions=len(questions)) as s:
+            self._count("calls")
+            try:
+                answers = parse_batch(_call(prompt, budget, self.fresh), len(personas), len(questions), self.schema)
+            except AllProvidersFailed as e:
+                logger.warning(f"⚠️ Simulation batch for {region} failed: {e}")
+                answers = {}
+            s.set(parsed=len(answers))
+        if not answers and len(personas) > 1:
+            # Malformed reply; smaller batches are more reliable
+            self._count("splits")
+            mid = len(personas) // 2
+            first = self._answers(region, personas[:mid], questions, retries)
+            second = self._answers(region, personas[mid:], questions, retries)
+            return {**first, **{(i + mid, j): ans for (i, j), ans in second.items()}}
+        missing = [(i, j) for i in range(len(personas)) for j in range(len(questions)) if (i, j) not in answers]
+        if answers and missing and retries > 0:
+            # Usually a truncated reply: ask again for just the cells it left out
+            self._count("retries")
+            rows = sorted({i for i, _ in missing})
+            cols = sorted({j for _, j in missing})
+            retried = self._answers(region, [personas[i] for i in rows], [questions[j] for j in cols], retries - 1)
+            for (a, b), ans in retried.items():
+                answers.setdefault((rows[a], cols[b]), ans)
+        return answers
+
+    def _batch(self, region: str, personas: List[Dict[str, Any]], q_offset: int, questions: List[str]) -> List[Dict[str, Any]]:
+        answers = self._answers(region, personas, questions)
+        if not answers:
+            self._count("failed_batches")
+        records = []
+        for i, persona in enumerate(personas):
+            for j, question in enumerate(questions):
+                ans = answers.get((i, j))
+                records.append({
+                    "domain": self.domain,
+                    "region": region,
+                    "respondent_id": persona["id"],
+                    "persona": {k: v for k, v in persona.items() if k != "id"},
+                    "question_index": q_offset + j,
+                    "question": question,
+                    "status": "ok" if ans else "missing",
+                    **(ans or {}),
+                })
+        return records
+
+    def run(self, regions: List[str], respondents: int, seed: int = 0) -> Dict[str, Any]:
+        t0 = time.time()
+        tasks = []
+        for region in regions:
+            personas = make_personas(self.domain, region, respondents, seed)
+            for r in range(0, len(personas), self.r_chunk):
+                for q in range(0, len(self.questions), self.q_chunk):
+                    tasks.append((region, personas[r:r + self.r_chunk], q, self.questions[q:q + self.q_chunk]))
+        # Pilots are bulk work: let interactive traffic go first at the rate limiter
+        with priority(BACKGROUND), span("simulation.run", domain=self.domain, regions=len(regions), batches=len(tasks)):
+            with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+                futures = [pool.submit(propagate(self._batch), *task) for task in tasks]
+                results = [fut.result() for fut in futures]
+        records = [rec for batch in results for rec in batch]
+        ok = sum(1 for rec in records if rec["status"] == "ok")
+        return {
+            "records": records,
+            "stats": {
+                **self.stats,
+                "answers": len(records),
+                "ok": ok,
+                "missing": len(records) - ok,
+                "answers_per_call": len(records) / self.stats["calls"] if self.stats["calls"] else 0.0,
+                "duration": time.time() - t0,
+            },
+        }
+
+
+def simulate(domain: str, regions: List[str], questions: List[str], respondents: int = 100, seed: int = 0, **kwargs) -> Dict[str, Any]:
+    """Simulate `respondents` personas per region answering every question.
+    Returns {"records": [one per respondent x question], "stats": {...}}."""
+    return Simulator(domain, questions, **kwargs).run(regions, respondents, seed)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulate survey respondents with batched prompts.")
+    parser.add_argument("--domain", required=True, choices=sorted(AGENTS))
+    parser.add_argument("--regions", required=True, help="comma-separated regions")
+    parser.add_argument("--question", action="append", required=True, dest="questions")
+    parser.add_argument("--respondents", type=int, default=100, help="per region")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--fresh", action="store_true", help="bypass the response cache")
+    parser.add_argument("--out", help="JSONL file for the records (default stdout)")
+    args = parser.parse_args(argv)
+
+    result = simulate(args.domain, [r.strip() for r in args.regions.split(",") if r.strip()], args.questions, args.respondents, args.seed, fresh=args.fresh)
+    out = open(args.out, "w", encoding="utf-8") if args.out else sys.stdout
+    try:
+        for rec in result["records"]:
+            out.write(json.dumps(rec, ensure_ascii=False) + "\n")
+    finally:
+        if args.out:
+            out.close()
+    print(json.dumps(result["stats"]), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""Warm-up hook and import-time profiling.
+
+Heavy dependencies (SDKs, pymongo, embedding models, FAISS) load on first use. Services
+that would rather pay that cost before the first request call `warm_up()` at startup.
+
+    python -m core.startup --profile core.orchestrator agents
+    python -m core.startup --warm db,agents,embeddings
+"""
+from typing import Callable, Dict, Iterable, List, Optional
+import argparse
+import json
+import logging
+import subprocess
+import sys
+import threading
+import time
+
+from .config import WARM_UP
+
+logger = logging.getLogger(__name__)
+
+
+def _warm_db():
+    from .db import db
+    db.connect()
+
+
+def _warm_agents():
+    from .orchestrator import AGENTS
+    for domain in AGENTS:
+        AGENTS[domain]
+
+
+def _warm_embeddings():
+    from .embeddings import get_embedder
+    get_embedder()
+
+
+def _warm_semantic_cache():
+    from .semantic_cache import semantic_cache
+    semantic_cache.warm()
+
+
+def _warm_local_models():
+    from .config import INFERENCE_BACKEND
+    from .local_inference import warm
+    from .orchestrator import AGENTS
+    if INFERENCE_BACKEND == "local":
+        warm(list(dict.fromkeys(AGENTS[domain].local_model_path() for domain in AGENTS)))
+
+
+def _warm_prompts():
+    from .config import INDIAN_REGIONS
+    from .orchestrator import AGENTS
+    regions = list(dict.fromkeys([*INDIAN_REGIONS, *(s for states in INDIAN_REGIONS.values() for s in states)]))
+    for domain in AGENTS:
+        AGENTS[domain].precompile_prompts(regions)
+
+
+def _warm_tokenizer():
+    from .agents.base import estimate_tokens
+    estimate_tokens("warm up")
+
+
+COMPONENTS: Dict[str, Callable[[], None]] = {
+    "db": _warm_db,
+    "agents": _warm_agents,
+    "embeddings": _warm_embeddings,
+    "semantic_cache": _warm_semantic_cache,
+    "tokenizer": _warm_tokenizer,
+    "local_models": _warm_local_models,
+    "prompts": _warm_prompts,
+}
+
+
+def _run(components: Iterable[str]) -> Dict[str, float]:
+    timings: Dict[str, float] = {}
+    for name in components:
+        fn = COMPONENTS.get(name)
+        if fn is None:
+            logger.warning(f"⚠️ Unknown warm-up component '{name}'")
+            continue
+        t0 = time.perf_counter()
+        try:
+            fn()
+        except Exception as e:
+            logger.warning(f"⚠️ Warm-up of {name} failed: {e}")
+        timings[name] = time.perf_counter() - t0
+    logger.info(f"Warm-up done: {', '.join(f'{k} {v:.2f}s' for k, v in timings.items())}")
+    return timings
+
+
+def warm_up(components: Optional[Iterable[str]] = None, background: bool = False):
+    """Load the given components (default WARM_UP). Returns {component: seconds}, or the
+    started thread when `background` is set so the caller isn't held up."""
+    components = list(WARM_UP if components is None else components)
+    if background:
+        t = threading.Thread(target=_run, args=(components,), name="warm-up", daemon=True)
+        t.start()
+        return t
+    return _run(components)
+
+
+def profile_imports(modules: List[str], top: int = 20) -> List[Dict[str, object]]:
+    """Import `modules` in a fresh interpreter under `-X importtime` and return the
+    slowest imports by cumulative time (microseconds)."""
+    code = "; ".join(f"import {m}" for m in modules)
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code], capture_output=True, text=True)
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        if not self_us.strip().isdigit():
+            continue
+        # Nesting is encoded as two spaces per level after the single separator space
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        rows.append({"module": name.strip(), "depth": depth, "self_us": int(self_us), "cumulative_us": int(cumulative_us)})
+    rows.sort(key=lambda r: r["cumulative_us"], reverse=True)
+    rows = rows[:top]
+    if proc.returncode != 0:
+        err = proc.stderr.strip().splitlines()
+        rows.insert(0, {"module": "<import failed>", "error": err[-1] if err else f"exit {proc.returncode}"})
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Profile import time or warm up components.")
+    parser.add_argument("--profile", nargs="*", metavar="MODULE", help="modules to profile (default: core.orchestrator)")
+    parser.add_argument("--warm", help="comma-separated components to warm and time")
+    parser.add_argument("--top", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    if args.warm:
+        print(json.dumps(warm_up([c.strip() for c in args.warm.split(",") if c.strip()]), indent=2))
+    if args.profile is not None or not args.warm:
+        for row in profile_imports(args.profile or ["core.orchestrator"], top=args.top):
+            if "error" in row:
+                print(f"{row['module']}: {row['error']}")
+            else:
+                print(f"{row['cumulative_us'] / 1000:10.1f} ms  {row['self_us'] / 1000:8.1f} ms  {'  ' * row['depth']}{row['module']}")
+
+
+if __name__ == "__main__":
+    main()
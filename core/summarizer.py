@@ -0,0 +1,215 @@
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+import json
+import logging
+import threading
+import time
+import uuid
+
+from .config import SUMMARY_WORKERS, SUMMARY_USE_LLM, SUMMARY_MAX_ITEMS, SUMMARY_MAX_JOBS
+from .json_repair import repair_json, conform
+from .llm_providers import call_openai
+from .rate_limit import priority, BACKGROUND
+from .session_store import session_lock
+from .tracing import span, propagate
+
+logger = logging.getLogger(__name__)
+
+FINAL_SCHEMA = {
+    "final_summary": "string",
+    "key_insights": "array",
+    "recommendations": "array",
+    "follow_up_questions": "array",
+}
+
+# Session key holding the running summary: {"upto": absolute turn index, "summary": {...}}
+STATE_KEY = "_final_summary"
+
+
+def empty_summary() -> Dict[str, Any]:
+    return {"final_summary": "", "key_insights": [], "recommendations": [], "follow_up_questions": []}
+
+
+def turn_count(ctx: Dict[str, Any]) -> int:
+    return ctx.get("turns_dropped", 0) + len(ctx.get("history", []))
+
+
+def unfolded(ctx: Dict[str, Any], upto: int) -> List[Dict[str, Any]]:
+    base = ctx.get("turns_dropped", 0)
+    return ctx.get("history", [])[max(upto, base) - base:]
+
+
+def _merge_items(current: List[Any], new: List[Any]) -> List[Any]:
+    seen = {json.dumps(i, sort_keys=True, default=str).lower() for i in current}
+    merged = list(current)
+    for item in new:
+        key = json.dumps(item, sort_keys=True, default=str).lower()
+        if key not in seen:
+            seen.add(key)
+            merged.append(item)
+    # Newest items are the most relevant once the list is full
+    return merged[-SUMMARY_MAX_ITEMS:]
+
+
+def fold_deterministic(summary: Dict[str, Any], turns: List[Dict[str, Any]], ctx: Dict[str, Any]) -> Dict[str, Any]:
+    """Fold turns without an LLM: merge the answers' list fields and recount."""
+    out = {**empty_summary(), **summary}
+    for turn in turns:
+        answer = turn.get("a") if isinstance(turn.get("a"), dict) else {}
+        for field in ("key_insights", "recommendations", "follow_up_questions"):
+            items = answer.get(field)
+            if isinstance(items, list):
+                out[field] = _merge_items(out[field], items)
+    if not summary.get("final_summary"):
+        out["final_summary"] = f"{turn_count(ctx)} turns in {ctx.get('domain', 'unknown')}/{ctx.get('region', 'unknown')}"
+    return out
+
+
+def _fold_prompt(summary: Dict[str, Any], turns: List[Dict[str, Any]], ctx: Dict[str, Any]) -> str:
+    joined = "\n".join(f"Q: {t.get('q')}\nA: {json.dumps(t.get('a'), ensure_ascii=False, default=str)}" for t in turns)
+    return (
+        "Update the running summary of a survey conversation with the new turns. Keep it concise, merge "
+        "duplicates and keep the most important points.\n"
+        f"Domain: {ctx.get('domain', 'unknown')}\nRegion: {ctx.get('region', 'unknown')}\n"
+        f"Current summary: {json.dumps(summary, ensure_ascii=False)}\n"
+        f"New turns:\n{joined}\n"
+        "Return JSON only with keys: final_summary, key_insights, recommendations, follow_up_questions."
+    )
+
+
+def fold_llm(summary: Dict[str, Any], turns: List[Dict[str, Any]], ctx: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    try:
+        obj, _ = repair_json(call_openai(_fold_prompt(summary, turns, ctx), model="gpt-4o-mini", json_object=True))
+    except Exception as e:
+        logger.warning(f"⚠️ Summary fold failed, using deterministic fold: {e}")
+        return None
+    folded = conform(obj, FINAL_SCHEMA)
+    if folded is None:
+        return None
+    for field in ("key_insights", "recommendations", "follow_up_questions"):
+        folded[field] = folded[field][-SUMMARY_MAX_ITEMS:]
+    return folded
+
+
+class FinalizeJob:
+    __slots__ = ("id", "session_id", "status", "created", "finished", "error")
+
+    def __init__(self, session_id: str):
+        self.id = uuid.uuid4().hex
+        self.session_id = session_id
+        self.status = "pending"
+        self.created = time.time()
+        self.finished: Optional[float] = None
+        self.error: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"job_id": self.id, "session_id": self.session_id, "status": self.status, "created": self.created, "finished": self.finished, "error": self.error}
+
+
+class Summarizer:
+    """Folds each new turn into the session's running summary on background threads.
+
+    At most one fold runs per session; turns arriving meanwhile are picked up by a
+    re-run of the same job, so several turns can be folded in one LLM call.
+    """
+
+    def __init__(self, get_session: Callable[[str], Optional[Dict[str, Any]]], put_session: Callable[[str, Dict[str, Any]], None], workers: int = SUMMARY_WORKERS, use_llm: bool = SUMMARY_USE_LLM):
+        self.get_session = get_session
+        self.put_session = put_session
+        self.use_llm = use_llm
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="summarizer")
+        self._lock = threading.Lock()
+        self._running: Dict[str, FinalizeJob] = {}
+        self._dirty: set = set()
+        self._jobs: "OrderedDict[str, FinalizeJob]" = OrderedDict()
+        self._done = threading.Condition(self._lock)
+
+    def schedule(self, session_id: str) -> FinalizeJob:
+        """Queue a fold for the session, or return the job already covering it."""
+        with self._lock:
+            job = self._running.get(session_id)
+            if job is not None:
+                self._dirty.add(session_id)
+                return job
+            job = FinalizeJob(session_id)
+            self._running[session_id] = job
+            self._jobs[job.id] = job
+            while len(self._jobs) > SUMMARY_MAX_JOBS:
+                self._jobs.popitem(last=False)
+        self._pool.submit(propagate(self._run), job)
+        return job
+
+    def _run(self, job: FinalizeJob):
+        job.status = "running"
+        while True:
+            try:
+                with priority(BACKGROUND), span("summarizer.fold", session_id=job.session_id):
+                    self._fold(job.session_id)
+            except Exception as e:
+                logger.warning(f"⚠️ Background summary for {job.session_id} failed: {e}")
+                job.error = str(e)
+            with self._lock:
+                # Checked and cleared under the lock so a turn scheduled now isn't lost
+                if job.session_id in self._dirty:
+                    self._dirty.discard(job.session_id)
+                    continue
+                self._running.pop(job.session_id, None)
+                job.status = "error" if job.error else "done"
+                job.finished = time.time()
+                self._done.notify_all()
+                return
+
+    def _fold(self, session_id: str):
+        # Folds work on a snapshot so the slow part runs without the session lock
+        with session_lock(session_id):
+            ctx = self.get_session(session_id)
+            if not ctx:
+                return
+            state = ctx.get(STATE_KEY) or {"upto": 0, "summary": empty_summary()}
+            turns = list(unfolded(ctx, state["upto"]))
+            view = {k: ctx.get(k) for k in ("domain", "region", "turns_dropped") if k in ctx}
+            view["history"] = list(ctx.get("history", []))
+        if not turns:
+            return
+        upto = max(state["upto"], view.get("turns_dropped", 0)) + len(turns)
+        folded = fold_llm(state["summary"], turns, view) if self.use_llm else None
+        if folded is None:
+            folded = fold_deterministic(state["summary"], turns, view)
+        with session_lock(session_id):
+            # Re-read so turns added meanwhile are kept; only advance from the state folded
+            ctx = self.get_session(session_id)
+            if not ctx or (ctx.get(STATE_KEY) or {"upto": 0})["upto"] != state["upto"]:
+                return
+            ctx[STATE_KEY] = {"upto": upto, "summary": folded}
+            self.put_session(session_id, ctx)
+
+    def job(self, job_id: str) -> Optional[FinalizeJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def pending(self, session_id: str) -> Optional[FinalizeJob]:
+        with self._lock:
+            return self._running.get(session_id)
+
+    def drain(self, timeout: float) -> bool:
+        """Block until no fold is running for any session; False on timeout."""
+        deadline = time.time() + timeout
+        with self._lock:
+            while self._running:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return False
+                self._done.wait(remaining)
+        return True
+
+    def wait(self, session_id: str, timeout: float) -> bool:
+        """Block until no fold is running for the session; False on timeout."""
+        deadline = time.time() + timeout
+        with self._lock:
+            while session_id in self._running:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return False
+                self._done.wait(remaining)
+        return True
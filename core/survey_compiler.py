@@ -0,0 +1,204 @@
+"""Local survey compilation: merge the creative and structured question sets.
+
+Questions are parsed from the agents' JSON, near-duplicates are merged using one
+EMBED_MODEL similarity matrix (token Jaccard when embeddings are unavailable), the
+rest are grouped into sections and rendered as Markdown. Same input, same survey.
+"""
+from typing import Any, Dict, List, Optional, Tuple
+import logging
+import math
+import re
+
+from .config import COMPILER_DEDUP_THRESHOLD, COMPILER_JACCARD_THRESHOLD, COMPILER_SECTION_SIZE, COMPILER_MAX_SECTIONS
+from .embeddings import embed
+from .json_repair import repair_json
+
+logger = logging.getLogger(__name__)
+
+# Provider failures come back as text, e.g. "Error calling Gemini: 429 ..."
+_ERROR_RE = re.compile(r"^\s*Error (calling|in) ", re.I)
+_LINE_QUESTION_RE = re.compile(r"^\s*(?:[-*•]|\d+[.)])?\s*(.+\?)\s*$")
+_TOKEN_RE = re.compile(r"[a-z0-9']+")
+_STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from how i if in is it its my of on or our so "
+    "that the their them there these they this to was we were what when where which who why "
+    "will with would you your yours have has had any about how much many more most often".split()
+)
+# Structured questions carry more information than an open-ended twin
+_TYPE_RANK = {"multiple_choice": 0, "likert": 1, "open": 2}
+_TYPE_SECTIONS = [("multiple_choice", "Background"), ("likert", "Opinions"), ("open", "In Your Own Words")]
+LIKERT_SCALE = ["Strongly Disagree", "Disagree", "Neutral", "Agree", "Strongly Agree"]
+
+
+def _question(text: Any, qtype: str, options: Any = None, source: str = "") -> Optional[Dict[str, Any]]:
+    if not isinstance(text, str) or not text.strip():
+        return None
+    q = {"text": " ".join(text.split()), "type": qtype, "source": source}
+    if qtype == "multiple_choice":
+        opts = [str(o).strip() for o in options or [] if str(o).strip()]
+        if len(opts) < 2:
+            # A multiple-choice question without choices is effectively open-ended
+            q["type"] = "open"
+        else:
+            q["options"] = opts
+    return q
+
+
+def parse_questions(text: str, source: str) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """Questions from an agent's output as [{"text", "type", "options"?, "source"}].
+    Accepts a JSON list of strings or objects (optionally wrapped in an object); plain
+    text falls back to lines ending in "?". Returns (questions, problem or None)."""
+    if not text or _ERROR_RE.match(text):
+        return [], (text or "empty output").strip()[:200]
+    obj, _ = repair_json(text)
+    if isinstance(obj, dict):
+        obj = next((v for v in obj.values() if isinstance(v, list)), None)
+    questions = []
+    if isinstance(obj, list):
+        for item in obj:
+            if isinstance(item, dict):
+                qtype = str(item.get("type") or "open").lower().replace("-", "_").replace(" ", "_")
+                qtype = qtype if qtype in _TYPE_RANK else "open"
+                q = _question(item.get("question") or item.get("text"), qtype, item.get("options"), source)
+            else:
+                q = _question(item, "open", source=source)
+            if q:
+                questions.append(q)
+    else:
+        questions = [q for q in (_question(m.group(1), "open", source=source) for m in map(_LINE_QUESTION_RE.match, text.splitlines()) if m) if q]
+    return questions, None if questions else "no questions found"
+
+
+def _tokens(text: str) -> List[str]:
+    return [t for t in _TOKEN_RE.findall(text.lower()) if t not in _STOPWORDS]
+
+
+def _jaccard(a: set, b: set) -> float:
+    return len(a & b) / len(a | b) if a or b else 1.0
+
+
+def _similarity(questions: List[Dict[str, Any]]):
+    """(pairwise similarity lookup, threshold, normalised vectors or None)."""
+    vecs = embed([q["text"] for q in questions])
+    if vecs is not None:
+        # One batched matmul; rows are L2-normalised so this is cosine similarity
+        sims = vecs @ vecs.T
+        return (lambda i, j: float(sims[i, j])), COMPILER_DEDUP_THRESHOLD, vecs
+    sets = [set(_tokens(q["text"])) for q in questions]
+    return (lambda i, j: _jaccard(sets[i], sets[j])), COMPILER_JACCARD_THRESHOLD, None
+
+
+def dedupe(questions: List[Dict[str, Any]], sim, threshold: float) -> List[int]:
+    """Indices of the questions to keep, in original order. Each question joins the first
+    earlier group it's similar enough to; the most structured member represents a group."""
+    groups: List[List[int]] = []
+    for i in range(len(questions)):
+        for group in groups:
+            if sim(group[0], i) >= threshold:
+                group.append(i)
+                break
+        else:
+            groups.append([i])
+    keep = [min(g, key=lambda i: (_TYPE_RANK[questions[i]["type"]], i)) for g in groups]
+    return sorted(keep)
+
+
+def _kmeans(vecs, k: int, iterations: int = 10) -> List[int]:
+    """Spherical k-means with farthest-point initialisation from the first row, so the
+    result depends only on the input order."""
+    import numpy as np
+    centers = [0]
+    for _ in range(1, k):
+        closest = (vecs @ vecs[centers].T).max(axis=1)
+        centers.append(int(closest.argmin()))
+    centroids = vecs[centers].copy()
+    labels = (vecs @ centroids.T).argmax(axis=1)
+    for _ in range(iterations):
+        for c in range(k):
+            members = vecs[labels == c]
+            if len(members):
+                mean = members.mean(axis=0)
+                centroids[c] = mean / (np.linalg.norm(mean) or 1.0)
+        new = (vecs @ centroids.T).argmax(axis=1)
+        if (new == labels).all():
+            break
+        labels = new
+    return [int(label) for label in labels]
+
+
+def _title(questions: List[Dict[str, Any]], avoid: set) -> Optional[str]:
+    counts: Dict[str, int] = {}
+    for q in questions:
+        for t in dict.fromkeys(_tokens(q["text"])):
+            if len(t) > 3 and t not in avoid:
+                counts[t] = counts.get(t, 0) + 1
+    # dicts keep first-seen order, which breaks ties deterministically
+    top = sorted(counts, key=lambda t: -counts[t])[:2]
+    return " & ".join(t.capitalize() for t in top) if top else None
+
+
+def _by_type(questions: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return sorted(questions, key=lambda q: _TYPE_RANK[q["type"]])
+
+
+def sections(topic: str, questions: List[Dict[str, Any]], vecs=None) -> List[Tuple[str, List[Dict[str, Any]]]]:
+    """Group questions into [(title, questions)]: by topic when embeddings are available,
+    otherwise by question type. Within a section, closed questions come first."""
+    if vecs is None or len(questions) <= COMPILER_SECTION_SIZE:
+        groups = [(title, [q for q in questions if q["type"] == qtype]) for qtype, title in _TYPE_SECTIONS]
+        return [(title, qs) for title, qs in groups if qs]
+    k = min(COMPILER_MAX_SECTIONS, math.ceil(len(questions) / COMPILER_SECTION_SIZE))
+    labels = _kmeans(vecs, k)
+    clusters: Dict[int, List[Dict[str, Any]]] = {}
+    for label, q in zip(labels, questions):
+        clusters.setdefault(label, []).append(q)
+    avoid = set(_tokens(topic)) | {"question", "questions", "survey", "feel", "think", "experience"}
+    out = []
+    # Clusters appear in the order of their first question
+    for n, qs in enumerate(clusters.values(), 1):
+        out.append((_title(qs, avoid) or f"Section {n}", _by_type(qs)))
+    return out
+
+
+def render_markdown(topic: str, grouped: List[Tuple[str, List[Dict[str, Any]]]], notes: Optional[List[str]] = None) -> str:
+    lines = [f"# Survey: {topic}", ""]
+    for note in notes or []:
+        lines += [f"> ⚠️ {note}", ""]
+    number = 0
+    for s, (title, qs) in enumerate(grouped, 1):
+        lines += [f"## Section {s}: {title}", ""]
+        for q in qs:
+            number += 1
+            lines.append(f"{number}. {q['text']}")
+            if q["type"] == "multiple_choice":
+                lines += [f"   {chr(ord('a') + i)}. {opt}" for i, opt in enumerate(q["options"][:26])]
+            elif q["type"] == "likert":
+                lines.append(f"   _{' · '.join(LIKERT_SCALE)}_")
+            else:
+                lines.append("   _Open response_")
+        lines.append("")
+    return "\n".join(lines).rstrip() + "\n"
+
+
+def compile_survey(topic: str, open_ended_qs: str, structured_qs: str) -> Dict[str, Any]:
+    """Merge both question sets into Markdown without an LLM call.
+    Returns {"markdown", "questions", "duplicates_removed", "notes", "method"}."""
+    creative, creative_err = parse_questions(open_ended_qs, "creative")
+    structured, structured_err = parse_questions(structured_qs, "structured")
+    notes = [f"{name} questions unavailable: {err}" for name, err in (("Open-ended", creative_err), ("Structured", structured_err)) if err]
+    for note in notes:
+        logger.warning(f"⚠️ Survey compiler: {note}")
+    questions = creative + structured
+    if not questions:
+        return {"markdown": render_markdown(topic, [], notes), "questions": [], "duplicates_removed": 0, "notes": notes, "method": "none"}
+    sim, threshold, vecs = _similarity(questions)
+    keep = dedupe(questions, sim, threshold)
+    kept = [questions[i] for i in keep]
+    grouped = sections(topic, kept, vecs[keep] if vecs is not None else None)
+    return {
+        "markdown": render_markdown(topic, grouped, notes),
+        "questions": kept,
+        "duplicates_removed": len(questions) - len(kept),
+        "notes": notes,
+        "method": "embeddings" if vecs is not None else "jaccard",
+    }
@@ -0,0 +1,245 @@
+from contextlib import contextmanager
+from contextvars import ContextVar, copy_context
+from typing import Dict, Any, Optional, List, Callable
+import asyncio
+import functools
+import inspect
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+
+from .config import TRACE_EXPORT, TRACE_JSONL_PATH, TRACE_SERVICE_NAME
+
+logger = logging.getLogger(__name__)
+
+
+class Span:
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "start", "end", "attributes", "status", "error")
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], attributes: Dict[str, Any]):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.start = time.time()
+        self.end: Optional[float] = None
+        self.attributes = dict(attributes)
+        self.status = "ok"
+        self.error: Optional[str] = None
+
+    def set(self, **attrs):
+        self.attributes.update({k: v for k, v in attrs.items() if v is not None})
+
+    def incr(self, key: str, n: int = 1):
+        self.attributes[key] = self.attributes.get(key, 0) + n
+
+    @property
+    def duration(self) -> Optional[float]:
+        return None if self.end is None else self.end - self.start
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start": self.start,
+            "end": self.end,
+            "duration": self.duration,
+            "status": self.status,
+            "error": self.error,
+            "attributes": self.attributes,
+        }
+
+
+class _NoopSpan:
+    def set(self, **attrs):
+        pass
+
+    def incr(self, key: str, n: int = 1):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+_current: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+_collector: ContextVar[Optional[List[Span]]] = ContextVar("span_collector", default=None)
+
+
+# --- Exporters ---
+
+class JsonlExporter:
+    def __init__(self, path: str = TRACE_JSONL_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    def export(self, span: Span):
+        line = json.dumps(span.to_dict(), ensure_ascii=False, default=str)
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+
+class OTLPExporter:
+    """Re-emits finished spans through the OpenTelemetry SDK (OTLP/HTTP).
+    Configure the collector with the standard OTEL_EXPORTER_OTLP_* env vars."""
+
+    def __init__(self, service_name: str = TRACE_SERVICE_NAME):
+        from opentelemetry import trace  # type: ignore
+        from opentelemetry.sdk.resources import Resource  # type: ignore
+        from opentelemetry.sdk.trace import TracerProvider  # type: ignore
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor  # type: ignore
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter  # type: ignore
+        provider = TracerProvider(resource=Resource.create({"service.name": service_name}))
+        provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+        self._tracer = provider.get_tracer("survey-agent")
+        self._trace = trace
+
+    def export(self, span: Span):
+        attrs = {k: v if isinstance(v, (str, bool, int, float)) else str(v) for k, v in span.attributes.items()}
+        attrs.update({"survey.trace_id": span.trace_id, "survey.span_id": span.span_id, "survey.parent_id": span.parent_id or ""})
+        otel = self._tracer.start_span(span.name, start_time=int(span.start * 1e9), attributes=attrs)
+        if span.status != "ok":
+            otel.set_status(self._trace.Status(self._trace.StatusCode.ERROR, span.error or ""))
+        otel.end(end_time=int((span.end or span.start) * 1e9))
+
+
+def _build_exporters() -> List[Any]:
+    exporters: List[Any] = []
+    for kind in [k.strip() for k in TRACE_EXPORT.split(",") if k.strip() and k.strip() != "none"]:
+        try:
+            if kind == "jsonl":
+                exporters.append(JsonlExporter())
+            elif kind == "otlp":
+                exporters.append(OTLPExporter())
+            else:
+                logger.warning(f"⚠️ Unknown TRACE_EXPORT target '{kind}'")
+        except Exception as e:
+            logger.warning(f"⚠️ Trace exporter '{kind}' unavailable: {e}")
+    return exporters
+
+
+_exporters = _build_exporters()
+
+
+def add_exporter(exporter):
+    _exporters.append(exporter)
+
+
+def _finish(s: Span):
+    collected = _collector.get()
+    if collected is not None:
+        collected.append(s)
+    for exp in _exporters:
+        try:
+            exp.export(s)
+        except Exception as e:
+            logger.debug(f"Trace export failed: {e}")
+
+
+# --- Public API ---
+
+def current_span():
+    """The innermost active span, or a no-op stand-in so callers can always `.set()`."""
+    return _current.get() or NOOP_SPAN
+
+
+@contextmanager
+def span(name: str, **attributes):
+    parent = _current.get()
+    s = Span(name, parent.trace_id if parent else uuid.uuid4().hex, parent.span_id if parent else None, attributes)
+    token = _current.set(s)
+    try:
+        yield s
+    except BaseException as e:
+        s.status = "error"
+        s.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        s.end = time.time()
+        _current.reset(token)
+        _finish(s)
+
+
+def traced(name: str, **attributes):
+    """Decorator form of `span`."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name, **attributes):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def traced_provider(provider: str):
+    """Span around a provider call function, tagged with provider, model and prompt size.
+    Inner layers (cache, transport, usage parsing) add attributes via `current_span()`."""
+    def decorator(fn):
+        sig = inspect.signature(fn)
+
+        def _attrs(args, kwargs) -> Dict[str, Any]:
+            kwargs = {k: v for k, v in kwargs.items() if k != "no_cache"}
+            try:
+                bound = sig.bind(*args, **kwargs)
+                bound.apply_defaults()
+                params = bound.arguments
+            except TypeError:
+                params = kwargs
+            prompt = params.get("prompt") or ""
+            return {"provider": provider, "model": params.get("model"), "prompt_chars": len(prompt)}
+
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with span(f"provider.{provider}", **_attrs(args, kwargs)):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(f"provider.{provider}", **_attrs(args, kwargs)):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+@contextmanager
+def collect():
+    """Collect every span finished inside this block (including worker threads started
+    through `propagate`). Yields the list, which fills as spans end."""
+    spans: List[Span] = []
+    token = _collector.set(spans)
+    try:
+        yield spans
+    finally:
+        _collector.reset(token)
+
+
+def propagate(fn: Callable) -> Callable:
+    """Bind `fn` to a copy of the caller's context so spans started on another thread
+    nest under the current span and reach the active collector. Each call runs in its
+    own copy, so one wrapper can be used for many concurrent tasks (e.g. `pool.map`)."""
+    ctx = copy_context()
+    return functools.wraps(fn)(lambda *args, **kwargs: ctx.copy().run(fn, *args, **kwargs))
+
+
+def breakdown(spans: List[Span]) -> List[Dict[str, Any]]:
+    """Flat, start-ordered rows for a latency table."""
+    if not spans:
+        return []
+    t0 = min(s.start for s in spans)
+    rows = []
+    for s in sorted(spans, key=lambda s: s.start):
+        rows.append({
+            "span": s.name,
+            "start_ms": round((s.start - t0) * 1000, 1),
+            "duration_ms": round((s.duration or 0) * 1000, 1),
+            "status": s.status,
+            **{k: v for k, v in s.attributes.items() if k in ("provider", "model", "prompt_tokens", "completion_tokens", "cache_hit", "retries", "bytes_in", "bytes_out", "docs")},
+        })
+    return rows
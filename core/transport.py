@@ -0,0 +1,180 @@
+from typing import Dict, Any, Optional, Tuple
+from urllib.parse import urlsplit
+import asyncio
+import logging
+import threading
+import time
+import weakref
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .config import HTTP_POOL_SIZE, HTTP2_ENABLED, RATE_LIMIT_MAX_RETRIES, RATE_LIMIT_MAX_WAIT
+from .rate_limit import scheduler, parse_retry_after
+from .tracing import current_span
+
+logger = logging.getLogger(__name__)
+
+# httpx (+ h2) is optional: it gives HTTP/2 and a native async client. Without it we
+# fall back to pooled requests sessions and run async calls on a worker thread.
+try:
+    import httpx  # type: ignore
+    try:
+        import h2  # type: ignore  # noqa: F401
+        _HAS_H2 = True
+    except Exception:
+        _HAS_H2 = False
+except Exception:
+    httpx = None
+    _HAS_H2 = False
+
+_USE_HTTPX = httpx is not None and HTTP2_ENABLED and _HAS_H2
+
+_lock = threading.Lock()
+_sync_clients: Dict[str, Any] = {}
+# Async clients are bound to the event loop that created them: loop -> {"clients": {host: client}, "closer": agen}
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, Any]]" = weakref.WeakKeyDictionary()
+
+
+def _host(url: str) -> str:
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}"
+
+
+def _new_sync_client():
+    if _USE_HTTPX:
+        limits = httpx.Limits(max_connections=HTTP_POOL_SIZE, max_keepalive_connections=HTTP_POOL_SIZE)
+        return httpx.Client(http2=True, limits=limits)
+    s = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=HTTP_POOL_SIZE)
+    s.mount("https://", adapter)
+    s.mount("http://", adapter)
+    return s
+
+
+def get_client(url: str):
+    """Keep-alive client shared by every call to the same provider host."""
+    host = _host(url)
+    client = _sync_clients.get(host)
+    if client is None:
+        with _lock:
+            client = _sync_clients.get(host)
+            if client is None:
+                client = _new_sync_client()
+                _sync_clients[host] = client
+    return client
+
+
+async def _close_on_shutdown():
+    # Parked at the yield until the loop shuts down its async generators (asyncio.run and
+    # uvicorn do on exit), then closes that loop's clients
+    try:
+        yield
+    finally:
+        await close_async_clients()
+
+
+def get_async_client(url: str):
+    loop = asyncio.get_running_loop()
+    host = _host(url)
+    entry = _async_clients.get(loop)
+    if entry is None:
+        closer = _close_on_shutdown()
+        entry = _async_clients[loop] = {"clients": {}, "closer": closer}
+        try:
+            # Step to the yield now; this registers the generator with the loop
+            closer.asend(None).send(None)
+        except StopIteration:
+            pass
+    client = entry["clients"].get(host)
+    if client is None:
+        limits = httpx.Limits(max_connections=HTTP_POOL_SIZE, max_keepalive_connections=HTTP_POOL_SIZE)
+        client = entry["clients"][host] = httpx.AsyncClient(http2=_HAS_H2 and HTTP2_ENABLED, limits=limits)
+    return client
+
+
+async def close_async_clients():
+    """Close the running loop's async clients. Runs automatically on loop shutdown."""
+    entry = _async_clients.pop(asyncio.get_running_loop(), None)
+    for client in (entry or {}).get("clients", {}).values():
+        try:
+            await client.aclose()
+        except Exception as e:
+            logger.debug(f"Error closing async HTTP client: {e}")
+
+
+def _record(r):
+    req = getattr(r, "request", None)
+    body = getattr(req, "body", None) if req is not None else None
+    if body is None and req is not None and hasattr(req, "content"):
+        body = req.content
+    current_span().set(
+        http_status=r.status_code,
+        http_version=getattr(r, "http_version", None),
+        bytes_out=len(body) if body else None,
+        bytes_in=len(r.content),
+    )
+
+
+# Statuses that mean "slow down" rather than "this request is wrong"
+_RETRY_STATUSES = {429, 503}
+
+
+def _retry_delay(r, rate_key: Optional[Tuple[str, str]], attempt: int) -> Optional[float]:
+    if r.status_code not in _RETRY_STATUSES or attempt >= RATE_LIMIT_MAX_RETRIES:
+        return None
+    retry_after = parse_retry_after(r.headers.get("Retry-After"))
+    if retry_after is not None and retry_after > RATE_LIMIT_MAX_WAIT:
+        # Not worth holding the caller; let the router try another provider
+        return None
+    provider, model = rate_key or (None, None)
+    return scheduler.throttled(provider, model, attempt, retry_after)
+
+
+def post_json(url: str, payload: Dict[str, Any], headers: Optional[Dict[str, str]] = None, timeout: Optional[float] = None, rate_key: Optional[Tuple[str, str]] = None, tokens: int = 0) -> Any:
+    """POST and decode JSON. With `rate_key` (provider, model) the call waits for the
+    scheduler's RPM/TPM budget first; 429/503 responses are retried after backoff."""
+    attempt = 0
+    while True:
+        if rate_key:
+            scheduler.acquire(*rate_key, tokens=tokens)
+        r = get_client(url).post(url, headers=headers, json=payload, timeout=timeout)
+        _record(r)
+        delay = _retry_delay(r, rate_key, attempt)
+        if delay is None:
+            break
+        attempt += 1
+        time.sleep(delay)
+    r.raise_for_status()
+    return r.json()
+
+
+async def apost_json(url: str, payload: Dict[str, Any], headers: Optional[Dict[str, str]] = None, timeout: Optional[float] = None, rate_key: Optional[Tuple[str, str]] = None, tokens: int = 0) -> Any:
+    if httpx is None:
+        return await asyncio.to_thread(post_json, url, payload, headers, timeout, rate_key, tokens)
+    attempt = 0
+    while True:
+        if rate_key:
+            # Limiter waits block; keep them off the event loop
+            await asyncio.to_thread(scheduler.acquire, *rate_key, tokens=tokens)
+        r = await get_async_client(url).post(url, headers=headers, json=payload, timeout=timeout)
+        _record(r)
+        delay = _retry_delay(r, rate_key, attempt)
+        if delay is None:
+            break
+        attempt += 1
+        await asyncio.sleep(delay)
+    r.raise_for_status()
+    return r.json()
+
+
+def close_all():
+    with _lock:
+        for client in _sync_clients.values():
+            try:
+                client.close()
+            except Exception as e:
+                logger.debug(f"Error closing HTTP client: {e}")
+        _sync_clients.clear()
+    # Async clients must be closed on their own loop (close_async_clients); drop references here
+    _async_clients.clear()
@@ -1,35 +1,119 @@
 import json
+import threading
 from typing import Dict, Any, Optional
-from .llm_providers import call_openai, call_groq, call_gemini
+from .llm_providers import call_openai, call_groq, call_gemini, _not_stub
+from .json_repair import repair_json, conform
+from .tracing import span, current_span
+from .router import router, AllProvidersFailed
+from .config import ROUTER_CALL_TIMEOUT
+from .prompts import registry
+
+# Repair JSON locally first; fall back to routed providers to validate/normalize it
+
+_stats_lock = threading.Lock()
+_STATS: Dict[str, int] = {"calls": 0, "local": 0, "llm": 0, "fallback": 0, "llm_calls": 0}
+
+
+def _count(key: str, n: int = 1):
+    with _stats_lock:
+        _STATS[key] = _STATS.get(key, 0) + n
+
+
+def get_stats() -> Dict[str, Any]:
+    with _stats_lock:
+        stats = dict(_STATS)
+    calls = stats["calls"] or 1
+    stats["local_hit_rate"] = stats["local"] / calls
+    # Every local hit skips at least the first provider round-trip
+    stats["llm_calls_saved"] = stats["local"]
+    return stats
+
+
+def reset_stats():
+    with _stats_lock:
+        for k in list(_STATS):
+            _STATS[k] = 0
+
+
+_REPAIR_PROMPT = registry.register(
+    "validator.repair",
+    prefix="Extract valid JSON from text, fix errors. Return only JSON.\nExpected schema: {schema}\n",
+    suffix="Text: {text}",
+)
+_REPAIR_PROMPT_ANY = registry.register(
+    "validator.repair_any",
+    prefix="Extract valid JSON from text, fix errors. Return only JSON.\n",
+    suffix="Text: {text}",
+)
 
-# Try multiple providers to validate/normalize JSON
 
 def _prompt(raw_text: str, expected_schema: Optional[Dict[str, Any]] = None) -> str:
-    return (
-        "Extract valid JSON from text, fix errors. Return only JSON.\n"
-        + (f"Expected schema: {json.dumps(expected_schema)}\n" if expected_schema else "")
-        + f"Text: {raw_text}"
-    )
+    # Instructions and schema first so repeated repairs share a cacheable prefix
+    if expected_schema:
+        return _REPAIR_PROMPT.render(schema=json.dumps(expected_schema), text=raw_text)
+    return _REPAIR_PROMPT_ANY.render(text=raw_text)
+
+
+def _unusable(raw_text: str) -> bool:
+    # Offline stub output and echoed prompts carry the prompt's schema example, which
+    # would otherwise repair into a conforming placeholder answer
+    return bool(raw_text) and (not _not_stub(raw_text) or registry.echoes(raw_text))
+
+
+def _fallback(raw_text: str) -> Dict[str, Any]:
+    # Minimal structure; never conforms to an agent schema, so it isn't cached as an answer
+    return {"response": (raw_text or "").strip()[:400], "confidence": 0.3}
+
+
+def local_repair(raw_text: str, expected_schema: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+    obj, stage = repair_json(raw_text)
+    current_span().set(local_stage=stage)
+    if stage != "failed":
+        _count(f"local_{stage}")
+    return conform(obj, expected_schema)
+
 
 def validate_json(raw_text: str, expected_schema: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
-    prompt = _prompt(raw_text, expected_schema)
-    # 1. OpenAI JSON mode
-    try:
-        text = call_openai(prompt, model="gpt-4o-mini", json_object=True)
-        return json.loads(text)
-    except Exception:
-        pass
-    # 2. Groq (Llama3)
-    try:
-        text = call_groq(prompt, model="llama3-8b-8192")
-        return json.loads(text)
-    except Exception:
-        pass
-    # 3. Gemini (plain text, attempt JSON parse)
-    try:
-        text = call_gemini(prompt, model="gemini-1.5-pro")
-        return json.loads(text)
-    except Exception:
-        pass
-    # Fallback minimal structure
-    return {"response": raw_text.strip()[:400], "confidence": 0.3}
\ No newline at end of file
+    _count("calls")
+    with span("validator.validate_json", input_chars=len(raw_text or "")) as vspan:
+        if _unusable(raw_text):
+            _count("fallback")
+            vspan.set(path="fallback", reason="stub_or_echo")
+            return _fallback(raw_text)
+        local = local_repair(raw_text, expected_schema)
+        if local is not None:
+            _count("local")
+            vspan.set(path="local", retries=0)
+            return local
+        prompt = _prompt(raw_text, expected_schema)
+        providers = {
+            # OpenAI JSON mode
+            "openai:gpt-4o-mini": lambda: call_openai(prompt, model="gpt-4o-mini", json_object=True, timeout=ROUTER_CALL_TIMEOUT),
+            # Groq (Llama3)
+            "groq:llama3-8b-8192": lambda: call_groq(prompt, model="llama3-8b-8192", timeout=ROUTER_CALL_TIMEOUT),
+            # Gemini (plain text, attempt JSON parse)
+            "gemini:gemini-1.5-pro": lambda: call_gemini(prompt, model="gemini-1.5-pro", timeout=ROUTER_CALL_TIMEOUT),
+        }
+
+        def _attempt(key: str):
+            # Unparseable output counts against the provider's health like an error
+            def run():
+                with span("validator.attempt", provider=key) as aspan:
+                    _count("llm_calls")
+                    obj, _ = repair_json(providers[key]())
+                    if not isinstance(obj, dict):
+                        aspan.set(outcome="unparseable")
+                        raise ValueError(f"{key} returned no JSON object")
+                    return obj
+            return run
+
+        try:
+            key, obj = router.call([(key, _attempt(key)) for key in providers])
+            _count("llm")
+            vspan.set(path=f"llm:{key}")
+            return conform(obj, expected_schema) or obj
+        except AllProvidersFailed as e:
+            vspan.set(retries=len(e.errors))
+        _count("fallback")
+        vspan.set(path="fallback")
+        return _fallback(raw_text)
@@ -1,58 +1,249 @@
 # llm_clients.py
 
+import time
+
 import streamlit as st
-from openai import OpenAI
-import google.generativeai as genai
-from groq import Groq
+from core.cache import bypass_sampled, cached, make_key, response_cache
+from core.config import LLM_CACHE_ENABLED
+from core.prompts import record_usage
+from core.rate_limit import estimate_tokens, scheduler
+from core.router import AllProvidersFailed, router
+from core.tracing import current_span, traced_provider
 
 # --- Initialize API Clients ---
 
-# It's best practice to initialize clients once
+# It's best practice to initialize clients once. The SDKs are imported here rather
+# than at module level: together they add seconds to every cold start and rerun.
 @st.cache_resource
 def get_openai_client():
+    from openai import OpenAI
     return OpenAI(api_key=st.secrets["OPENAI_API_KEY"])
 
 @st.cache_resource
 def get_gemini_client():
+    import google.generativeai as genai
     genai.configure(api_key=st.secrets["GEMINI_API_KEY"])
     return genai.GenerativeModel('gemini-1.5-flash')
 
 @st.cache_resource
 def get_groq_client():
+    from groq import Groq
     return Groq(api_key=st.secrets["GROQ_API_KEY"])
 
 
 # --- Wrapper Functions for API Calls ---
 
+def _not_error(text):
+    # Wrappers report failures as text; never cache those
+    return isinstance(text, str) and not text.startswith("Error calling")
+
+def _record_usage(response, provider):
+    # SDK objects mirror the REST usage fields; cached_tokens is the prefix-cache hit
+    usage = getattr(response, "usage", None)
+    if usage is not None:
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached = getattr(details, "cached_tokens", None) or 0
+        prompt_tokens = getattr(usage, "prompt_tokens", None)
+        current_span().set(prompt_tokens=prompt_tokens, completion_tokens=getattr(usage, "completion_tokens", None), cached_tokens=cached)
+        record_usage(provider, prompt_tokens, cached)
+    meta = getattr(response, "usage_metadata", None)
+    if meta is not None:
+        cached = getattr(meta, "cached_content_token_count", None) or 0
+        prompt_tokens = getattr(meta, "prompt_token_count", None)
+        current_span().set(prompt_tokens=prompt_tokens, completion_tokens=getattr(meta, "candidates_token_count", None), cached_tokens=cached)
+        record_usage(provider, prompt_tokens, cached)
+
+
+# --- Raw Provider Calls ---
+# These raise on failure so the router can score the provider and fall over;
+# the call_* wrappers below keep the old error-as-text behaviour.
+
+def _sdk_sampling():
+    # No temperature is passed, so the SDKs sample at the provider default (1.0 for
+    # OpenAI, Groq and Gemini); part of the cache key and subject to LLM_CACHE_BYPASS_SAMPLED
+    return {"temperature": 1.0, "source": "provider_default"}
+
+@traced_provider("openai")
+@cached("openai", sampling=_sdk_sampling)
+def _openai(prompt, model="gpt-4o-mini"):
+    scheduler.acquire("openai", model, tokens=estimate_tokens(prompt))
+    response = get_openai_client().chat.completions.create(
+        model=model,
+        messages=[{"role": "user", "content": prompt}]
+    )
+    _record_usage(response, "openai")
+    return _require_text(response.choices[0].message.content)
+
+@traced_provider("gemini")
+@cached("gemini", sampling=_sdk_sampling)
+def _gemini(prompt):
+    scheduler.acquire("gemini", "gemini-1.5-flash", tokens=estimate_tokens(prompt))
+    response = get_gemini_client().generate_content(prompt)
+    _record_usage(response, "gemini")
+    return _require_text(response.text)
+
+@traced_provider("groq")
+@cached("groq", sampling=_sdk_sampling)
+def _groq(prompt, model="llama-3.3-70b-versatile"):
+    scheduler.acquire("groq", model, tokens=estimate_tokens(prompt))
+    response = get_groq_client().chat.completions.create(
+        model=model,
+        messages=[{"role": "user", "content": prompt}]
+    )
+    _record_usage(response, "groq")
+    return _require_text(response.choices[0].message.content)
+
+def _require_text(text):
+    if not text:
+        raise ValueError("empty response")
+    return text
+
+
 def call_openai(prompt, model="gpt-4o-mini"):
     """Calls the OpenAI API."""
     try:
-        client = get_openai_client()
-        response = client.chat.completions.create(
-            model=model,
-            messages=[{"role": "user", "content": prompt}]
-        )
-        return response.choices[0].message.content
+        return _openai(prompt, model=model)
     except Exception as e:
         return f"Error calling OpenAI: {e}"
 
 def call_gemini(prompt):
     """Calls the Google Gemini API."""
     try:
-        model = get_gemini_client()
-        response = model.generate_content(prompt)
-        return response.text
+        return _gemini(prompt)
     except Exception as e:
         return f"Error calling Gemini: {e}"
 
 def call_groq(prompt, model="llama-3.3-70b-versatile"):
     """Calls the Groq API for fast responses."""
     try:
-        client = get_groq_client()
-        response = client.chat.completions.create(
-            model=model,
-            messages=[{"role": "user", "content": prompt}]
-        )
-        return response.choices[0].message.content
+        return _groq(prompt, model=model)
     except Exception as e:
         return f"Error calling Groq: {e}"
+
+
+# --- Routed Calls ---
+# The preferred provider goes first unless its rolling health says otherwise;
+# the others are fallbacks (and hedges) with these models.
+
+ROUTE_MODELS = {"openai": "gpt-4o-mini", "groq": "llama-3.3-70b-versatile", "gemini": "gemini-1.5-flash"}
+
+def _routes(prefer, model):
+    order = [prefer] + [p for p in ROUTE_MODELS if p != prefer]
+    return [(p, model if p == prefer and model else ROUTE_MODELS[p]) for p in order]
+
+def _raw_call(provider, prompt, model):
+    if provider == "gemini":
+        return _gemini(prompt)
+    return {"openai": _openai, "groq": _groq}[provider](prompt, model=model)
+
+def call_llm(prompt, prefer="groq", model=None):
+    """Calls the healthiest provider, preferring `prefer`. Raises AllProvidersFailed
+    instead of returning an error string."""
+    candidates = [
+        (f"{p}:{m}", lambda p=p, m=m: _raw_call(p, prompt, m))
+        for p, m in _routes(prefer, model)
+    ]
+    _, text = router.call(candidates)
+    return text
+
+
+# --- Streaming Variants ---
+# Each yields text chunks as they arrive. A cached answer (shared with the
+# non-streaming calls above) is yielded in one piece; a completed stream is cached.
+
+def _stream_cached(provider, params, chunks):
+    sampling = _sdk_sampling()
+    key = make_key(provider, {**params, "sampling": sampling})
+    use_cache = LLM_CACHE_ENABLED and not bypass_sampled(sampling)
+    if use_cache:
+        hit = response_cache.get(key)
+        if hit is not None:
+            yield hit
+            return
+    else:
+        response_cache._count("bypassed")
+    parts = []
+    for chunk in chunks():
+        if chunk:
+            parts.append(chunk)
+            yield chunk
+    # An error is always the last chunk, possibly after partial output
+    if use_cache and parts and _not_error(parts[-1]):
+        response_cache.set(key, "".join(parts))
+
+def _chat_chunks(client_getter, provider, prompt, model):
+    scheduler.acquire(provider, model, tokens=estimate_tokens(prompt))
+    stream = client_getter().chat.completions.create(
+        model=model,
+        messages=[{"role": "user", "content": prompt}],
+        stream=True,
+    )
+    for event in stream:
+        if event.choices:
+            yield event.choices[0].delta.content or ""
+
+def _openai_chunks(prompt, model="gpt-4o-mini"):
+    return _chat_chunks(get_openai_client, "openai", prompt, model)
+
+def _groq_chunks(prompt, model="llama-3.3-70b-versatile"):
+    return _chat_chunks(get_groq_client, "groq", prompt, model)
+
+def _gemini_chunks(prompt):
+    scheduler.acquire("gemini", "gemini-1.5-flash", tokens=estimate_tokens(prompt))
+    for chunk in get_gemini_client().generate_content(prompt, stream=True):
+        yield chunk.text
+
+def _errors_as_text(label, chunks):
+    def guarded():
+        try:
+            yield from chunks()
+        except Exception as e:
+            yield f"Error calling {label}: {e}"
+    return guarded
+
+def stream_openai(prompt, model="gpt-4o-mini"):
+    """Streams a response from the OpenAI API."""
+    return _stream_cached("openai", {"prompt": prompt, "model": model}, _errors_as_text("OpenAI", lambda: _openai_chunks(prompt, model)))
+
+def stream_groq(prompt, model="llama-3.3-70b-versatile"):
+    """Streams a response from the Groq API."""
+    return _stream_cached("groq", {"prompt": prompt, "model": model}, _errors_as_text("Groq", lambda: _groq_chunks(prompt, model)))
+
+def stream_gemini(prompt):
+    """Streams a response from the Google Gemini API."""
+    return _stream_cached("gemini", {"prompt": prompt}, _errors_as_text("Gemini", lambda: _gemini_chunks(prompt)))
+
+def _raw_stream(provider, prompt, model):
+    if provider == "gemini":
+        return _stream_cached("gemini", {"prompt": prompt}, lambda: _gemini_chunks(prompt))
+    chunks = {"openai": _openai_chunks, "groq": _groq_chunks}[provider]
+    return _stream_cached(provider, {"prompt": prompt, "model": model}, lambda: chunks(prompt, model))
+
+def stream_llm(prompt, prefer="groq", model=None):
+    """Streams from the healthiest provider, preferring `prefer`. A provider that fails
+    before its first chunk is skipped for the next one; a failure mid-stream is raised,
+    as is AllProvidersFailed when nothing could start."""
+    routes = {f"{p}:{m}": (p, m) for p, m in _routes(prefer, model)}
+    errors = {}
+    order = router.order(list(routes))
+    force = not any(router.available(k) for k in order)
+    for key in order:
+        if not router.acquire(key, force):
+            errors[key] = "circuit open"
+            continue
+        started = False
+        t0 = time.time()
+        try:
+            provider, model_name = routes[key]
+            for chunk in _raw_stream(provider, prompt, model_name):
+                started = True
+                yield chunk
+        except Exception as e:
+            router.record(key, time.time() - t0, False)
+            if started:
+                raise
+            errors[key] = str(e)[:300]
+            continue
+        router.record(key, time.time() - t0, True)
+        return
+    raise AllProvidersFailed(errors)
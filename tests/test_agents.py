@@ -0,0 +1,25 @@
+import agents
+from core.router import AllProvidersFailed
+
+
+def test_stream_survives_a_failed_research_stage(monkeypatch):
+    def stream_llm(prompt, prefer="groq", model=None):
+        if prompt.startswith("Based on the search results"):
+            yield "Partial research"
+            raise AllProvidersFailed({"groq:a": "timeout"})
+        yield "[]"
+
+    cached = []
+    monkeypatch.setattr(agents.tools, "cache_get", lambda key: None)
+    monkeypatch.setattr(agents.tools, "cache_set", lambda key, value: cached.append(value))
+    monkeypatch.setattr(agents.tools, "simple_web_search", lambda query: "results")
+    monkeypatch.setattr(agents.llm_clients, "stream_llm", stream_llm)
+    monkeypatch.setattr(agents, "compiler_agent", lambda topic, creative, structured: "survey")
+    events = list(agents.orchestrator_agent_stream("School meals", []))
+    result = events[-1]["result"]
+    assert events[-1]["stage"] == "done"
+    assert result["research_summary"].startswith("Partial research")
+    assert "Error in research agent" in result["research_summary"]
+    assert result["final_survey"] == "survey"
+    # A failed research summary isn't cached for the next run
+    assert cached == []
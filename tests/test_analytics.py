@@ -0,0 +1,25 @@
+from datetime import datetime, timedelta
+
+from core.analytics import Analytics
+
+
+def _doc(ts, confidence=0.8):
+    return {"domain": "agriculture", "region": "Punjab", "timestamp": ts, "agent_response": {"confidence": confidence}}
+
+
+def test_writes_during_a_build_are_counted(monkeypatch):
+    analytics = Analytics()
+    old = datetime.utcnow() - timedelta(minutes=5)
+
+    def slow_docs(until=None, **filters):
+        # Another request logs a response while the stored docs are still loading
+        yield _doc(old)
+        analytics._observe(_doc(datetime.utcnow()))
+        yield _doc(old)
+
+    monkeypatch.setattr(analytics, "_docs", slow_docs)
+    rows = analytics.rollups.summary(("domain",))
+    assert rows[0]["responses"] == 3
+    # Later writes land in the published rollups exactly once
+    analytics._observe(_doc(datetime.utcnow()))
+    assert analytics.rollups.summary(("domain",))[0]["responses"] == 4
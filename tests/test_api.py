@@ -0,0 +1,51 @@
+import asyncio
+import threading
+
+from api import Service
+from core import orchestrator
+
+
+def test_coalesced_callers_get_their_own_sessions(monkeypatch):
+    release = threading.Event()
+    calls = []
+
+    def answer(domain, question, region, *rest):
+        calls.append(question)
+        release.wait(5)
+        return {"status": "success", "session_id": "leader", "domain": domain, "region": region, "question": question, "agent_response": {"response": "ok"}, "all_providers": None}
+
+    monkeypatch.setattr(orchestrator.db, "save_response", lambda sid, payload: sid)
+
+    async def main():
+        service = Service(workers=2, max_queue=4, timeout=5)
+        key = ("agriculture", "Punjab", "why")
+        tasks = [asyncio.create_task(service.coalesced(key, answer, "agriculture", "why", "Punjab", follow=orchestrator.adopt_answer)) for _ in range(3)]
+        await asyncio.sleep(0.05)
+        release.set()
+        return await asyncio.gather(*tasks), service.metrics.coalesced
+
+    results, coalesced = asyncio.run(main())
+    assert calls == ["why"] and coalesced == 2
+    sids = [r["session_id"] for r in results]
+    assert len(set(sids)) == 3
+    for sid in sids[1:]:
+        assert [t["q"] for t in orchestrator.get_history(sid)] == ["why"]
+
+
+def test_coalesced_follow_runs_under_admission_control():
+    release = threading.Event()
+    seen = []
+
+    def follow(result):
+        seen.append((threading.current_thread().name, service.admitted))
+        return result
+
+    async def main():
+        tasks = [asyncio.create_task(service.coalesced(("k",), lambda: release.wait(5) and "ok", follow=follow)) for _ in range(2)]
+        await asyncio.sleep(0.05)
+        release.set()
+        return await asyncio.gather(*tasks)
+
+    service = Service(workers=2, max_queue=4, timeout=5)
+    assert asyncio.run(main()) == ["ok", "ok"]
+    assert len(seen) == 1 and seen[0][0].startswith("api") and seen[0][1] >= 1
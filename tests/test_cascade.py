@@ -0,0 +1,39 @@
+import core.cascade as cascade_mod
+from core.agents.agriculture import AgricultureAgent
+from core.cascade import Cascade, assess
+from core.llm_providers import _hf_stub
+from core.router import Router
+
+
+def _prompt():
+    return AgricultureAgent().build_prompt("How has the monsoon changed sowing? " * 20, "Punjab", None)
+
+
+def test_assess_rejects_echoed_prompts_and_placeholders():
+    schema = AgricultureAgent.schema
+    prompt = _prompt()
+    assert assess(prompt, schema, 0.7) == (None, "invalid")
+    assert assess(_hf_stub(prompt), schema, 0.7) == (None, "invalid")
+    placeholder = '{"farmer_response": "...", "confidence": 0.85, "key_insights": ["..."]}'
+    assert assess(placeholder, schema, 0.7) == (None, "invalid")
+    obj, reason = assess('{"farmer_response": "Wheat", "confidence": 0.9}', schema, 0.7)
+    assert reason is None and obj["farmer_response"] == "Wheat"
+
+
+def test_cascade_escalates_past_an_echoing_tier(monkeypatch):
+    prompt = _prompt()
+    outputs = {"huggingface:": _hf_stub(prompt), "openai:gpt-4o-mini": '{"farmer_response": "Wheat", "confidence": 0.9}'}
+    monkeypatch.setattr(cascade_mod, "router", Router(max_workers=2))
+    monkeypatch.setattr(cascade_mod, "_tier_call", lambda tier, p, json_object: (lambda: outputs[tier]))
+    result = Cascade(["huggingface:", "openai:gpt-4o-mini"]).run(prompt, schema=AgricultureAgent.schema, agent="AgricultureAgent")
+    assert result["tier"] == "openai:gpt-4o-mini"
+    assert [a["reason"] for a in result["attempts"]] == ["invalid", None]
+    assert result["obj"]["farmer_response"] == "Wheat"
+
+
+def test_cascade_serves_nothing_when_every_tier_echoes(monkeypatch):
+    prompt = _prompt()
+    monkeypatch.setattr(cascade_mod, "router", Router(max_workers=2))
+    monkeypatch.setattr(cascade_mod, "_tier_call", lambda tier, p, json_object: (lambda: p))
+    result = Cascade(["groq:a", "openai:b"]).run(prompt, schema=AgricultureAgent.schema)
+    assert result["obj"] is None
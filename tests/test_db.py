@@ -0,0 +1,84 @@
+from concurrent.futures import ThreadPoolExecutor
+import sys
+import threading
+import time
+import types
+
+import core.db as db_mod
+
+
+class _FakeClient:
+    def __init__(self, uri, **kwargs):
+        self.admin = types.SimpleNamespace(command=lambda name: time.sleep(0.2))
+        self.dbs = {}
+
+    def __getitem__(self, name):
+        return self.dbs.setdefault(name, types.SimpleNamespace(name=name))
+
+
+def test_concurrent_first_use_waits_for_connect(monkeypatch):
+    fake = types.ModuleType("pymongo")
+    fake.MongoClient = _FakeClient
+    monkeypatch.setitem(sys.modules, "pymongo", fake)
+    monkeypatch.setattr(db_mod, "MONGO_URI", "mongodb://fake")
+    monkeypatch.setattr(db_mod, "DB_WRITE_BEHIND", False)
+    monkeypatch.setattr(db_mod.DB, "_ensure_indexes", lambda self: None)
+    store = db_mod.DB()
+    start = threading.Barrier(8)
+
+    def first_use(_):
+        start.wait(5)
+        return store.db
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        seen = list(pool.map(first_use, range(8)))
+    assert all(d is not None and d.name == "survey_ai" for d in seen)
+
+
+class _BulkWriteError(Exception):
+    def __init__(self, details):
+        super().__init__("batch op errors occurred")
+        self.details = details
+
+
+class _FlakyCollection:
+    """Fails the first insert_many with a partial BulkWriteError, then a transient error."""
+
+    def __init__(self):
+        self.stored = []
+        self.calls = 0
+
+    def insert_many(self, docs, ordered=True):
+        self.calls += 1
+        if self.calls == 1:
+            self.stored += [d for i, d in enumerate(docs) if i not in (1, 3)]
+            raise _BulkWriteError({"writeErrors": [{"index": 1, "code": 91}, {"index": 3, "code": 11000}]})
+        if self.calls == 2:
+            raise ConnectionError("not primary")
+        self.stored += docs
+
+
+def test_write_behind_retries_only_the_docs_a_failed_batch_did_not_write():
+    col = _FlakyCollection()
+    writer = db_mod.WriteBehindBuffer({"logs": col}, batch_size=5, flush_interval=0.05, retries=3, backoff=0.01)
+    try:
+        for i in range(5):
+            writer.submit("logs", {"n": i})
+        writer.flush()
+    finally:
+        writer.close()
+    # Doc 3 hit a duplicate key, so it was already stored; only doc 1 is retried
+    assert sorted(d["n"] for d in col.stored) == [0, 1, 2, 4]
+    assert writer.stats["written"] == 5 and writer.stats["dropped"] == 0 and writer.stats["retries"] == 2
+
+
+def test_write_behind_drops_docs_only_after_its_retries():
+    col = types.SimpleNamespace(insert_many=lambda docs, ordered=True: (_ for _ in ()).throw(ConnectionError("down")))
+    writer = db_mod.WriteBehindBuffer({"logs": col}, batch_size=2, flush_interval=0.05, retries=2, backoff=0.01)
+    try:
+        writer.submit("logs", {"n": 0})
+        writer.submit("logs", {"n": 1})
+        writer.flush()
+    finally:
+        writer.close()
+    assert writer.stats["retries"] == 2 and writer.stats["dropped"] == 2 and writer.stats["written"] == 0
@@ -0,0 +1,78 @@
+import pytest
+
+from core.json_repair import close_truncated, conform, extract_balanced, is_placeholder, repair_json, strip_fences
+
+SCHEMA = {"response": "string", "confidence": "number", "key_insights": "array"}
+
+
+@pytest.mark.parametrize("raw, stage", [
+    ('{"a": 1}', "strict"),
+    ('```json\n{"a": 1}\n```', "fenced"),
+    ('Sure! Here it is: {"a": 1} Hope that helps.', "extracted"),
+    ("{'a': 1, 'ok': True, 'none': None,}", "fixed"),
+    ('{"a": 1, "b": ["x", "y', "truncated"),
+])
+def test_repair_stages(raw, stage):
+    obj, got = repair_json(raw)
+    assert got == stage
+    assert obj["a"] == 1
+
+
+@pytest.mark.parametrize("raw", ["", "   ", "no json here", "{{{"])
+def test_repair_failure(raw):
+    assert repair_json(raw) == (None, "failed")
+
+
+def test_leading_bracket_prose_does_not_hide_the_object():
+    obj, _ = repair_json('[note] {"a": 1}')
+    assert obj == {"a": 1}
+
+
+def test_fixed_stage_values():
+    obj, _ = repair_json("{'text': 'it\\'s \"quoted\"', 'ok': False}")
+    assert obj == {"text": "it's \"quoted\"", "ok": False}
+
+
+def test_truncated_key_is_dropped():
+    obj, stage = repair_json('{"a": 1, "b')
+    assert stage == "truncated" and obj == {"a": 1}
+
+
+def test_helpers():
+    assert strip_fences("```\nx\n```") == "x"
+    assert strip_fences("plain") == "plain"
+    assert extract_balanced('pre {"a": "}"} post') == '{"a": "}"}'
+    assert extract_balanced("none") is None
+    assert close_truncated('{"a": [1, 2') == '{"a": [1, 2]}'
+
+
+def test_conform_coerces_losslessly():
+    out = conform({"response": 5, "confidence": "0.7", "key_insights": "one", "extra": 1}, SCHEMA)
+    assert out == {"response": "5", "confidence": 0.7, "key_insights": ["one"], "extra": 1}
+    assert conform({"response": "x", "confidence": 1}, SCHEMA)["key_insights"] == []
+
+
+@pytest.mark.parametrize("obj", [
+    {"response": "x", "confidence": "high"},
+    {"response": "x", "confidence": True},
+    {"response": None, "confidence": 0.5},
+    {"response": {"nested": 1}, "confidence": 0.5},
+    {"response": "x", "confidence": 0.5, "key_insights": {"a": 1}},
+    ["not", "a", "dict"],
+])
+def test_conform_rejects(obj):
+    assert conform(obj, SCHEMA) is None
+
+
+def test_conform_without_schema():
+    assert conform({"a": 1}, None) == {"a": 1}
+    assert conform("x", None) is None
+
+
+def test_is_placeholder():
+    assert is_placeholder({"farmer_response": "...", "confidence": 0.85, "key_insights": ["..."]})
+    assert is_placeholder({"response": "", "items": []})
+    assert not is_placeholder({"farmer_response": "Wheat", "confidence": 0.85, "key_insights": ["..."]})
+    assert not is_placeholder({"confidence": 0.85})
+    assert not is_placeholder({})
+    assert not is_placeholder(["..."])
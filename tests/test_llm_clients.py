@@ -0,0 +1,49 @@
+import pytest
+
+import llm_clients
+import core.cache as cache_mod
+
+
+@pytest.fixture(autouse=True)
+def memory_cache(monkeypatch):
+    cache = cache_mod.ResponseCache(path=None)
+    monkeypatch.setattr(cache_mod, "response_cache", cache)
+    monkeypatch.setattr(llm_clients, "response_cache", cache)
+    monkeypatch.setattr(cache_mod, "LLM_CACHE_ENABLED", True)
+    monkeypatch.setattr(llm_clients, "LLM_CACHE_ENABLED", True)
+    return cache
+
+
+def _fake_sdk(monkeypatch, calls):
+    def raw(prompt, model="m"):
+        calls.append(prompt)
+        return f"answer {len(calls)}"
+
+    # Stand in for the SDK request, keeping the cached() wrapper under test
+    monkeypatch.setattr(llm_clients, "_openai", llm_clients.traced_provider("openai")(cache_mod.cached("openai", sampling=llm_clients._sdk_sampling)(raw)))
+
+
+def test_sdk_calls_bypass_the_cache_when_sampled_bypass_is_on(monkeypatch):
+    monkeypatch.setattr(cache_mod, "LLM_CACHE_BYPASS_SAMPLED", True)
+    calls = []
+    _fake_sdk(monkeypatch, calls)
+    assert llm_clients.call_openai("bypass-test") != llm_clients.call_openai("bypass-test")
+    assert len(calls) == 2
+
+    streams = []
+
+    def chunks():
+        streams.append(1)
+        return iter(["a", "b"])
+
+    for _ in range(2):
+        assert "".join(llm_clients._stream_cached("openai", {"prompt": "bypass-stream", "model": "m"}, chunks)) == "ab"
+    assert len(streams) == 2
+
+
+def test_sdk_calls_are_cached_without_the_bypass(monkeypatch):
+    monkeypatch.setattr(cache_mod, "LLM_CACHE_BYPASS_SAMPLED", False)
+    calls = []
+    _fake_sdk(monkeypatch, calls)
+    assert llm_clients.call_openai("cache-test") == llm_clients.call_openai("cache-test")
+    assert len(calls) == 1
@@ -0,0 +1,29 @@
+from core import orchestrator
+
+
+class _FakeCache:
+    def __init__(self):
+        self.lookups = []
+        self.adds = []
+
+    def lookup(self, domain, region, question):
+        self.lookups.append(question)
+        return None
+
+    def add(self, domain, region, question, answer):
+        self.adds.append(question)
+
+
+def test_semantic_cache_only_serves_context_free_questions(monkeypatch):
+    cache = _FakeCache()
+    monkeypatch.setattr(orchestrator, "semantic_cache", cache)
+    agent = orchestrator.AGENTS["agriculture"]
+    monkeypatch.setattr(agent, "process", lambda question, region, ctx: {"raw_response": '{"farmer_response": "Wheat", "confidence": 0.9}'})
+
+    first = orchestrator.process_question("agriculture", "Which crop?", "Punjab")
+    assert first["status"] == "success"
+    # A follow-up in the same session, and a question with caller context, depend on that context
+    orchestrator.process_question("agriculture", "Why that crop?", "Punjab", session_id=first["session_id"])
+    orchestrator.process_question("agriculture", "Which crop for me?", "Punjab", context={"farm_size": "2 acres"})
+    assert cache.lookups == ["Which crop?"]
+    assert cache.adds == ["Which crop?"]
@@ -0,0 +1,59 @@
+import threading
+import time
+
+import pytest
+
+from pipeline import Node, Pipeline
+
+
+def test_dependencies_run_first_and_feed_their_outputs():
+    p = Pipeline([
+        Node("c", lambda a, b, scale: (a + b) * scale, deps=["a", "b"], scale=10),
+        Node("a", lambda: 1),
+        Node("b", lambda a: a + 1, deps=["a"]),
+    ])
+    assert p.run() == {"a": 1, "b": 2, "c": 30}
+    t = p.timings
+    assert t["a"]["end"] <= t["b"]["start"]
+    assert max(t["a"]["end"], t["b"]["end"]) <= t["c"]["start"]
+    assert t["total"]["duration"] >= t["c"]["end"]
+
+
+def test_independent_nodes_run_concurrently():
+    barrier = threading.Barrier(2)
+
+    def meet():
+        # Deadlocks (and times out) unless both nodes run at once
+        barrier.wait(timeout=2)
+        return True
+
+    p = Pipeline([Node("x", meet), Node("y", meet), Node("z", lambda x, y: x and y, deps=["x", "y"])], max_workers=2)
+    assert p.run()["z"] is True
+
+
+def test_first_error_is_raised_and_dependents_do_not_run():
+    ran = []
+
+    def boom():
+        raise RuntimeError("boom")
+
+    def slow():
+        time.sleep(0.05)
+        ran.append("slow")
+
+    p = Pipeline([Node("bad", boom), Node("slow", slow), Node("after", lambda bad: ran.append("after"), deps=["bad"])])
+    with pytest.raises(RuntimeError, match="boom"):
+        p.run()
+    # Running siblings settle before the error surfaces; dependents never start
+    assert ran == ["slow"]
+    assert "bad" in p.timings
+
+
+def test_unknown_dependency_is_rejected():
+    with pytest.raises(ValueError, match="unknown node 'missing'"):
+        Pipeline([Node("a", lambda missing: 1, deps=["missing"])])
+
+
+def test_cycle_is_rejected():
+    with pytest.raises(ValueError, match="cycle"):
+        Pipeline([Node("a", lambda b: 1, deps=["b"]), Node("b", lambda a: 1, deps=["a"]), Node("c", lambda: 1)])
@@ -0,0 +1,80 @@
+import threading
+import time
+
+import pytest
+
+from core.rate_limit import BACKGROUND, INTERACTIVE, Limiter, RateLimitTimeout, Scheduler, TokenBucket, parse_retry_after
+
+
+def test_bucket_refills_continuously():
+    bucket = TokenBucket(60)  # one token per second
+    bucket.take(60)
+    now = bucket.updated
+    assert bucket.wait_time(1, now) == pytest.approx(1.0)
+    assert bucket.wait_time(1, now + 0.5) == pytest.approx(0.5)
+    assert bucket.wait_time(1, now + 1) == 0.0
+    # Never refills past one minute of capacity
+    assert bucket.wait_time(1, now + 3600) == 0.0
+    assert bucket.tokens == 60
+
+
+def test_oversized_request_waits_for_a_full_bucket():
+    bucket = TokenBucket(60)
+    bucket.take(30)
+    assert bucket.wait_time(1000, bucket.updated) == pytest.approx(30.0)
+
+
+def test_unlimited_bucket():
+    bucket = TokenBucket(0)
+    bucket.take(10**6)
+    assert bucket.wait_time(10**6, time.monotonic()) == 0.0
+
+
+def test_limiter_times_out():
+    lim = Limiter("p", rpm=60, tpm=0)
+    lim.requests.take(60)
+    with pytest.raises(RateLimitTimeout):
+        lim.acquire(0, timeout=0.05)
+    assert lim.stats["timeouts"] == 1
+
+
+def test_interactive_waiters_go_before_background():
+    lim = Limiter("p", rpm=600, tpm=0)  # ten requests per second
+    lim.requests.take(600)
+    order = []
+
+    def call(name, prio):
+        lim.acquire(0, priority=prio, timeout=5)
+        order.append(name)
+
+    threads = [threading.Thread(target=call, args=(f"bg{i}", BACKGROUND)) for i in range(2)]
+    for t in threads:
+        t.start()
+    time.sleep(0.02)
+    threads += [threading.Thread(target=call, args=("interactive", INTERACTIVE))]
+    threads[-1].start()
+    for t in threads:
+        t.join(5)
+    assert order[0] == "interactive"
+    assert sorted(order[1:]) == ["bg0", "bg1"]
+
+
+def test_block_holds_every_caller():
+    lim = Limiter("p", rpm=0, tpm=0)
+    lim.block(0.1)
+    assert lim.acquire(0, timeout=1) >= 0.09
+
+
+def test_scheduler_falls_back_to_provider_limits():
+    sched = Scheduler(limits={"openai": {"rpm": 10}}, enabled=True)
+    assert sched.limiter("openai", "gpt-4o-mini").key == "openai:gpt-4o-mini"
+    assert sched.limiter("groq", "llama3") is None
+    assert Scheduler(limits={"openai": {"rpm": 10}}, enabled=False).limiter("openai") is None
+
+
+def test_parse_retry_after():
+    assert parse_retry_after("2.5") == 2.5
+    assert parse_retry_after("-1") == 0.0
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
+    assert parse_retry_after("soon") is None
+    assert parse_retry_after(None) is None
@@ -0,0 +1,81 @@
+import threading
+
+import pytest
+
+import core.router as router_mod
+from core.router import AllProvidersFailed, CLOSED, HALF_OPEN, OPEN, ProviderHealth, Router
+
+
+@pytest.fixture
+def cooldown(monkeypatch):
+    monkeypatch.setattr(router_mod, "BREAKER_COOLDOWN", 0.05)
+    monkeypatch.setattr(router_mod, "BREAKER_FAILURE_THRESHOLD", 2)
+    return 0.05
+
+
+def _open(health: ProviderHealth):
+    for _ in range(2):
+        health.record(0.1, False)
+    assert health.state == OPEN
+
+
+def test_order_and_available_have_no_side_effects(cooldown, monkeypatch):
+    r = Router(max_workers=2)
+    _open(r._health("a"))
+    monkeypatch.setattr(router_mod.time, "time", lambda: r.health["a"].opened_at + 1)
+    assert r.available("a")
+    assert r.order(["a", "b"])
+    assert r.health["a"].state == OPEN
+
+
+def test_half_open_admits_a_single_probe(cooldown, monkeypatch):
+    h = ProviderHealth("a")
+    _open(h)
+    monkeypatch.setattr(router_mod.time, "time", lambda: h.opened_at + 1)
+    assert h.acquire()
+    assert h.state == HALF_OPEN
+    assert not h.available()
+    assert not h.acquire()
+    assert not h.acquire(force=True)
+
+
+def test_failed_probe_reopens_and_successful_probe_closes(cooldown, monkeypatch):
+    h = ProviderHealth("a")
+    _open(h)
+    now = h.opened_at + 1
+    monkeypatch.setattr(router_mod.time, "time", lambda: now)
+    assert h.acquire()
+    h.record(0.1, False)
+    assert h.state == OPEN and h.opened_at == now
+    assert not h.acquire()
+    now += 1
+    assert h.acquire()
+    h.record(0.1, True)
+    assert h.state == CLOSED and h.available()
+
+
+def test_call_skips_a_key_whose_probe_is_in_flight(cooldown, monkeypatch):
+    r = Router(max_workers=4)
+    _open(r._health("a"))
+    monkeypatch.setattr(router_mod.time, "time", lambda: r.health["a"].opened_at + 1)
+    release = threading.Event()
+    started = threading.Event()
+    calls = []
+
+    def slow():
+        calls.append("a")
+        started.set()
+        release.wait(5)
+        return "a-ok"
+
+    probe = threading.Thread(target=lambda: r.call([("a", slow)], hedge=False))
+    probe.start()
+    assert started.wait(5)
+    # The probe is running: others fall through to the next candidate
+    assert r.call([("a", slow), ("b", lambda: "b-ok")], hedge=False) == ("b", "b-ok")
+    with pytest.raises(AllProvidersFailed):
+        r.call([("a", slow)], hedge=False)
+    release.set()
+    probe.join(5)
+    assert calls == ["a"]
+    assert r.health["a"].state == CLOSED
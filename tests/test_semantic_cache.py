@@ -0,0 +1,14 @@
+from core.json_repair import repair_json
+from core.agents.agriculture import AgricultureAgent
+from core.semantic_cache import SemanticCache
+
+
+def test_add_refuses_schema_example(tmp_path):
+    agent = AgricultureAgent()
+    example, _ = repair_json(agent.build_prompt("Why?", "Punjab", None))
+    assert example["confidence"] == 0.85
+    cache = SemanticCache(directory=str(tmp_path), enabled=True)
+    cache.add("agriculture", "Punjab", "Why?", example)
+    assert cache.stats["adds"] == 0
+    # Refused before the index or answer store is touched
+    assert not cache._loaded
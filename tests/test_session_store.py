@@ -0,0 +1,35 @@
+import time
+
+from core.session_store import MemorySessionStore, SQLiteSessionStore
+
+
+def _ctx(*questions, pad=120):
+    return {"history": [{"q": q, "a": "x" * pad, "multi": None} for q in questions]}
+
+
+def test_spill_reload_expire_does_not_resurrect(tmp_path):
+    spill = SQLiteSessionStore(str(tmp_path / "spill.sqlite3"))
+    store = MemorySessionStore(max_bytes=200, ttl=0.2, spill=spill)
+    store.put("a", _ctx("q1"))
+    store.put("b", _ctx("b1"))  # over budget: "a" spills
+    assert store.stats["spilled"] == 1 and spill.get("a") is not None
+
+    ctx = store.get("a")
+    assert [t["q"] for t in ctx["history"]] == ["q1"]
+    # The spilled copy is gone once memory holds the session again
+    assert spill.get("a") is None
+    ctx["history"].append({"q": "q2", "a": "y", "multi": None})
+    store.put("a", ctx)
+
+    time.sleep(0.25)
+    assert store.get("a") is None
+    assert spill.get("a") is None and spill.get("b") is None
+
+
+def test_spill_rows_past_ttl_are_pruned(tmp_path):
+    spill = SQLiteSessionStore(str(tmp_path / "spill.sqlite3"))
+    spill.put("old", _ctx("q1"))
+    store = MemorySessionStore(max_bytes=10**6, ttl=0.1, spill=spill)
+    time.sleep(0.15)
+    store.put("new", _ctx("q1"))
+    assert spill.get("old") is None
@@ -0,0 +1,51 @@
+import json
+
+import core.simulation as sim_mod
+from core.simulation import Simulator, build_batch_prompt, make_personas, parse_batch
+
+SCHEMA = {"farmer_response": "string", "confidence": "number", "key_insights": "array"}
+QUESTIONS = ["Which crop did you sow?", "Do you irrigate?"]
+
+
+def _reply(cells):
+    rows = {}
+    for i, j in cells:
+        rows.setdefault(i, []).append({"q": f"q{j + 1}", "farmer_response": f"answer {i}-{j}", "confidence": 0.7, "key_insights": []})
+    return json.dumps({"respondents": [{"id": f"r{i + 1}", "answers": a} for i, a in rows.items()]})
+
+
+def test_parse_batch_rejects_the_echoed_example():
+    prompt = build_batch_prompt("agriculture", "Punjab", make_personas("agriculture", "Punjab", 2), QUESTIONS, SCHEMA)
+    assert parse_batch(prompt, 2, 2, SCHEMA) == {}
+    example = '{"respondents":[{"id":"r1","answers":[{"q":"q1","farmer_response":"...","confidence":0.8,"key_insights":["..."]}]}]}'
+    assert parse_batch(example, 2, 2, SCHEMA) == {}
+    assert parse_batch(_reply([(0, 0)]), 2, 2, SCHEMA)[(0, 0)]["farmer_response"] == "answer 0-0"
+
+
+def test_simulator_reasks_the_cells_a_truncated_reply_left_out(monkeypatch):
+    prompts = []
+
+    def fake_call(prompt, max_tokens, fresh):
+        prompts.append(prompt)
+        # The first reply is cut off after respondent 1; the retry answers everything it asks
+        if len(prompts) == 1:
+            return _reply([(0, 0), (0, 1)])[:-3]
+        return _reply([(0, 0), (0, 1)])
+
+    monkeypatch.setattr(sim_mod, "_call", fake_call)
+    sim = Simulator("agriculture", QUESTIONS, batch_respondents=2, concurrency=1)
+    records = sim._batch("Punjab", make_personas("agriculture", "Punjab", 2), 0, QUESTIONS)
+    assert [r["status"] for r in records] == ["ok"] * 4
+    assert sim.stats["retries"] == 1 and sim.stats["splits"] == 0
+    # The retry asks only for the respondent that was missing
+    assert "r1:" in prompts[1] and "r2:" not in prompts[1]
+    assert records[2]["farmer_response"] == "answer 0-0"
+
+
+def test_simulator_marks_placeholder_answers_missing(monkeypatch):
+    example = '{"respondents":[{"id":"r1","answers":[{"q":"q1","farmer_response":"...","confidence":0.8,"key_insights":["..."]}]}]}'
+    monkeypatch.setattr(sim_mod, "_call", lambda prompt, max_tokens, fresh: example)
+    sim = Simulator("agriculture", QUESTIONS[:1], batch_respondents=1, concurrency=1)
+    records = sim._batch("Punjab", make_personas("agriculture", "Punjab", 1), 0, QUESTIONS[:1])
+    assert [r["status"] for r in records] == ["missing"]
+    assert sim.stats["failed_batches"] == 1
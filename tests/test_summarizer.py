@@ -0,0 +1,64 @@
+import copy
+
+import core.summarizer as summarizer_mod
+from core.session_store import session_lock
+from core.summarizer import STATE_KEY, Summarizer, empty_summary
+
+
+class _CopyingStore:
+    """Like the SQLite/Mongo stores: get and put copy the session."""
+
+    def __init__(self):
+        self.data = {}
+
+    def get(self, sid):
+        return copy.deepcopy(self.data.get(sid))
+
+    def put(self, sid, ctx):
+        self.data[sid] = copy.deepcopy(ctx)
+
+
+def _turn(q):
+    return {"q": q, "a": {"key_insights": [q]}, "multi": None}
+
+
+def test_fold_keeps_turns_added_while_it_runs(monkeypatch):
+    store = _CopyingStore()
+    store.put("s", {"history": [_turn("q1")], "domain": "agriculture", "region": "Punjab", STATE_KEY: {"upto": 0, "summary": empty_summary()}})
+
+    def fold_llm(summary, turns, ctx):
+        # A new turn is recorded while the LLM fold is in flight
+        with session_lock("s"):
+            ctx2 = store.get("s")
+            ctx2["history"].append(_turn("q2"))
+            store.put("s", ctx2)
+        return {**empty_summary(), "final_summary": "folded", "key_insights": ["q1"]}
+
+    monkeypatch.setattr(summarizer_mod, "fold_llm", fold_llm)
+    summarizer = Summarizer(store.get, store.put, workers=1, use_llm=True)
+    summarizer._fold("s")
+    ctx = store.get("s")
+    assert [t["q"] for t in ctx["history"]] == ["q1", "q2"]
+    assert ctx[STATE_KEY]["upto"] == 1
+    assert ctx[STATE_KEY]["summary"]["final_summary"] == "folded"
+
+
+def test_fold_does_not_overwrite_a_newer_state():
+    store = _CopyingStore()
+    store.put("s", {"history": [_turn("q1")], STATE_KEY: {"upto": 0, "summary": empty_summary()}})
+    summarizer = Summarizer(store.get, store.put, workers=1, use_llm=False)
+
+    real_get = store.get
+    calls = []
+
+    def get(sid):
+        calls.append(sid)
+        ctx = real_get(sid)
+        if len(calls) == 2:
+            # Another fold finished in between
+            ctx[STATE_KEY] = {"upto": 1, "summary": {**empty_summary(), "final_summary": "newer"}}
+        return ctx
+
+    summarizer.get_session = get
+    summarizer._fold("s")
+    assert store.get("s")[STATE_KEY]["upto"] == 0
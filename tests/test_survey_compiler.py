@@ -0,0 +1,85 @@
+import pytest
+
+import core.survey_compiler as compiler
+from core.survey_compiler import compile_survey, dedupe, parse_questions, sections
+
+
+@pytest.fixture(autouse=True)
+def no_embeddings(monkeypatch):
+    # Token-Jaccard path: deterministic without an embedding model
+    monkeypatch.setattr(compiler, "embed", lambda texts: None)
+
+
+def _q(text, qtype="open"):
+    return {"text": text, "type": qtype, "source": "test"}
+
+
+def test_parse_json_objects_and_strings():
+    qs, problem = parse_questions('{"questions": [{"question": "Which crop?", "type": "Multiple Choice", "options": ["Rice", "Wheat"]}, "Why?"]}', "structured")
+    assert problem is None
+    assert qs[0] == {"text": "Which crop?", "type": "multiple_choice", "source": "structured", "options": ["Rice", "Wheat"]}
+    assert qs[1]["type"] == "open"
+
+
+def test_multiple_choice_without_options_is_open():
+    qs, _ = parse_questions('[{"question": "Which crop?", "type": "multiple_choice", "options": ["Rice"]}]', "s")
+    assert qs[0]["type"] == "open" and "options" not in qs[0]
+
+
+def test_parse_plain_text_lines():
+    qs, problem = parse_questions("Intro line\n1. How much rain fell?\n- Who sells your crop?\nThanks.", "creative")
+    assert [q["text"] for q in qs] == ["How much rain fell?", "Who sells your crop?"]
+    assert problem is None
+
+
+@pytest.mark.parametrize("text", ["", "Error calling Gemini: 429 Too Many Requests"])
+def test_parse_reports_provider_errors(text):
+    qs, problem = parse_questions(text, "creative")
+    assert qs == [] and problem
+
+
+def test_dedupe_keeps_the_most_structured_member():
+    questions = [
+        _q("How often do you irrigate your fields?"),
+        _q("Which crops do you grow?"),
+        _q("How often do you irrigate fields?", "likert"),
+    ]
+    sim, threshold, vecs = compiler._similarity(questions)
+    assert vecs is None
+    assert dedupe(questions, sim, threshold) == [1, 2]
+
+
+def test_dedupe_with_exact_similarity_lookup():
+    questions = [_q("a"), _q("b", "multiple_choice"), _q("c")]
+    same = {(0, 1), (1, 2), (0, 2)}
+    keep = dedupe(questions, lambda i, j: 1.0 if (i, j) in same else 0.0, 0.5)
+    # All three join the first group, represented by the multiple-choice question
+    assert keep == [1]
+
+
+def test_sections_without_vectors_group_by_type():
+    grouped = sections("Farming", [_q("Why?"), _q("Agree?", "likert"), _q("Which?", "multiple_choice")])
+    assert [title for title, _ in grouped] == ["Background", "Opinions", "In Your Own Words"]
+
+
+def test_kmeans_is_deterministic():
+    np = pytest.importorskip("numpy")
+    vecs = np.array([[1, 0], [0.9, 0.1], [0, 1], [0.1, 0.9]], dtype="float32")
+    vecs /= np.linalg.norm(vecs, axis=1, keepdims=True)
+    labels = compiler._kmeans(vecs, 2)
+    assert labels == compiler._kmeans(vecs, 2)
+    assert labels[0] == labels[1] != labels[2] == labels[3]
+
+
+def test_compile_survey_merges_and_notes_failures():
+    creative = '["How often do you irrigate your fields?", "What worries you about the monsoon?"]'
+    structured = '[{"question": "How often do you irrigate fields?", "type": "likert"}]'
+    out = compile_survey("Farming", creative, structured)
+    assert out["method"] == "jaccard"
+    assert out["duplicates_removed"] == 1
+    assert [q["type"] for q in out["questions"]] == ["open", "likert"]
+    assert out["markdown"].startswith("# Survey: Farming")
+    assert compile_survey("Farming", creative, structured) == out
+
+    failed = compile_survey("Farming", "Error calling Gemini: timeout", structured)
+    assert failed["notes"] and "> ⚠️ Open-ended questions unavailable" in failed["markdown"]
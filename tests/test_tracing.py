@@ -0,0 +1,22 @@
+from concurrent.futures import ThreadPoolExecutor
+import threading
+
+from core.tracing import collect, propagate, span
+
+
+def test_propagate_wrapper_runs_concurrently():
+    barrier = threading.Barrier(4)
+
+    def work(i):
+        # All four tasks are inside the same wrapper at once
+        barrier.wait(timeout=5)
+        with span("work", i=i):
+            return i
+
+    with collect() as spans:
+        with span("parent") as parent:
+            with ThreadPoolExecutor(max_workers=4) as pool:
+                assert list(pool.map(propagate(work), range(4))) == [0, 1, 2, 3]
+    children = [s for s in spans if s.name == "work"]
+    assert len(children) == 4
+    assert all(s.parent_id == parent.span_id for s in children)
@@ -0,0 +1,29 @@
+import asyncio
+
+import pytest
+
+from core import transport
+
+pytestmark = pytest.mark.skipif(transport.httpx is None, reason="httpx not installed")
+
+
+def test_async_clients_are_closed_when_their_loop_exits():
+    async def use():
+        # No await in between: the client must still be closed on shutdown
+        client = transport.get_async_client("https://api.example.com/v1/a")
+        assert transport.get_async_client("https://api.example.com/v1/b") is client
+        return client
+
+    clients = [asyncio.run(use()) for _ in range(3)]
+    assert all(c.is_closed for c in clients)
+    assert len(transport._async_clients) == 0
+
+
+def test_close_async_clients_hook():
+    async def use():
+        client = transport.get_async_client("https://api.example.com/v1/a")
+        await transport.close_async_clients()
+        return client, len(transport._async_clients)
+
+    client, remaining = asyncio.run(use())
+    assert client.is_closed and remaining == 0
@@ -0,0 +1,27 @@
+import pytest
+
+from core.agents.agriculture import AgricultureAgent
+from core.agents.education import EducationAgent
+from core.agents.healthcare import HealthAgent
+from core.json_repair import conform
+from core.llm_providers import _hf_stub
+from core.validator import validate_json
+
+AGENTS = [AgricultureAgent(), EducationAgent(), HealthAgent()]
+
+
+@pytest.mark.parametrize("agent", AGENTS, ids=lambda a: a.domain)
+@pytest.mark.parametrize("question", ["Why?", "How has the monsoon changed sowing? " * 20], ids=["short", "long"])
+def test_stub_output_never_conforms(agent, question):
+    prompt = agent.build_prompt(question, "Punjab", None)
+    for raw in (_hf_stub(prompt), prompt):
+        cleaned = validate_json(raw, agent.schema)
+        assert conform(cleaned, agent.schema) is None
+        assert cleaned["confidence"] == 0.3
+
+
+def test_real_answer_is_repaired_locally():
+    agent = AgricultureAgent()
+    cleaned = validate_json("```json\n{'farmer_response': 'Wheat', 'confidence': 0.9,}\n```", agent.schema)
+    assert cleaned["farmer_response"] == "Wheat"
+    assert cleaned["key_insights"] == []
@@ -1,6 +1,63 @@
 # tools.py
 
-from duckduckgo_search import DDGS
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from core.cache import ResponseCache, make_key
+from core.config import RESEARCH_CACHE_ENABLED, RESEARCH_CACHE_TTL, RESEARCH_CACHE_MAX_ENTRIES, RESEARCH_CACHE_PATH
+
+# Search hits and research summaries outlive a single request; they're shared across
+# sessions and restarts, and expire after RESEARCH_CACHE_TTL
+research_cache = ResponseCache(max_entries=RESEARCH_CACHE_MAX_ENTRIES, ttl=RESEARCH_CACHE_TTL, path=RESEARCH_CACHE_PATH)
+
+# One DDGS session per thread, kept open so its connection pool is reused
+_local = threading.local()
+
+def _ddgs():
+    if getattr(_local, "ddgs", None) is None:
+        from duckduckgo_search import DDGS
+        _local.ddgs = DDGS()
+    return _local.ddgs
+
+def normalize_query(query: str) -> str:
+    """Case, whitespace and trailing punctuation don't change what we'd find."""
+    return re.sub(r"\s+", " ", query or "").strip().strip("?.!").lower()
+
+def research_key(kind: str, query: str, **params) -> str:
+    return make_key(kind, {"query": normalize_query(query), **params})
+
+def cache_get(key: str):
+    return research_cache.get(key) if RESEARCH_CACHE_ENABLED else None
+
+def cache_set(key: str, value):
+    if RESEARCH_CACHE_ENABLED:
+        research_cache.set(key, value)
+
+def search_hits(query: str, num_results: int = 5) -> list:
+    """
+    Raw DuckDuckGo results (title/href/body dicts), served from the research cache when possible.
+    Raises on search errors; empty results are not cached.
+    """
+    key = research_key("search", query, num_results=num_results)
+    hits = cache_get(key)
+    if hits is not None:
+        return hits
+    try:
+        hits = list(_ddgs().text(query, max_results=num_results) or [])
+    except Exception:
+        # Drop a session that may be broken; the next call opens a fresh one
+        _local.ddgs = None
+        raise
+    if hits:
+        cache_set(key, hits)
+    return hits
+
+def format_results(results: list) -> str:
+    return "".join(
+        f"Title: {r.get('title', 'N/A')}\nLink: {r.get('href', 'N/A')}\nSnippet: {r.get('body', 'N/A')}\n\n"
+        for r in results
+    )
 
 def simple_web_search(query: str, num_results: int = 5) -> str:
     """
@@ -8,19 +65,28 @@ def simple_web_search(query: str, num_results: int = 5) -> str:
     """
     print(f"--- Performing web search for: {query} ---")
     try:
-        with DDGS() as ddgs:
-            results = [r for r in ddgs.text(query, max_results=num_results)]
-            if not results:
-                return "No search results found."
-            
-            # Format the results into a single string
-            formatted_results = ""
-            for result in results:
-                formatted_results += f"Title: {result.get('title', 'N/A')}\n"
-                formatted_results += f"Link: {result.get('href', 'N/A')}\n"
-                formatted_results += f"Snippet: {result.get('body', 'N/A')}\n\n"
-            
-            return formatted_results
+        results = search_hits(query, num_results)
+        if not results:
+            return "No search results found."
+        return format_results(results)
     except Exception as e:
         print(f"Error during web search: {e}")
         return f"An error occurred during the web search: {e}"
+
+def prefetch(queries: list, num_results: int = 5, max_workers: int = 4) -> int:
+    """
+    Warms the search cache for a list of queries. Returns how many have hits.
+    """
+    def warm(query):
+        try:
+            return bool(search_hits(query, num_results))
+        except Exception as e:
+            print(f"Error prefetching '{query}': {e}")
+            return False
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        return sum(pool.map(warm, queries))
+
+def search_ok(search_results: str) -> bool:
+    # simple_web_search reports failures as text; research built on those isn't worth keeping
+    return not search_results.startswith(("No search results found.", "An error occurred during the web search"))